@@ -27,6 +27,8 @@ from libreprinter import plugins
 from libreprinter.config_parser import load_config, debug_config_file
 from libreprinter.file_handler import init_directories, cleanup_directories
 from libreprinter.interface import read_interface
+from libreprinter.job_recovery import start_recovery
+from libreprinter.conversion_pool import init_pool, get_pool
 import libreprinter.commons as cm
 
 LOGGER = cm.logger()
@@ -46,6 +48,9 @@ def libreprinter_entry_point(config_file=None, *args, **kwargs):
     # Prepare working directories
     init_directories(misc_section["output_path"])
 
+    # Workers shared by the conversions of the plugins
+    init_pool(misc_section)
+
     # Launch converters & watchdogs
     plugins_loaded = plugins.plugins(config)
     processes_to_kill = [
@@ -55,8 +60,12 @@ def libreprinter_entry_point(config_file=None, *args, **kwargs):
     # Show configuration after loading plugins
     debug_config_file(config)
 
+    # Convert the jobs left by a previous run
+    start_recovery(misc_section, processes_to_kill)
+
     # Launch interface reader
     read_interface(config)
+    get_pool().log_stats()
 
     # Cleanup processes
     [
@@ -18,6 +18,7 @@
 """Load configuration file, check and set default values"""
 
 # Standard imports
+import math
 import configparser
 from logging import DEBUG
 
@@ -39,6 +40,9 @@ FLOW_CTRL_MAPPING = {
     "both": 3,
 }
 
+# Minimal delay in seconds without data before considering the end of a page
+MIN_END_PAGE_TIMEOUT = 0.1
+
 LOGGER = logger()
 
 
@@ -102,6 +106,15 @@ def parse_config(config: configparser.ConfigParser):
     ):
         misc_section["endlesstext"] = "no"
 
+    # Minimum delay between 2 syncs of the converters in strip-escp2-stream mode
+    stream_sync_interval = misc_section.get("stream_sync_interval")
+    try:
+        stream_sync_interval = float(stream_sync_interval)
+    except (TypeError, ValueError):
+        stream_sync_interval = None
+    if stream_sync_interval is None or not 0 <= stream_sync_interval <= 60:
+        misc_section["stream_sync_interval"] = "0.5"
+
     line_ending = misc_section.get("line_ending")
     if line_ending == "windows":
         misc_section["line_ending"] = "\r\n"
@@ -117,6 +130,10 @@ def parse_config(config: configparser.ConfigParser):
     if not usb_passthrough:
         misc_section["usb_passthrough"] = "no"
 
+    # Behavior when the USB printer is slower than the reception
+    if misc_section.get("usb_passthrough_overflow") not in ("block", "spill", "drop"):
+        misc_section["usb_passthrough_overflow"] = "spill"
+
     output_printer = misc_section.get("output_printer")
     if not output_printer:
         misc_section["output_printer"] = "no"
@@ -154,21 +171,25 @@ def parse_config(config: configparser.ConfigParser):
     if not auto_end_page:
         misc_section["auto_end_page"] = "no"
 
-    end_page_timeout = misc_section.get("end_page_timeout")
-    if (
-        not end_page_timeout
-        or not end_page_timeout.isnumeric()
-        or int(end_page_timeout) <= 0.6
+    # Fixed timeout or "auto" (learned between the 2 bounds)
+    if misc_section.get("end_page_timeout") != "auto":
+        check_end_page_timeout(misc_section, "end_page_timeout", "2")
+    check_end_page_timeout(misc_section, "end_page_timeout_min", "0.5")
+    check_end_page_timeout(misc_section, "end_page_timeout_max", "10")
+    if misc_section.getfloat("end_page_timeout_max") < misc_section.getfloat(
+        "end_page_timeout_min"
     ):
-        if end_page_timeout and int(end_page_timeout) <= 0.6:
-            LOGGER.warning(
-                "User defined a very small end_page_timeout (≤0.6) for serial "
-                "reception!\n"
-                "The interface will not have enough time to empty its buffer. "
-                "Setting will be defined to 2."
-            )
-        # Not able to detect end of page with a 0 timeout
-        misc_section["end_page_timeout"] = "2"
+        LOGGER.warning(
+            "end_page_timeout_max is lower than end_page_timeout_min! "
+            "Settings will be defined to 0.5 and 10."
+        )
+        misc_section["end_page_timeout_min"] = "0.5"
+        misc_section["end_page_timeout_max"] = "10"
+
+    # Size of the jobs (kB) assembled in memory before being written to the disk
+    job_buffer_size = misc_section.get("job_buffer_size")
+    if not job_buffer_size or not job_buffer_size.isnumeric():
+        misc_section["job_buffer_size"] = "1024"
 
     retain_data = misc_section.get("retain_data")
     if not retain_data:
@@ -182,6 +203,54 @@ def parse_config(config: configparser.ConfigParser):
     if backend not in ("legacy", "escapy"):
         esc_section["preferred_backend"] = "escapy"
 
+    # Job identifiers: numbers or time-ordered identifiers
+    # The legacy escp2 converter only handles numbers
+    job_id = misc_section.get("job_id")
+    legacy_converter = misc_section["emulation"] == "epson" and (
+        misc_section["endlesstext"] in ("strip-escp2-stream", "strip-escp2-jobs")
+        or (
+            misc_section["endlesstext"] == "no"
+            and esc_section["preferred_backend"] == "legacy"
+        )
+    )
+    if job_id == "time" and legacy_converter:
+        LOGGER.warning(
+            "job_id=time is not supported by the legacy escp2 converter! "
+            "Setting will be defined to number."
+        )
+    if job_id != "time" or legacy_converter:
+        misc_section["job_id"] = "number"
+
+    # Conversions made at once by the plugins: all of them, by plugin
+    conversion_workers = misc_section.get("conversion_workers")
+    if conversion_workers != "auto" and (
+        not conversion_workers
+        or not conversion_workers.isnumeric()
+        or int(conversion_workers) < 1
+    ):
+        misc_section["conversion_workers"] = "auto"
+    plugin_workers = misc_section.get("plugin_workers")
+    if not plugin_workers or not plugin_workers.isnumeric() or int(plugin_workers) < 1:
+        misc_section["plugin_workers"] = "2"
+
+    # Long-lived Ghostscript processes for the conversions of PostScript jobs
+    ghostscript_server = misc_section.get("ghostscript_server")
+    if ghostscript_server not in ("yes", "no"):
+        misc_section["ghostscript_server"] = "yes"
+    # Maximum duration (s) of a job converted by these processes; 0: no limit
+    ghostscript_timeout = misc_section.get("ghostscript_timeout")
+    if not ghostscript_timeout or not ghostscript_timeout.isnumeric():
+        misc_section["ghostscript_timeout"] = "120"
+
+    # Native HP-GL renderer, with hp2xx as fallback
+    if misc_section.get("hpgl_renderer") not in ("native", "hp2xx"):
+        misc_section["hpgl_renderer"] = "native"
+
+    # Journal of the jobs and of their conversions
+    job_journal = misc_section.get("job_journal")
+    if job_journal not in ("yes", "no"):
+        misc_section["job_journal"] = "yes"
+
     ## Parallel printer
     parallel_section = config["parallel_printer"]
 
@@ -217,6 +286,38 @@ def parse_config(config: configparser.ConfigParser):
     return config
 
 
+def check_end_page_timeout(misc_section, name, default):
+    """Check a timeout setting of the misc section, set a default value if needed
+
+    Timeouts are in seconds; fractional values are accepted.
+
+    :param misc_section: misc section of the configuration.
+    :param name: Name of the setting.
+    :param default: Default value.
+    :type misc_section: configparser.SectionProxy
+    :type name: str
+    :type default: str
+    """
+    value = misc_section.get(name)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        value = None
+    if value is None or not math.isfinite(value) or value < MIN_END_PAGE_TIMEOUT:
+        if value is not None:
+            LOGGER.warning(
+                "User defined an invalid or very small %s (<%s) for serial "
+                "reception!\n"
+                "The interface will not have enough time to empty its buffer. "
+                "Setting will be defined to %s.",
+                name,
+                MIN_END_PAGE_TIMEOUT,
+                default,
+            )
+        # Not able to detect end of page with a 0 timeout
+        misc_section[name] = default
+
+
 def debug_config_file(config: configparser.ConfigParser):
     """Display sections, keys and values of config file
 
@@ -0,0 +1,344 @@
+# Libreprinter is a software allowing to use the Centronics and serial printing
+# functions of vintage computers on modern equipement through a tiny hardware
+# interface.
+# Copyright (C) 2020-2024  Ysard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Pool of threads shared by the conversions of the plugins
+
+The watchdog handlers of the plugins (see :mod:`libreprinter.plugins`) submit
+their conversions instead of running them in the thread of their observer:
+several jobs can be converted at once, and a slow conversion doesn't delay
+the next jobs of the other plugins.
+
+The pool is created by :meth:`init_pool` from the configuration; a default
+pool is created otherwise (see :meth:`get_pool`).
+
+Conversions submitted in a :meth:`ConversionPool.background` block (recovery
+of the jobs of a previous run) are started after the others.
+
+The conversions submitted while the queue is full are rejected: the job is
+kept in the raw folder, and it is converted by the recovery at the next start
+if `job_journal` is enabled (see :mod:`libreprinter.job_recovery`).
+"""
+
+# Standard imports
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future
+
+# Custom imports
+from libreprinter.commons import logger
+
+LOGGER = logger()
+
+# Maximum number of conversions waiting for a worker; the next ones are
+# rejected (background conversions are bounded by their submitter)
+CONVERSION_QUEUE_SIZE = 64
+# Minimum delay between 2 warnings about the rejected conversions (s)
+QUEUE_FULL_LOG_INTERVAL = 10
+# Conversions made at once by a plugin, if not configured
+DEFAULT_PLUGIN_WORKERS = 2
+
+# Pool shared by the plugins
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+class ConversionQueueFull(Exception):
+    """Raised in the future of a conversion submitted while the queue is full"""
+
+
+class ConversionPool:
+    """Bounded pool of threads running the conversions of the plugins
+
+    Conversions are started in the submission order, within the limits of
+    the pool (`max_workers`) and of their plugin (`plugin_workers`, or a limit
+    set by :meth:`set_limit`). A plugin limited to 1 conversion keeps the
+    order of its jobs. Background conversions (see :meth:`background`) are
+    started only if no other conversion can be started.
+
+    The queue is bounded but :meth:`submit` never waits, so that the thread
+    dispatching the events of the files is not blocked: when `queue_size`
+    conversions are waiting, the next ones are rejected and a warning is
+    logged (at most every `QUEUE_FULL_LOG_INTERVAL` seconds). Background
+    conversions are not counted nor rejected: they are bounded by their
+    submitter.
+    The waiting time in the queue and the running time of each conversion are
+    logged. An exception raised by a conversion is logged and set in its
+    future; the worker is not stopped.
+
+    Attributes:
+        :param max_workers: Maximum number of conversions running at once.
+        :param plugin_workers: Default maximum number of conversions of a
+            plugin running at once.
+        :param queue_size: Maximum number of conversions waiting
+            (background conversions excluded).
+        :param limits: Maximum number of conversions running at once, by plugin.
+        :param queue: Conversions waiting:
+            `(plugin, submit_time, function, args, future, background)`.
+        :param running: Number of running conversions, by plugin.
+        :param wait_time: Cumulated waiting time in the queue (s).
+        :param run_time: Cumulated running time (s).
+        :param conversions: Number of done conversions.
+        :param rejected: Number of conversions rejected because the queue
+            was full.
+        :type max_workers: int
+        :type plugin_workers: int
+        :type queue_size: int
+        :type limits: dict[str, int]
+        :type queue: collections.deque
+        :type running: dict[str, int]
+        :type wait_time: float
+        :type run_time: float
+        :type conversions: int
+        :type rejected: int
+    """
+
+    def __init__(
+        self,
+        max_workers,
+        plugin_workers=DEFAULT_PLUGIN_WORKERS,
+        queue_size=CONVERSION_QUEUE_SIZE,
+    ):
+        """Constructor
+
+        :param max_workers: Maximum number of conversions running at once.
+        :param plugin_workers: Default maximum number of conversions of a
+            plugin running at once.
+        :param queue_size: Maximum number of conversions waiting
+            (background conversions excluded).
+        :type max_workers: int
+        :type plugin_workers: int
+        :type queue_size: int
+        """
+        self.max_workers = max_workers
+        self.plugin_workers = plugin_workers
+        self.queue_size = queue_size
+        self.limits = dict()
+        self.queue = deque()
+        self.running = dict()
+        self.wait_time = 0
+        self.run_time = 0
+        self.conversions = 0
+        self.rejected = 0
+        # Waiting conversions that are not in background
+        self._waiting = 0
+        # Time of the last warning, and conversions rejected since
+        self._last_warning = None
+        self._unlogged_rejections = 0
+        self._condition = threading.Condition()
+        # Futures of the background submissions of the current thread
+        self._local = threading.local()
+        self._threads = [
+            threading.Thread(target=self._run, name="ConversionWorker", daemon=True)
+            for _ in range(max_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def set_limit(self, plugin, limit):
+        """Set the maximum number of conversions of a plugin running at once
+
+        :type plugin: str
+        :type limit: int
+        """
+        with self._condition:
+            self.limits[plugin] = limit
+            self._condition.notify_all()
+
+    def submit(self, plugin, function, *args):
+        """Queue a conversion
+
+        The conversion is rejected if the queue is full: its future gets a
+        :class:`ConversionQueueFull` exception.
+
+        :param plugin: Name of the plugin.
+        :param function: Conversion, called with `args`.
+        :type plugin: str
+        :type function: Callable
+        :return: Future of the conversion, done at its end.
+        :rtype: concurrent.futures.Future
+        """
+        future = Future()
+        futures = getattr(self._local, "futures", None)
+        background = futures is not None
+        with self._condition:
+            if not background and self._waiting >= self.queue_size:
+                self._reject(plugin, future)
+                return future
+            self._waiting += not background
+            self.queue.append(
+                (plugin, time.monotonic(), function, args, future, background)
+            )
+            self._condition.notify_all()
+        if futures is not None:
+            futures.append(future)
+        return future
+
+    def _reject(self, plugin, future):
+        """Reject a conversion submitted while the queue is full
+
+        .. note:: The lock must be held.
+
+        :type plugin: str
+        :type future: concurrent.futures.Future
+        """
+        self.rejected += 1
+        self._unlogged_rejections += 1
+        now = time.monotonic()
+        if (
+            self._last_warning is None
+            or now - self._last_warning >= QUEUE_FULL_LOG_INTERVAL
+        ):
+            LOGGER.warning(
+                "Conversion queue full (%d waiting): %d conversion(s) rejected, "
+                "last by %s; jobs are kept for the next recovery",
+                self._waiting,
+                self._unlogged_rejections,
+                plugin,
+            )
+            self._last_warning = now
+            self._unlogged_rejections = 0
+        future.set_exception(
+            ConversionQueueFull(f"{self._waiting} conversions waiting")
+        )
+
+    @contextmanager
+    def background(self):
+        """Submit the conversions of the current thread in background
+
+        The conversions submitted in the block, directly or by event handlers
+        called by the thread, are started only if no other conversion can be
+        started. Their futures are collected in the yielded list.
+
+        :rtype: list[concurrent.futures.Future]
+        """
+        self._local.futures = futures = []
+        try:
+            yield futures
+        finally:
+            self._local.futures = None
+
+    def drain(self):
+        """Wait for the end of all the submitted conversions"""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: not self.queue and not any(self.running.values())
+            )
+
+    def log_stats(self):
+        """Log the usage of the pool"""
+        LOGGER.debug(
+            "Conversions: %d done, %d waiting, %d rejected, average wait %.3f s, "
+            "average run %.3f s",
+            self.conversions,
+            len(self.queue),
+            self.rejected,
+            self.wait_time / self.conversions if self.conversions else 0,
+            self.run_time / self.conversions if self.conversions else 0,
+        )
+
+    def _next_conversion(self):
+        """Get the first waiting conversion whose plugin is below its limit;
+        background conversions come last
+
+        .. note:: The lock must be held.
+
+        :rtype: tuple | None
+        """
+        for background in (False, True):
+            for conversion in self.queue:
+                plugin = conversion[0]
+                limit = self.limits.get(plugin, self.plugin_workers)
+                if conversion[5] is background and self.running.get(plugin, 0) < limit:
+                    self.queue.remove(conversion)
+                    self._waiting -= not background
+                    self.running[plugin] = self.running.get(plugin, 0) + 1
+                    return conversion
+
+    def _run(self):
+        """Run the submitted conversions"""
+        while True:
+            with self._condition:
+                conversion = None
+                while conversion is None:
+                    self._condition.wait_for(lambda: self.queue)
+                    conversion = self._next_conversion()
+                    if conversion is None:
+                        # All the waiting plugins are at their limit
+                        self._condition.wait()
+
+            plugin, submit_time, function, args, future, _ = conversion
+            start = time.monotonic()
+            # Cancelled conversions are not run
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(function(*args))
+                except Exception as e:
+                    LOGGER.exception(e)
+                    future.set_exception(e)
+            end = time.monotonic()
+            LOGGER.debug(
+                "Conversion %s: waited %.3f s, ran %.3f s",
+                plugin,
+                start - submit_time,
+                end - start,
+            )
+
+            with self._condition:
+                self.running[plugin] -= 1
+                self.wait_time += start - submit_time
+                self.run_time += end - start
+                self.conversions += 1
+                self._condition.notify_all()
+
+
+def init_pool(misc_section):
+    """Create the pool shared by the plugins from the configuration
+
+    :param misc_section: Section `misc` of the configuration.
+    :type misc_section: configparser.SectionProxy
+    :rtype: ConversionPool
+    """
+    global _POOL
+    max_workers = misc_section["conversion_workers"]
+    if max_workers == "auto":
+        max_workers = os.cpu_count() or 1
+    with _POOL_LOCK:
+        _POOL = ConversionPool(int(max_workers), misc_section.getint("plugin_workers"))
+    LOGGER.debug(
+        "Conversion pool: %d workers, %d by plugin",
+        _POOL.max_workers,
+        _POOL.plugin_workers,
+    )
+    return _POOL
+
+
+def get_pool():
+    """Get the pool shared by the plugins
+
+    A pool with 1 worker per CPU is created if :meth:`init_pool` was not
+    called.
+
+    :rtype: ConversionPool
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ConversionPool(os.cpu_count() or 1)
+    return _POOL
@@ -18,12 +18,25 @@
 """Gestion of files (creation and processing) and directories used by the project"""
 
 # Standard imports
+import glob
 import os
+import re
 import shutil
+import socket
 from pathlib import Path
+from datetime import datetime
 
 # Custom imports
-from libreprinter.commons import OUTPUT_DIRS, SHARED_MEM_NAME
+from libreprinter.commons import OUTPUT_DIRS, SHARED_MEM_NAME, logger
+
+LOGGER = logger()
+
+# Size of the blocks read during the conversion of files
+LINE_ENDING_BLOCK_SIZE = 1024 * 1024
+# State file of the job counter, in output_path
+JOB_COUNTER_FILE = ".job_counter"
+# Files created during the reception of a job; used to check the job counter
+JOB_FILES = ("raw/{}.raw", "pcl/{}.pcl", "hpgl/{}.hpgl", "ps/{}.ps")
 
 
 def init_directories(output_path, output_dirs=OUTPUT_DIRS):
@@ -49,7 +62,7 @@ def init_directories(output_path, output_dirs=OUTPUT_DIRS):
 def cleanup_directories(output_path):
     """Delete all directories initialised by this project in the given path
 
-    Deletes also /dev/shm/ shared memory.
+    Deletes also /dev/shm/ shared memory and the states of the job counters.
 
     :param output_path: Path were directories will be created.
     :type output_path: str
@@ -60,15 +73,20 @@ def cleanup_directories(output_path):
         except FileNotFoundError:
             pass
 
-    # Clean shared memory
-    try:
-        os.remove("/dev/shm/" + SHARED_MEM_NAME)
-    except FileNotFoundError:
-        pass
+    # Clean shared memory and job counters
+    for filepath in (
+        "/dev/shm/" + SHARED_MEM_NAME,
+        output_path + JOB_COUNTER_FILE,
+        *glob.glob(glob.escape(output_path + JOB_COUNTER_FILE) + "-*"),
+    ):
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
 
 
 def get_job_number(
-    output_path, extensions=(".txt", ".raw", ".eps", ".csv", ".hpgl", ".ps")
+    output_path, extensions=(".txt", ".raw", ".eps", ".csv", ".hpgl", ".ps", ".pcl")
 ):
     """Return the number of the current job based on files found in output directories
 
@@ -76,6 +94,10 @@ def get_job_number(
     - Get only expected extensions (txt, raw, eps)
     - Search highest file number in all folders
 
+    .. warning:: All the output directories are scanned; the duration depends
+        on the number of files. Used only if the state of :class:`JobCounter`
+        is lost.
+
     TODO: handle properly pdf dir data: page1-1.pdf, page1-2.pdf, page2-1.pdf...
 
     TODO: handle new naming convention based on the date to avoid overwriting
@@ -99,6 +121,192 @@ def get_job_number(
     return int(pruned[-1]) + 1 if pruned else 1
 
 
+class JobCounter:
+    """Persistent counter of the job numbers
+
+    The next job number is saved in `JOB_COUNTER_FILE` each time a number is
+    allocated: the output directories are not scanned during the reception
+    (see :meth:`get_job_number`).
+
+    The state file is replaced atomically (written in a temporary file, synced
+    and renamed). At startup, the saved number is checked: numbers of existing
+    job files (`JOB_FILES`) are skipped. A missing or corrupted state file is
+    rebuilt with a scan of the output directories.
+
+    Attributes:
+        :param output_path: Path of the output directories.
+        :param filepath: Path of the state file.
+        :param next_number: Number of the next job.
+        :type output_path: str
+        :type filepath: str
+        :type next_number: int
+    """
+
+    def __init__(self, output_path):
+        """Constructor
+
+        :param output_path: Path of the output directories.
+        :type output_path: str
+        """
+        self.output_path = output_path
+        self.filepath = output_path + JOB_COUNTER_FILE
+        self.next_number = self.load()
+
+    def load(self):
+        """Get the next job number from the state file
+
+        :rtype: int
+        """
+        try:
+            with open(self.filepath) as f_d:
+                next_number = int(f_d.read())
+        except (OSError, ValueError):
+            LOGGER.info("Job counter not found: scan of <%s>...", self.output_path)
+            return get_job_number(self.output_path)
+
+        # Jobs received but not saved (crash)
+        while any(
+            os.path.isfile(self.output_path + job_file.format(next_number))
+            for job_file in JOB_FILES
+        ):
+            next_number += 1
+        return next_number
+
+    def save(self):
+        """Write the next job number in the state file atomically"""
+        temp_filepath = self.filepath + ".tmp"
+        with open(temp_filepath, "w") as f_d:
+            f_d.write(str(self.next_number))
+            f_d.flush()
+            os.fsync(f_d.fileno())
+        os.replace(temp_filepath, self.filepath)
+
+    def allocate(self):
+        """Get a new job number
+
+        :rtype: int
+        """
+        job_number = self.next_number
+        self.next_number += 1
+        self.save()
+        return job_number
+
+
+class TimeJobCounter:
+    """Time-ordered job identifiers (`job_id=time` setting)
+
+    Identifiers are formatted as `<YYYYMMDD>-<HHMMSS>-<sequence>-<instance>`:
+
+        - they sort in the order of reception (fixed width fields);
+        - the sequence number distinguishes the jobs received during the same
+          second;
+        - the instance (host name and name of the serial port) distinguishes
+          the capture programs sharing an output directory, even from
+          different hosts.
+
+    The time and the sequence number of the last job are saved in a state file
+    of the instance (`JOB_COUNTER_FILE` followed by the instance), replaced
+    atomically as the one of :class:`JobCounter`: the sequence goes on after a
+    restart. If the clock goes backward (Raspberry Pi without RTC synchronized
+    late), the time of the last job is kept. Identifiers of existing job files
+    (`JOB_FILES`) are skipped, in case the state file was lost.
+
+    Attributes:
+        :param output_path: Path of the output directories.
+        :param instance: Name of the capture instance.
+        :param filepath: Path of the state file.
+        :param sequence: Sequence number of the last job.
+        :param last_time: Time of the last job.
+        :type output_path: str
+        :type instance: str
+        :type filepath: str
+        :type sequence: int
+        :type last_time: datetime | None
+    """
+
+    def __init__(self, output_path, serial_port, hostname=None):
+        """Constructor
+
+        :param output_path: Path of the output directories.
+        :param serial_port: Name of the serial port of the instance.
+        :key hostname: Name of the host; `socket.gethostname()` by default.
+        :type output_path: str
+        :type serial_port: str
+        :type hostname: str
+        """
+        self.output_path = output_path
+        # Only letters and digits are kept in each part
+        self.instance = "_".join(
+            re.sub(r"[^A-Za-z0-9]", "", name)
+            for name in (hostname or socket.gethostname(), serial_port)
+        )
+        self.filepath = f"{output_path}{JOB_COUNTER_FILE}-{self.instance}"
+        self.sequence = 0
+        self.last_time = None
+        self.load()
+
+    def load(self):
+        """Get the time and the sequence number of the last job from the state file"""
+        try:
+            with open(self.filepath) as f_d:
+                last_time, sequence = f_d.read().split()
+            self.last_time = datetime.strptime(last_time, "%Y%m%d-%H%M%S")
+            self.sequence = int(sequence)
+        except (OSError, ValueError):
+            LOGGER.info("Time job counter not found: <%s>", self.filepath)
+
+    def save(self):
+        """Write the time and the sequence number of the last job in the state
+        file atomically"""
+        temp_filepath = self.filepath + ".tmp"
+        with open(temp_filepath, "w") as f_d:
+            f_d.write(f"{self.last_time:%Y%m%d-%H%M%S} {self.sequence}")
+            f_d.flush()
+            os.fsync(f_d.fileno())
+        os.replace(temp_filepath, self.filepath)
+
+    def allocate(self):
+        """Get a new job identifier
+
+        :rtype: str
+        """
+        now = datetime.now().replace(microsecond=0)
+        if self.last_time and now < self.last_time:
+            now = self.last_time
+        self.last_time = now
+
+        while True:
+            self.sequence = (self.sequence + 1) % 1000000
+            job_id = f"{now:%Y%m%d-%H%M%S}-{self.sequence:06d}-{self.instance}"
+            # Jobs received but not saved (lost state file)
+            if not any(
+                os.path.isfile(self.output_path + job_file.format(job_id))
+                for job_file in JOB_FILES
+            ):
+                break
+        self.save()
+        return job_id
+
+
+def link_file(in_file, out_file):
+    """Make out_file a hard link of in_file; copy the file if links are not
+    supported by the file system (FAT)
+
+    An existing out_file is replaced.
+
+    :param in_file: Path of the existing file.
+    :param out_file: Path of the new name.
+    """
+    try:
+        os.unlink(out_file)
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(in_file, out_file)
+    except OSError:
+        shutil.copy(in_file, out_file)
+
+
 def convert_data_line_ending(in_data, line_ending):
     r"""Replace line endings of in_data and return the result
 
@@ -119,18 +327,116 @@ def convert_data_line_ending(in_data, line_ending):
     return in_data.replace(conv_mapping[line_ending], line_ending)
 
 
-def convert_file_line_ending(in_file, out_file, line_ending):
+class LineEndingConverter:
+    r"""Replace line endings of a stream of data received in chunks
+
+    Same conversion as :meth:`convert_data_line_ending` on the concatenation
+    of the chunks; a `\r\n` pair split between 2 chunks is converted.
+
+    - Chunks without line ending to be replaced are returned as is (no copy).
+    - Others are converted with a single allocation (regex substitution made
+      directly on the memoryviews of the received data; faster `replace`
+      method for bytes and bytearrays).
+
+    Attributes:
+        :param line_ending: Destination line ending.
+        :param old_line_ending: Line ending to be replaced.
+        :param pattern: Regex of the line ending to be replaced.
+        :param pending_cr: A `\r` ending the previous chunk is held back
+            (conversion to unix only).
+        :type line_ending: bytes
+        :type old_line_ending: bytes
+        :type pattern: re.Pattern
+        :type pending_cr: bool
+    """
+
+    def __init__(self, line_ending):
+        """Constructor
+
+        :param line_ending: Destination line ending.
+        :type line_ending: bytes
+        """
+        self.line_ending = line_ending
+        self.old_line_ending = b"\r\n" if line_ending == b"\n" else b"\n"
+        self.pattern = re.compile(self.old_line_ending)
+        self.pending_cr = False
+
+    def replace(self, data):
+        """Replace the line endings of a chunk (no boundary handling)
+
+        :type data: bytes | bytearray | memoryview
+        :rtype: bytes | bytearray | memoryview
+        """
+        if isinstance(data, memoryview):
+            if self.pattern.search(data):
+                return self.pattern.sub(self.line_ending, data)
+            return data
+        return data.replace(self.old_line_ending, self.line_ending)
+
+    def convert(self, data):
+        """Convert a chunk of data
+
+        :param data: Chunk of data.
+        :type data: bytes | bytearray | memoryview
+        :return: Converted data; a chunk returned as is shares its buffer.
+        :rtype: bytes | bytearray | memoryview
+        """
+        if self.line_ending == b"\r\n":
+            # 1 byte pattern: no boundary issue
+            return self.replace(data)
+
+        prefix = b""
+        if self.pending_cr:
+            self.pending_cr = False
+            if data[:1] != b"\n":
+                # Lone \r: kept
+                prefix = b"\r"
+            # Else \r\n: the \n of the chunk is kept
+        if data[-1:] == b"\r":
+            # May be the beginning of a \r\n pair
+            self.pending_cr = True
+            data = data[:-1]
+
+        data = self.replace(data)
+        return prefix + data if prefix else data
+
+    def flush(self):
+        """Get the data held back at the end of the stream
+
+        :rtype: bytes
+        """
+        if self.pending_cr:
+            self.pending_cr = False
+            return b"\r"
+        return b""
+
+
+def convert_file_line_ending(
+    in_file, out_file, line_ending, block_size=LINE_ENDING_BLOCK_SIZE
+):
     """Replace line endings of in_file and put data in out_file
 
-    .. seealso:: :meth:`convert_data_line_ending`
+    The file is read in blocks of fixed size: the memory used does not depend
+    on the size of the file.
+
+    .. seealso:: :class:`LineEndingConverter`
 
     :param in_file: Path of processed but not modified file.
     :param out_file: Path of result file.
     :param line_ending: Destination line ending
+    :param block_size: Size of the blocks read in in_file.
     :type line_ending: str
+    :type block_size: int
     """
     # Convert to bytes for binary files
     line_ending = line_ending.encode()
 
+    converter = LineEndingConverter(line_ending)
+
     with open(in_file, "rb") as in_file_fd, open(out_file, "wb") as out_file_fd:
-        out_file_fd.write(convert_data_line_ending(in_file_fd.read(), line_ending))
+        while True:
+            block = in_file_fd.read(block_size)
+            if not block:
+                break
+            out_file_fd.write(converter.convert(block))
+        out_file_fd.write(converter.flush())
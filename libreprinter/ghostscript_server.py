@@ -0,0 +1,338 @@
+# Libreprinter is a software allowing to use the Centronics and serial printing
+# functions of vintage computers on modern equipement through a tiny hardware
+# interface.
+# Copyright (C) 2020-2024  Ysard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Long-lived Ghostscript processes converting PostScript files to PDF
+
+Starting Ghostscript and initializing its fonts takes longer than the
+conversion of a small job on a Raspberry Pi. A :class:`GhostscriptWorker`
+keeps a Ghostscript process reading PostScript commands on its standard
+input; each job is converted by sending::
+
+    save /LPSave exch def
+    << /OutputFile (out.pdf) >> setpagedevice
+    { (in.ps) run } stopped { (LPFAILED) print $error /errorname get == } if
+    clear cleardictstack
+    << /OutputFile (/dev/null) >> setpagedevice
+    LPSave restore
+    (LPDONE 1) = flush
+
+Changing the output file closes the pdf of the job; save/restore isolate
+the jobs. The marker printed at the end of the job is the health check of the
+process: a process that doesn't answer in time (`ghostscript_timeout`
+setting) is killed and restarted.
+Processes are also restarted after `GS_MAX_JOBS` jobs to release their
+memory.
+
+:class:`GhostscriptServer` is a small pool of workers shared by threads.
+"""
+
+# Standard imports
+import os
+import time
+import queue
+import select
+import subprocess
+
+# Custom imports
+from libreprinter.commons import logger
+
+LOGGER = logger()
+
+GS_BINARY = "/usr/bin/gs"
+# Settings of the pdf files
+GS_PDF_SETTINGS = [
+    "-sColorConversionStrategy=RGB",
+    "-dCompatibilityLevel=1.7",  # Fix for reproductibility
+    "-dEmbedAllFonts=true",  # Increase the final size
+    "-dSubsetFonts=true",  # Reduce the final size
+]
+# Maximum duration (s) of a job, if not configured
+GS_JOB_TIMEOUT = 120
+# Maximum duration (s) of the start of a worker
+GS_START_TIMEOUT = 20
+# Jobs converted before the restart of a worker
+GS_MAX_JOBS = 100
+
+
+class GhostscriptError(Exception):
+    """PostScript error raised by a job"""
+
+
+def ps_string(text):
+    """Get a PostScript string literal
+
+    :type text: str
+    :rtype: bytes
+    """
+    text = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return b"(" + text.encode() + b")"
+
+
+class GhostscriptWorker:
+    """Ghostscript process converting PostScript files to PDF one by one
+
+    Attributes:
+        :param gs_path: Path of the Ghostscript binary.
+        :param settings: Additional command line settings.
+        :param read_dirs: Directories of the converted files.
+        :param write_dirs: Directories of the pdf files.
+        :param process: Running Ghostscript process.
+        :param jobs: Number of jobs converted by the process.
+        :type gs_path: str
+        :type settings: list[str]
+        :type read_dirs: list[str]
+        :type write_dirs: list[str]
+        :type process: subprocess.Popen | None
+        :type jobs: int
+    """
+
+    def __init__(self, read_dirs, write_dirs, gs_path=GS_BINARY, settings=None):
+        """Constructor
+
+        :param read_dirs: Directories of the converted files.
+        :param write_dirs: Directories of the pdf files.
+        :param gs_path: Path of the Ghostscript binary.
+        :param settings: Additional command line settings.
+        :type read_dirs: list[str]
+        :type write_dirs: list[str]
+        :type gs_path: str
+        :type settings: list[str] | None
+        """
+        self.gs_path = gs_path
+        self.settings = settings or []
+        self.read_dirs = read_dirs
+        self.write_dirs = write_dirs
+        self.process = None
+        self.jobs = 0
+        self._marker = 0
+
+    @property
+    def command(self):
+        """Command line of the Ghostscript process
+
+        Files can only be read and written in the given directories (SAFER).
+
+        :rtype: list[str]
+        """
+        return [
+            self.gs_path,
+            "-q",
+            "-dSAFER",
+            "-dNOPAUSE",
+            "-sDEVICE=pdfwrite",
+            *GS_PDF_SETTINGS,
+            *self.settings,
+            "-sOutputFile=/dev/null",
+            *(f"--permit-file-read={os.path.join(path, '')}" for path in self.read_dirs),
+            *(f"--permit-file-write={os.path.join(path, '')}" for path in self.write_dirs),
+            "--permit-file-write=/dev/null",
+            # Unbuffered standard input: commands are executed as they arrive
+            "-_",
+        ]
+
+    def start(self):
+        """Start the Ghostscript process and wait until it is ready
+
+        :raises TimeoutError: The process doesn't answer.
+        :raises ChildProcessError: The process is stopped.
+        """
+        self.stop()
+        start = time.monotonic()
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        self.jobs = 0
+        self._send(b"")
+        self._wait_marker(GS_START_TIMEOUT)
+        LOGGER.debug(
+            "Ghostscript worker %d started in %.3f s",
+            self.process.pid,
+            time.monotonic() - start,
+        )
+
+    def stop(self):
+        """Stop the Ghostscript process"""
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+        self.process = None
+
+    def convert(self, in_file, out_file, timeout=GS_JOB_TIMEOUT):
+        """Convert a PostScript file to PDF
+
+        The process is started if needed; it is stopped if it doesn't answer.
+
+        :param in_file: PostScript file.
+        :param out_file: Pdf file.
+        :param timeout: Maximum duration of the conversion; no limit if None.
+        :type in_file: str
+        :type out_file: str
+        :type timeout: float | None
+        :raises GhostscriptError: PostScript error in the job.
+        :raises TimeoutError: The process doesn't answer.
+        :raises ChildProcessError: The process is stopped.
+        """
+        if self.process is None or self.process.poll() is not None:
+            self.start()
+
+        self._send(
+            b"save /LPSave exch def\n"
+            b"<< /OutputFile " + ps_string(out_file) + b" >> setpagedevice\n"
+            b"{ " + ps_string(in_file) + b" run } stopped "
+            b"{ (LPFAILED ) print $error /errorname get == } if\n"
+            b"clear cleardictstack\n"
+            b"<< /OutputFile (/dev/null) >> setpagedevice\n"
+            b"LPSave restore\n"
+        )
+        try:
+            output = self._wait_marker(timeout)
+        except (TimeoutError, ChildProcessError):
+            self.stop()
+            raise
+        self.jobs += 1
+        if self.jobs >= GS_MAX_JOBS:
+            self.stop()
+
+        if b"LPFAILED " in output:
+            error = output.partition(b"LPFAILED ")[2].partition(b"\n")[0]
+            raise GhostscriptError(
+                f"PostScript error {error.decode(errors='replace')} in <{in_file}>"
+            )
+
+    def _send(self, commands):
+        """Send commands followed by a new marker
+
+        :type commands: bytes
+        :raises ChildProcessError: The process is stopped.
+        """
+        self._marker += 1
+        try:
+            self.process.stdin.write(commands + b"(LPDONE %d) = flush\n" % self._marker)
+            self.process.stdin.flush()
+        except BrokenPipeError as e:
+            raise ChildProcessError("Ghostscript worker stopped") from e
+
+    def _wait_marker(self, timeout):
+        """Read the output of the process until the last marker
+
+        :param timeout: Maximum waiting time; no limit if None.
+        :type timeout: float | None
+        :return: Output of the process before the marker.
+        :rtype: bytes
+        :raises TimeoutError: The marker is not received in time.
+        :raises ChildProcessError: The process is stopped.
+        """
+        marker = b"LPDONE %d\n" % self._marker
+        output = b""
+        fd = self.process.stdout.fileno()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not output.endswith(marker):
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError("Ghostscript worker doesn't answer")
+            if not select.select([fd], [], [], remaining)[0]:
+                continue
+            data = os.read(fd, 4096)
+            if not data:
+                raise ChildProcessError(
+                    "Ghostscript worker stopped: " + output.decode(errors="replace")
+                )
+            output += data
+        return output[: -len(marker)]
+
+
+class GhostscriptServer:
+    """Pool of Ghostscript workers shared by threads
+
+    Attributes:
+        :param size: Number of workers.
+        :param workers: Idle workers.
+        :param timeout: Maximum duration of a job; no limit if None.
+        :type size: int
+        :type workers: queue.Queue[GhostscriptWorker]
+        :type timeout: float | None
+    """
+
+    def __init__(
+        self, size, read_dirs, write_dirs, gs_path=GS_BINARY, settings=None,
+        timeout=GS_JOB_TIMEOUT,
+    ):
+        """Constructor
+
+        :param size: Number of workers.
+        :param read_dirs: Directories of the converted files.
+        :param write_dirs: Directories of the pdf files.
+        :param gs_path: Path of the Ghostscript binary.
+        :param settings: Additional command line settings.
+        :param timeout: Maximum duration of a job; no limit if None.
+        :type size: int
+        :type read_dirs: list[str]
+        :type write_dirs: list[str]
+        :type gs_path: str
+        :type settings: list[str] | None
+        :type timeout: float | None
+        """
+        self.size = size
+        self.timeout = timeout
+        self.workers = queue.Queue()
+        for _ in range(size):
+            self.workers.put(GhostscriptWorker(read_dirs, write_dirs, gs_path, settings))
+
+    def warm_up(self):
+        """Start the workers before the first jobs"""
+        workers = [self.workers.get() for _ in range(self.size)]
+        try:
+            for worker in workers:
+                worker.start()
+        except OSError as e:
+            # TimeoutError, ChildProcessError or missing binary
+            LOGGER.error("Ghostscript worker not started: %s", e)
+        finally:
+            for worker in workers:
+                self.workers.put(worker)
+
+    def convert(self, in_file, out_file):
+        """Convert a PostScript file to PDF with an idle worker
+
+        .. seealso:: :meth:`GhostscriptWorker.convert`
+        """
+        worker = self.workers.get()
+        try:
+            worker.convert(in_file, out_file, self.timeout)
+        finally:
+            self.workers.put(worker)
+
+    def stop(self):
+        """Stop the idle workers; they are started again by the next jobs"""
+        workers = []
+        try:
+            while True:
+                workers.append(self.workers.get_nowait())
+        except queue.Empty:
+            pass
+        for worker in workers:
+            worker.stop()
+            self.workers.put(worker)
@@ -1,3 +1,8 @@
-from libreprinter.handlers.serial_handler import get_serial_handler, SerialException
+from libreprinter.handlers.serial_handler import (
+    get_serial_handler,
+    ReceiveBuffer,
+    SerialException,
+)
+from libreprinter.handlers.usb_handler import UsbPassthroughSink
 
-__all__ = [get_serial_handler, SerialException]
+__all__ = [get_serial_handler, ReceiveBuffer, SerialException, UsbPassthroughSink]
@@ -21,7 +21,12 @@ Basically get a serial handler used in the :meth:`libreprinter.interface` module
 
 # Standard imports
 import os
+import math
 import time
+import fcntl
+import select
+import struct
+import termios
 import serial
 
 # Import here the serial exception used in the interface module
@@ -33,6 +38,15 @@ from libreprinter.commons import logger
 
 LOGGER = logger()
 
+# Maximum delay (s) added to a read to let more bytes arrive
+READ_LATENCY = 0.05
+# Pause (s) after which the data rate is forgotten: the first bytes of
+# a new transfer are read without delay
+IDLE_DELAY = 0.5
+# Size of the input buffer of the tty layer (N_TTY): bytes are not
+# accumulated beyond it to avoid throttling the interface
+TTY_BUFFER_SIZE = 4096
+
 
 def _get_serial_handler(serial_path):
     """Open serial port and return serial handler
@@ -99,3 +113,222 @@ def get_serial_handler(serial_path):
             return serial_handler
         error += 1
         time.sleep(1)
+
+
+class ReceiveBuffer:
+    """Preallocated buffers filled with the data received on the serial port
+
+    Data is read directly into a ring of preallocated bytearrays
+    (`os.readv` on the file descriptor of the port); no buffer is allocated
+    during the reception. Chunks are returned as memoryviews on these
+    buffers.
+
+    .. warning:: A returned chunk is valid until its slot is reused,
+        i.e. after `slots` further reads. Copy it to keep it longer.
+
+    The size of the reads follows the data rate: when bytes are received
+    continuously, a read waits (at most `latency` seconds) until the number
+    of bytes waiting in the port (`in_waiting`) reaches the quantity expected
+    during this latency. Slow transfers are then processed in a few reads
+    instead of 1 read per byte. The first bytes after a pause are read
+    without delay.
+
+    Attributes:
+        :param serial_handler: Serial port handler.
+        :param slots: Preallocated buffers of the ring.
+        :param views: Memoryviews on the preallocated buffers.
+        :param index: Index of the next slot to be filled.
+        :param latency: Maximum delay added to a read to let more bytes arrive.
+        :param rate: Estimated data rate in bytes/s; 0 after a pause.
+        :param last_read: Time of the last read (monotonic clock).
+        :param read_calls: Number of read syscalls made.
+        :param syscalls: Number of syscalls made (poll, ioctl, read).
+        :param received_bytes: Number of bytes received.
+        :param poller: Poll object on the file descriptor of the port.
+        :type serial_handler: serial.Serial
+        :type slots: list[bytearray]
+        :type views: list[memoryview]
+        :type index: int
+        :type latency: float
+        :type rate: float
+        :type last_read: float | None
+        :type read_calls: int
+        :type syscalls: int
+        :type received_bytes: int
+        :type poller: select.poll | None
+    """
+
+    def __init__(self, serial_handler, size=8000, slots=2, latency=READ_LATENCY):
+        """Constructor
+
+        :param serial_handler: Serial port handler.
+        :param size: Size of each buffer (maximum size of a chunk).
+        :param slots: Number of buffers in the ring.
+        :param latency: Maximum delay added to a read to let more bytes arrive.
+        :type serial_handler: serial.Serial
+        :type size: int
+        :type slots: int
+        :type latency: float
+        """
+        self.serial_handler = serial_handler
+        self.slots = [bytearray(size) for _ in range(slots)]
+        self.views = [memoryview(slot) for slot in self.slots]
+        self.index = 0
+        self.latency = latency
+        self.rate = 0
+        self.last_read = None
+        self.read_calls = 0
+        self.syscalls = 0
+        self.received_bytes = 0
+        self.poller = None
+
+    @property
+    def average_chunk_size(self):
+        """Average number of bytes returned by a read
+
+        :rtype: float
+        """
+        return self.received_bytes / self.read_calls if self.read_calls else 0
+
+    @property
+    def syscalls_per_mb(self):
+        """Number of syscalls made to receive 1 MB
+
+        :rtype: float
+        """
+        if not self.received_bytes:
+            return 0
+        return self.syscalls * 1000000 / self.received_bytes
+
+    def log_stats(self):
+        """Log the counters of the reception"""
+        LOGGER.debug(
+            "Reception: %d bytes, %d reads, %.1f bytes/read, %.0f syscalls/MB, "
+            "rate: %.0f bytes/s",
+            self.received_bytes,
+            self.read_calls,
+            self.average_chunk_size,
+            self.syscalls_per_mb,
+            self.rate,
+        )
+
+    def next_view(self):
+        """Get the memoryview on the slot to be filled by the next read
+
+        The ring advances only when a read returns data (see
+        :meth:`update_rate`): a chunk stays valid until `slots - 1` other
+        chunks are returned.
+
+        :rtype: memoryview
+        """
+        return self.views[self.index]
+
+    def read(self, timeout):
+        """Wait for data on the serial port and read the available bytes
+
+        :param timeout: Maximum waiting time in seconds.
+        :type timeout: float
+        :return: None if no data is received before the timeout,
+            a memoryview on the received bytes otherwise.
+        :rtype: memoryview | None
+        :raises SerialException: If the port is readable but returns no data.
+        """
+        try:
+            fd = self.serial_handler.fileno()
+        except (AttributeError, OSError):
+            # Not a posix port: let pyserial do the job
+            return self._read_serial_handler(timeout)
+
+        if self.poller is None:
+            self.poller = select.poll()
+            self.poller.register(fd, select.POLLIN)
+
+        self.syscalls += 1
+        if not self.poller.poll(math.ceil(timeout * 1000)):
+            return
+
+        self.wait_bytes(fd)
+
+        view = self.next_view()
+        try:
+            size = os.readv(fd, [view])
+        except BlockingIOError:
+            # Spurious wake up
+            return
+        except OSError as e:
+            raise SerialException(f"read failed: {e}") from e
+
+        self.read_calls += 1
+        self.syscalls += 1
+        if not size:
+            # Same diagnostic as pyserial
+            raise SerialException(
+                "device reports readiness to read but returned no data "
+                "(device disconnected or multiple access on port?)"
+            )
+
+        self.update_rate(size)
+        return view[:size]
+
+    def in_waiting(self, fd):
+        """Get the number of bytes waiting in the input buffer of the port
+
+        Same ioctl as the `in_waiting` property of pyserial (TIOCINQ,
+        alias of FIONREAD), also supported by pipes.
+
+        :rtype: int
+        """
+        self.syscalls += 1
+        try:
+            buffer = fcntl.ioctl(fd, termios.FIONREAD, b"\0\0\0\0")
+        except OSError:
+            return 0
+        return struct.unpack("I", buffer)[0]
+
+    def wait_bytes(self, fd):
+        """Let the bytes expected during the latency arrive before a read
+
+        Nothing is done after a pause (unknown rate): the first bytes of
+        a transfer are processed promptly.
+        """
+        if not self.rate:
+            return
+        expected = min(
+            self.rate * self.latency, TTY_BUFFER_SIZE, len(self.slots[0])
+        )
+        waiting = self.in_waiting(fd)
+        if waiting < expected:
+            time.sleep(min((expected - waiting) / self.rate, self.latency))
+
+    def update_rate(self, size):
+        """Update the ring, the counters and the estimated data rate after a read
+
+        :param size: Number of bytes read.
+        :type size: int
+        """
+        now = time.monotonic()
+        self.index = (self.index + 1) % len(self.views)
+        self.received_bytes += size
+        if self.last_read is None or now - self.last_read > IDLE_DELAY:
+            # New transfer
+            self.rate = 0
+        else:
+            rate = size / max(now - self.last_read, 1e-6)
+            # Exponential moving average
+            self.rate = rate if not self.rate else 0.7 * self.rate + 0.3 * rate
+        self.last_read = now
+
+    def _read_serial_handler(self, timeout):
+        """Fallback of :meth:`read` based on the `readinto` method of the port
+
+        :rtype: memoryview | None
+        """
+        self.serial_handler.timeout = timeout
+        view = self.next_view()
+        size = self.serial_handler.readinto(view)
+        self.read_calls += 1
+        self.syscalls += 1
+        if not size:
+            return
+        self.update_rate(size)
+        return view[:size]
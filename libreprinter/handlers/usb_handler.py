@@ -0,0 +1,395 @@
+# Libreprinter is a software allowing to use the Centronics and serial printing
+# functions of vintage computers on modern equipement through a tiny hardware
+# interface.
+# Copyright (C) 2020-2024  Ysard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Forward the received data to a USB printer (usb_passthrough setting)
+
+The printer device (`/dev/usb/lpX`) is written by a dedicated thread with
+non-blocking writes; the reception of the serial port only copies the data
+in a bounded buffer. The overflow is written to the disk by another thread.
+See :class:`UsbPassthroughSink`.
+"""
+
+# Standard imports
+import os
+import errno
+import select
+import tempfile
+import threading
+from collections import deque
+
+# Custom imports
+from libreprinter.commons import logger
+
+LOGGER = logger()
+
+# Bytes kept in memory for the printer
+USB_BUFFER_SIZE = 1024 * 1024
+# Maximum size of the spill file; further data is dropped
+USB_SPILL_SIZE = 64 * 1024 * 1024
+# Spilled bytes kept in memory while waiting for the disk; further data is dropped
+USB_SPILL_QUEUE_SIZE = 4 * 1024 * 1024
+# Maximum size of a write to the printer
+USB_WRITE_SIZE = 16384
+# Delay (s) between 2 attempts to open the printer
+USB_RETRY_DELAY = 1
+
+
+class UsbPassthroughSink:
+    """Bounded buffer drained to a USB printer by a thread
+
+    The device is opened with O_NONBLOCK and written when `poll` reports that
+    it is ready. An offline printer is opened again every `USB_RETRY_DELAY`
+    seconds. When the buffer is full, the overflow policy applies:
+
+        - block: the caller waits for free space (the reception is stopped);
+        - spill: data is appended to a temporary file in `spill_dir`, and sent
+          after the buffer (the order is kept); when the file reaches
+          `spill_capacity`, further data is dropped. The file is written by a
+          thread: the caller doesn't wait for the disk (data is dropped if
+          `USB_SPILL_QUEUE_SIZE` bytes are waiting for it);
+        - drop: data is discarded and counted.
+
+    The unavailability of the printer is logged once, as its return.
+
+    Attributes:
+        :param device_path: Path of the printer device.
+        :param policy: Overflow policy: block, spill or drop.
+        :param spill_dir: Directory of the spill file.
+        :param buffer: Bytes waiting to be written.
+        :param capacity: Maximum size of the buffer.
+        :param spill_capacity: Maximum size of the spill file.
+        :param spill_file: Temporary file of the spilled bytes.
+        :param spill_queue: Spilled bytes waiting to be written to the file.
+        :param spill_offset: Position of the next spilled byte to be sent.
+        :param spill_written: Size of the data written to the spill file.
+        :param spill_size: Size of the spilled data, in the file or waiting
+            for it.
+        :param written_bytes: Bytes written to the printer.
+        :param spilled_bytes: Bytes written to the spill file.
+        :param dropped_bytes: Bytes discarded.
+        :param available: The printer could be opened at the last attempt.
+        :type device_path: str
+        :type policy: str
+        :type spill_dir: str | None
+        :type buffer: bytearray
+        :type capacity: int
+        :type spill_capacity: int
+        :type spill_file: io.BufferedRandom | None
+        :type spill_queue: collections.deque[bytes]
+        :type spill_offset: int
+        :type spill_written: int
+        :type spill_size: int
+        :type written_bytes: int
+        :type spilled_bytes: int
+        :type dropped_bytes: int
+        :type available: bool
+    """
+
+    def __init__(
+        self,
+        device_path,
+        policy="spill",
+        spill_dir=None,
+        capacity=USB_BUFFER_SIZE,
+        spill_capacity=USB_SPILL_SIZE,
+    ):
+        """Constructor
+
+        :param device_path: Path of the printer device.
+        :param policy: Overflow policy: block, spill or drop.
+        :param spill_dir: Directory of the spill file.
+        :param capacity: Maximum size of the buffer.
+        :param spill_capacity: Maximum size of the spill file.
+        :type device_path: str
+        :type policy: str
+        :type spill_dir: str | None
+        :type capacity: int
+        :type spill_capacity: int
+        """
+        self.device_path = device_path
+        self.policy = policy
+        self.spill_dir = spill_dir
+        self.buffer = bytearray()
+        self.capacity = capacity
+        self.spill_capacity = spill_capacity
+        self.spill_file = None
+        self.spill_queue = deque()
+        self.spill_offset = 0
+        self.spill_written = 0
+        self.spill_size = 0
+        self.written_bytes = 0
+        self.spilled_bytes = 0
+        self.dropped_bytes = 0
+        self.available = True
+        self._fd = None
+        self._poller = None
+        self._closing = False
+        # Size of the spill queue, including the data being written
+        self._spill_queued = 0
+        # The spill file must be truncated before the next write
+        self._truncate = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="UsbPassthroughSink", daemon=True
+        )
+        self._thread.start()
+        self._spill_thread = None
+        if policy == "spill":
+            self._spill_thread = threading.Thread(
+                target=self._run_spill, name="UsbPassthroughSpill", daemon=True
+            )
+            self._spill_thread.start()
+
+    @property
+    def pending(self):
+        """Bytes not yet written to the printer
+
+        :rtype: int
+        """
+        return len(self.buffer) + self.spill_size - self.spill_offset
+
+    def write(self, data):
+        """Queue data for the printer; the data is copied
+
+        :param data: Received bytes.
+        :type data: bytes | bytearray | memoryview
+        """
+        with self._condition:
+            if self.spill_size:
+                # Spilled data is sent first: keep the order
+                self._spill(data)
+                return
+
+            free = self.capacity - len(self.buffer)
+            if len(data) > free:
+                if self.policy == "block":
+                    data = memoryview(data)
+                    while len(data) > free and not self._closing:
+                        self.buffer += data[:free]
+                        data = data[free:]
+                        self._condition.notify_all()
+                        self._condition.wait_for(
+                            lambda: len(self.buffer) < self.capacity or self._closing
+                        )
+                        free = self.capacity - len(self.buffer)
+                elif self.policy == "spill":
+                    self.buffer += data[:free]
+                    self._spill(data[free:])
+                    data = b""
+                else:
+                    self._drop(data[free:])
+                    data = data[:free]
+
+            self.buffer += data
+            self._condition.notify_all()
+
+    def log_stats(self):
+        """Log the bytes pending for the printer"""
+        log = LOGGER.info if self.pending else LOGGER.debug
+        log(
+            "USB passthrough: %d bytes pending, %d written, %d spilled, %d dropped",
+            self.pending,
+            self.written_bytes,
+            self.spilled_bytes,
+            self.dropped_bytes,
+        )
+
+    def close(self, timeout=None):
+        """Stop the thread and close the device
+
+        Pending bytes are written until the timeout expires.
+
+        :param timeout: Maximum waiting time in seconds; no limit if None.
+        :type timeout: float | None
+        """
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        if self._spill_thread:
+            self._spill_thread.join(timeout)
+        self._thread.join(timeout)
+        if self.pending:
+            LOGGER.warning("USB passthrough: %d bytes not sent", self.pending)
+        if self.spill_file and not self._thread.is_alive():
+            self.spill_file.close()
+
+    def _drop(self, data):
+        """Discard data
+
+        .. note:: The lock must be held.
+        """
+        if not self.dropped_bytes:
+            LOGGER.warning("USB passthrough buffer full, data will be dropped!")
+        self.dropped_bytes += len(data)
+
+    def _spill(self, data):
+        """Queue data for the spill file; drop what exceeds its capacity
+
+        The data is copied and written by the spill thread.
+
+        .. note:: The lock must be held.
+        """
+        free = min(
+            self.spill_capacity - self.spill_size,
+            USB_SPILL_QUEUE_SIZE - self._spill_queued,
+        )
+        if len(data) > free:
+            self._drop(data[free:])
+            data = data[:free]
+            if not data:
+                return
+        self.spill_queue.append(bytes(data))
+        self._spill_queued += len(data)
+        self.spill_size += len(data)
+        self.spilled_bytes += len(data)
+        self._condition.notify_all()
+
+    def _sendable(self):
+        """Tell if data can be written to the printer
+
+        .. note:: The lock must be held.
+
+        :rtype: bool
+        """
+        return bool(self.buffer) or self.spill_written > self.spill_offset
+
+    def _refill(self):
+        """Move spilled data to the buffer; the file is read without the lock"""
+        with self._condition:
+            offset = self.spill_offset
+            size = min(self.capacity, self.spill_written - offset)
+        data = os.pread(self.spill_file.fileno(), size, offset)
+        with self._condition:
+            self.buffer += data
+            self.spill_offset += len(data)
+            if self.spill_offset == self.spill_size:
+                # Everything is back in memory
+                self.spill_offset = self.spill_written = self.spill_size = 0
+                self._truncate = True
+                self._condition.notify_all()
+
+    def _run_spill(self):
+        """Write the spilled data to the spill file until :meth:`close` is called
+
+        Data queued before :meth:`close` is written.
+        """
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self.spill_queue or self._truncate or self._closing
+                )
+                if not self.spill_queue and not self._truncate:
+                    break
+                truncate, self._truncate = self._truncate, False
+                data = self.spill_queue.popleft() if self.spill_queue else b""
+                offset = self.spill_written
+
+            written = 0
+            try:
+                if self.spill_file is None:
+                    self.spill_file = tempfile.TemporaryFile(dir=self.spill_dir)
+                if truncate:
+                    # Everything was sent: the next data is written at 0
+                    self.spill_file.truncate(0)
+                with memoryview(data) as view:
+                    while written < len(data):
+                        written += os.pwrite(
+                            self.spill_file.fileno(), view[written:], offset + written
+                        )
+            except OSError as e:
+                LOGGER.error("USB passthrough spill file error: %s", e)
+
+            with self._condition:
+                self.spill_written += written
+                self._spill_queued -= len(data)
+                if written < len(data):
+                    # Data not written is lost
+                    self.spill_size -= len(data) - written
+                    self.spilled_bytes -= len(data) - written
+                    self._drop(data[written:])
+                self._condition.notify_all()
+
+    def _open_device(self):
+        """Open the printer; return False if it is not available
+
+        :rtype: bool
+        """
+        try:
+            self._fd = os.open(self.device_path, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError as e:
+            # Logged once until the return of the printer
+            log = LOGGER.error if self.available else LOGGER.debug
+            log("USB printer <%s> not available: %s", self.device_path, e)
+            self.available = False
+            return False
+        if not self.available:
+            LOGGER.info("USB printer <%s> available again", self.device_path)
+            self.available = True
+        self._poller = select.poll()
+        self._poller.register(self._fd, select.POLLOUT)
+        return True
+
+    def _close_device(self):
+        """Close the printer"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _run(self):
+        """Write the buffer to the printer until :meth:`close` is called"""
+        while True:
+            with self._condition:
+                # With close(), spilled data is awaited until it is on the disk
+                self._condition.wait_for(
+                    lambda: self._sendable()
+                    or (self._closing and not self._spill_queued)
+                    or (self._closing and self._fd is None)
+                )
+                if self._closing and (not self.pending or self._fd is None):
+                    break
+
+            if self._fd is None and not self._open_device():
+                with self._condition:
+                    self._condition.wait(USB_RETRY_DELAY)
+                continue
+
+            if not self._poller.poll(USB_RETRY_DELAY * 1000):
+                # Printer busy
+                continue
+
+            with self._condition:
+                refill = not self.buffer
+            if refill:
+                self._refill()
+
+            with self._condition:
+                try:
+                    with memoryview(self.buffer) as view:
+                        with view[:USB_WRITE_SIZE] as chunk:
+                            size = os.write(self._fd, chunk)
+                except BlockingIOError:
+                    continue
+                except OSError as e:
+                    if e.errno != errno.EAGAIN:
+                        LOGGER.error("USB printer <%s> error: %s", self.device_path, e)
+                        self._close_device()
+                    continue
+                del self.buffer[:size]
+                self.written_bytes += size
+                self._condition.notify_all()
+
+        self._close_device()
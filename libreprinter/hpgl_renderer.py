@@ -0,0 +1,498 @@
+# Libreprinter is a software allowing to use the Centronics and serial printing
+# functions of vintage computers on modern equipement through a tiny hardware
+# interface.
+# Copyright (C) 2020-2024  Ysard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Native HP-GL to PDF renderer
+
+Most plots are only made of pen moves: converting them with hp2xx and
+Ghostscript costs 2 process launches and a round trip through PostScript.
+:class:`HpglRenderer` interprets the HP-GL instructions in Python; the
+coordinates of the lines are batched in NumPy arrays and directly written
+as PDF path operators. Like hp2xx, the size of the page is computed from
+the extents of the drawing.
+
+Supported instructions:
+
+    - IN, SP, PU, PD, PA, PR, LT, CI, LB;
+    - IW before the drawing (clipping of the whole page), PG at the end of
+      the plot;
+    - device control instructions (escape sequences), IP, VS are ignored.
+
+Any other instruction raises :class:`UnsupportedHpgl`: the plot must be
+converted by hp2xx.
+"""
+
+# Standard imports
+import re
+import zlib
+import math
+from itertools import accumulate
+import numpy as np
+
+# Custom imports
+from libreprinter.commons import logger
+
+LOGGER = logger()
+
+# Plotter units (0.025 mm) to PDF points (1/72 inch)
+POINTS_PER_UNIT = 72 / 1016
+# Maximum absolute value of the coordinates (plotter units)
+MAX_COORDINATE = 2**30
+# Width of the pen (0.1 mm, like hp2xx) in plotter units
+PEN_WIDTH = 4
+# RGB colors of the pens 1, 2, 3...
+PEN_COLORS = [
+    (0, 0, 0),  # black
+    (1, 0, 0),  # red
+    (0, 1, 0),  # green
+    (0, 0, 1),  # blue
+    (0, 1, 1),  # cyan
+    (1, 0, 1),  # magenta
+    (1, 1, 0),  # yellow
+]
+# Dashes and gaps of the line types in percent of the pattern length
+LINE_TYPES = {
+    1: (0, 100),
+    2: (50, 50),
+    3: (70, 30),
+    4: (80, 10, 0, 10),
+    5: (70, 10, 10, 10),
+    6: (50, 10, 10, 10, 10, 10),
+}
+# Default pattern length in percent of the diagonal of the plot
+PATTERN_LENGTH = 4
+# Default chord angle (degrees) of the circles
+CHORD_ANGLE = 5
+# Default width & height of the characters of the labels in plotter units
+CHAR_WIDTH = 76
+CHAR_HEIGHT = 108
+# Courier: monospaced like the characters of the plotters
+FONT_CAP_HEIGHT = 0.562
+FONT_ADVANCE = 0.6
+LABEL_TERMINATOR = b"\x03"
+# Fast compression of the content stream (mostly digits)
+COMPRESSION_LEVEL = 1
+
+# Separators, then an escape sequence (device control) or a mnemonic and
+# its parameters
+INSTRUCTION_PATTERN = re.compile(
+    rb"[^A-Za-z\x1b]*(?:(\x1b\.[\x20-\x7e](?:[\d;]*:)?)|([A-Za-z]{2})([^A-Za-z;\x1b]*);?)"
+)
+# Data that is not a separator
+UNPARSED_PATTERN = re.compile(rb"[A-Za-z\x1b]")
+NUMBER_PATTERN = re.compile(rb"[-+]?(?:\d+(?:\.\d*)?|\.\d+)")
+IGNORED_INSTRUCTIONS = {b"IP", b"VS"}
+
+
+class UnsupportedHpgl(Exception):
+    """HP-GL data not supported by the native renderer"""
+
+
+class HpglRenderer:
+    """Interpreter of the HP-GL instructions drawing a PDF page
+
+    Lines drawn with the same pen and line type are grouped in a path;
+    the coordinates of a path are stored until the end of the plot.
+
+    Attributes:
+        :param paths: Finished paths: pen, line type, x & y coordinates,
+            starts of the subpaths.
+        :param xs: X coordinates of the current path.
+        :param ys: Y coordinates of the current path.
+        :param starts: Points of the current path starting a subpath.
+        :param labels: Pen, x, y, width & height of the characters and text of
+            each line of the labels.
+        :param pen: Selected pen (0: no pen).
+        :param pen_down: Pen lowered.
+        :param relative: Coordinates of PU/PD are relative (PR).
+        :param position: Current position in plotter units.
+        :param line_type: Line type and pattern length (percent); None for
+            solid lines.
+        :param window: Clipping window (IW) or None.
+        :param in_subpath: The last point of the current subpath is the
+            current position.
+        :param ended: Page ended by PG.
+        :type paths: list[tuple]
+        :type xs: list[float]
+        :type ys: list[float]
+        :type starts: list[bool]
+        :type labels: list[tuple]
+        :type pen: int
+        :type pen_down: bool
+        :type relative: bool
+        :type position: tuple[float]
+        :type line_type: tuple[int, float] | None
+        :type window: tuple[float] | None
+        :type in_subpath: bool
+        :type ended: bool
+    """
+
+    def __init__(self):
+        """Constructor"""
+        self.paths = []
+        self.labels = []
+        self.pen = 1
+        self.xs = []
+        self.ys = []
+        self.starts = []
+        self.window = None
+        self.ended = False
+        self.reset()
+
+    def reset(self):
+        """Initialize the plotter state (IN)"""
+        self.flush()
+        self.pen_down = False
+        self.relative = False
+        self.position = (0, 0)
+        self.line_type = None
+        self.in_subpath = False
+
+    def flush(self):
+        """End the current path; called before any change of the style"""
+        if self.xs:
+            self.paths.append((self.pen, self.line_type, self.xs, self.ys, self.starts))
+            self.xs, self.ys, self.starts = [], [], []
+        self.in_subpath = False
+
+    def check_page(self):
+        """Check that the plot has only one page
+
+        :raise UnsupportedHpgl: If something is drawn after a PG instruction.
+        """
+        if self.ended:
+            raise UnsupportedHpgl("PG: several pages")
+
+    def add_point(self, x, y):
+        """Draw a line from the current position to the given one
+
+        :type x: float
+        :type y: float
+        """
+        if self.pen_down and self.pen:
+            self.check_page()
+            if self.line_type and self.line_type[0] == 0:
+                # Dots at the given points only
+                self.xs += (x, x)
+                self.ys += (y, y)
+                self.starts += (True, False)
+            else:
+                if not self.in_subpath:
+                    self.xs.append(self.position[0])
+                    self.ys.append(self.position[1])
+                    self.starts.append(True)
+                self.xs.append(x)
+                self.ys.append(y)
+                self.starts.append(False)
+                self.in_subpath = True
+        else:
+            self.in_subpath = False
+        self.position = (x, y)
+
+    def move(self, values, relative):
+        """Move the pen through the given coordinates (PU, PD, PA, PR)
+
+        :param values: x, y, x, y... Odd values are ignored.
+        :param relative: Coordinates relative to the current position.
+        :type values: list[float]
+        :type relative: bool
+        """
+        count = len(values) // 2
+        if not count:
+            return
+        xs, ys = values[0:count * 2:2], values[1:count * 2:2]
+        if relative:
+            xs = list(accumulate(xs, initial=self.position[0]))[1:]
+            ys = list(accumulate(ys, initial=self.position[1]))[1:]
+
+        if self.pen_down and self.pen and not (self.line_type and self.line_type[0] == 0):
+            # Batch of lines
+            self.add_point(xs[0], ys[0])
+            self.xs += xs[1:]
+            self.ys += ys[1:]
+            self.starts += [False] * (count - 1)
+            self.position = (xs[-1], ys[-1])
+            return
+        for x, y in zip(xs, ys):
+            self.add_point(x, y)
+
+    def circle(self, values):
+        """Draw a circle around the current position (CI)
+
+        :param values: Radius, optional chord angle in degrees.
+        :type values: list[float]
+        """
+        if not values or not self.pen:
+            return
+        self.check_page()
+        radius = values[0]
+        chord_angle = min(max(abs(values[1]), 0.5), 180) if len(values) > 1 else CHORD_ANGLE
+        angles = np.linspace(0, 2 * np.pi, max(math.ceil(360 / chord_angle), 3) + 1)
+        center_x, center_y = self.position
+        # Negative radius: start at 180°
+        self.xs += (center_x + radius * np.cos(angles)).tolist()
+        self.ys += (center_y + radius * np.sin(angles)).tolist()
+        self.starts += [True] + [False] * (len(angles) - 1)
+        # The pen is back at the center
+        self.in_subpath = False
+
+    def label(self, text):
+        """Draw a label from the current position (LB)
+
+        Characters are drawn in cells of 1.5 x their width; the position is
+        moved at the end of the label.
+
+        :type text: bytes
+        """
+        if not self.pen:
+            return
+        self.check_page()
+        width, height = CHAR_WIDTH, CHAR_HEIGHT
+        start_x, y = self.position
+        x = start_x
+        for line in re.split(rb"(\r|\n)", text):
+            if line == b"\r":
+                x = start_x
+            elif line == b"\n":
+                # Line spacing: 2 x height of the characters
+                y -= 2 * height
+            elif line:
+                line = bytes(char for char in line if char >= 0x20)
+                self.labels.append((self.pen, x, y, width, height, line))
+                x += 1.5 * width * len(line)
+        self.position = (x, y)
+        self.in_subpath = False
+
+    def feed(self, data):
+        """Interpret HP-GL instructions
+
+        :param data: Whole plot.
+        :type data: bytes
+        :raise UnsupportedHpgl: If an instruction is not supported, or if
+            data can't be parsed.
+        """
+        pos = 0
+        while True:
+            match = INSTRUCTION_PATTERN.match(data, pos)
+            if not match:
+                # Only separators can remain at the end of the plot
+                if UNPARSED_PATTERN.search(data, pos):
+                    raise UnsupportedHpgl(f"unparsed data at byte {pos}")
+                break
+            pos = match.end()
+            if match.group(1):
+                # Device control instruction
+                continue
+            mnemonic = match.group(2).upper()
+
+            if mnemonic == b"LB":
+                # The text starts just after the mnemonic
+                start = match.start(3)
+                end = data.find(LABEL_TERMINATOR, start)
+                end = len(data) if end == -1 else end
+                self.label(data[start:end])
+                pos = end + 1
+                continue
+
+            values = [float(value) for value in NUMBER_PATTERN.findall(match.group(3))]
+            if any(abs(value) > MAX_COORDINATE for value in values):
+                raise UnsupportedHpgl("coordinates out of range")
+
+            if mnemonic in (b"PA", b"PR"):
+                self.relative = mnemonic == b"PR"
+                self.move(values, self.relative)
+            elif mnemonic in (b"PU", b"PD"):
+                if mnemonic == b"PU" and self.pen_down and not self.in_subpath:
+                    # Pen lowered and raised at the same position: dot
+                    self.add_point(*self.position)
+                self.pen_down = mnemonic == b"PD"
+                self.move(values, self.relative)
+            elif mnemonic == b"CI":
+                self.circle(values)
+            elif mnemonic == b"SP":
+                pen = int(values[0]) if values else 0
+                if pen != self.pen:
+                    self.flush()
+                    self.pen = pen
+            elif mnemonic == b"LT":
+                line_type = (
+                    (abs(int(values[0])), values[1] if len(values) > 1 else PATTERN_LENGTH)
+                    if values else None
+                )
+                if line_type != self.line_type:
+                    self.flush()
+                    self.line_type = line_type
+            elif mnemonic == b"IN":
+                self.reset()
+            elif mnemonic == b"IW":
+                if self.paths or self.xs or self.labels:
+                    raise UnsupportedHpgl("IW: clipping of a part of the plot")
+                self.window = tuple(values[:4]) if len(values) >= 4 else None
+            elif mnemonic == b"PG":
+                self.flush()
+                self.ended = True
+            elif mnemonic not in IGNORED_INSTRUCTIONS:
+                raise UnsupportedHpgl(mnemonic.decode())
+
+        if self.pen_down and not self.in_subpath:
+            # Plot ended with the pen lowered
+            self.add_point(*self.position)
+        self.flush()
+
+    def get_extents(self):
+        """Get the extents of the drawing
+
+        :return: Min x, min y, max x, max y in plotter units.
+        :rtype: tuple[float]
+        :raise UnsupportedHpgl: If nothing is drawn, or if coordinates are
+            out of the range of HP-GL (see `MAX_COORDINATE`).
+        """
+        mins, maxs = [], []
+        for *_, xs, ys, _ in self.paths:
+            mins.append((xs.min(), ys.min()))
+            maxs.append((xs.max(), ys.max()))
+        for _, x, y, width, height, text in self.labels:
+            mins.append((x, y))
+            maxs.append((x + 1.5 * width * len(text), y + height))
+        if not mins:
+            raise UnsupportedHpgl("empty plot")
+        min_x, min_y = np.min(mins, axis=0)
+        max_x, max_y = np.max(maxs, axis=0)
+        # Relative moves and circles may exceed the range of the parameters;
+        # coordinates are written as 64 bits integers
+        if max(abs(min_x), abs(min_y), abs(max_x), abs(max_y)) > MAX_COORDINATE:
+            raise UnsupportedHpgl("coordinates out of range")
+        if self.window:
+            x1, y1, x2, y2 = self.window
+            min_x, max_x = max(min_x, min(x1, x2)), min(max_x, max(x1, x2))
+            min_y, max_y = max(min_y, min(y1, y2)), min(max_y, max(y1, y2))
+        return min_x, min_y, max_x, max_y
+
+    def get_content(self, extents):
+        """Get the content stream of the page
+
+        Coordinates are written in plotter units, the transformation matrix
+        converts them into points.
+
+        :param extents: Extents of the drawing (:meth:`get_extents`).
+        :type extents: tuple[float]
+        :rtype: bytes
+        """
+        min_x, min_y, max_x, max_y = extents
+        scale = POINTS_PER_UNIT
+        offset_x = (PEN_WIDTH / 2 - min_x) * scale
+        offset_y = (PEN_WIDTH / 2 - min_y) * scale
+        diagonal = math.hypot(max_x - min_x, max_y - min_y)
+        lines = [
+            "q",
+            f"{scale:.6f} 0 0 {scale:.6f} {offset_x:.4f} {offset_y:.4f} cm",
+            f"{PEN_WIDTH} w 1 J 1 j",
+        ]
+        if self.window:
+            x1, y1, x2, y2 = self.window
+            lines.append(
+                f"{min(x1, x2):g} {min(y1, y2):g} {abs(x2 - x1):g} {abs(y2 - y1):g} re W n"
+            )
+
+        style = None
+        for pen, line_type, xs, ys, starts in self.paths:
+            if style != (pen, line_type):
+                style = (pen, line_type)
+                lines.append("{} {} {} RG".format(*PEN_COLORS[(pen - 1) % len(PEN_COLORS)]))
+                pattern = LINE_TYPES.get(line_type[0]) if line_type else None
+                if pattern:
+                    length = diagonal * line_type[1] / 100
+                    dashes = " ".join(f"{length * percent / 100:.1f}" for percent in pattern)
+                    lines.append(f"[{dashes}] 0 d")
+                else:
+                    lines.append("[] 0 d")
+            points = np.empty((len(xs), 2), dtype=np.int64)
+            points[:, 0] = np.rint(xs)
+            points[:, 1] = np.rint(ys)
+            template = "".join(np.where(starts, "%d %d m\n", "%d %d l\n").tolist())
+            lines.append(template % tuple(points.ravel().tolist()) + "S")
+
+        for pen, x, y, width, height, text in self.labels:
+            size = height / FONT_CAP_HEIGHT
+            # Horizontal scaling to fill the cells of the characters
+            scaling = 100 * 1.5 * width / (FONT_ADVANCE * size)
+            text = text.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+            lines.append(
+                "BT {} {} {} rg /F1 {:.1f} Tf {:.1f} Tz {} {} Td ({}) Tj ET".format(
+                    *PEN_COLORS[(pen - 1) % len(PEN_COLORS)],
+                    size, scaling, round(x), round(y), text.decode("latin-1"),
+                )
+            )
+        lines.append("Q")
+        return "\n".join(lines).encode("latin-1")
+
+    def to_pdf(self):
+        """Get the PDF document of the plot
+
+        :rtype: bytes
+        :raise UnsupportedHpgl: If nothing is drawn.
+        """
+        # Batch the coordinates of each path
+        self.paths = [
+            (pen, line_type, np.array(xs), np.array(ys), np.array(starts))
+            for pen, line_type, xs, ys, starts in self.paths
+        ]
+        extents = self.get_extents()
+        min_x, min_y, max_x, max_y = extents
+        width = max(round((max_x - min_x + PEN_WIDTH) * POINTS_PER_UNIT), 1)
+        height = max(round((max_y - min_y + PEN_WIDTH) * POINTS_PER_UNIT), 1)
+        content = zlib.compress(self.get_content(extents), COMPRESSION_LEVEL)
+
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>" % (width, height),
+            b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream"
+            % (len(content), content),
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier "
+            b"/Encoding /WinAnsiEncoding >>",
+        ]
+        pdf = bytearray(b"%PDF-1.7\n%\xc7\xec\x8f\xa2\n")
+        offsets = []
+        for number, obj in enumerate(objects, 1):
+            offsets.append(len(pdf))
+            pdf += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+        xref = len(pdf)
+        pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            len(objects) + 1, xref
+        )
+        return bytes(pdf)
+
+
+def render_hpgl(src_path, pdf_path):
+    """Convert a HP-GL file to PDF
+
+    :param src_path: HP-GL file.
+    :param pdf_path: PDF file, created only if the plot is supported.
+    :type src_path: str | pathlib.Path
+    :type pdf_path: str | pathlib.Path
+    :raise UnsupportedHpgl: If the file must be converted by hp2xx.
+    """
+    with open(src_path, "rb") as f_d:
+        data = f_d.read()
+    renderer = HpglRenderer()
+    renderer.feed(data)
+    pdf = renderer.to_pdf()
+    with open(pdf_path, "wb") as f_d:
+        f_d.write(pdf)
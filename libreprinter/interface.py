@@ -23,29 +23,105 @@
 """
 
 # Standard imports
-import shutil
+import re
+import math
+import time
 import logging
+import statistics
+from collections import deque
 from packaging.version import Version
 from datetime import datetime
 import struct
 
 # Custom imports
 from libreprinter.file_handler import (
-    get_job_number,
+    JobCounter,
+    TimeJobCounter,
+    link_file,
     convert_file_line_ending,
-    convert_data_line_ending,
+    LineEndingConverter,
 )
 from libreprinter.legacy_interprocess_com import (
     initialize_interprocess_com,
     send_status_message,
     debug_shared_memory,
 )
-from libreprinter.handlers import get_serial_handler, SerialException
+from libreprinter.handlers import (
+    get_serial_handler,
+    ReceiveBuffer,
+    UsbPassthroughSink,
+    SerialException,
+)
+from libreprinter.job_writer import JobWriter
+from libreprinter.job_finalizer import JobFinalizer
+from libreprinter.job_journal import JobJournal, JobRecord
 from libreprinter.commons import logger, LAST_HARDWARE_VERSION
 from libreprinter.config_parser import FLOW_CTRL_MAPPING
 
 LOGGER = logger()
 
+# ESC/P scanner
+ESC_PATTERN = re.compile(b"\x1b")
+# State changes triggered by the byte following an ESC byte;
+# {command byte: (attribute of EscpState, value)}
+ESC_COMMANDS = {
+    ord("#"): ("msbsetting", 0),  # Cancel MSB Control; escp2 line 3437
+    ord("="): ("msbsetting", 1),  # Set MSB (bit 7) of all incoming data to 0
+    ord(">"): ("msbsetting", 2),  # Set MSB (bit 7) of all incoming data to 1
+    # ESC I n - enable printing of control codes - shaded codes in table in
+    # manual (A-23); escp2 line 3528
+    ord("I"): ("escimode", True),
+    ord("4"): ("italic", True),  # ESC 4 SELECT ITALIC FONT; escp2 line 2860
+    ord("5"): ("italic", False),  # ESC 5 CANCEL ITALIC FONT
+    ord("!"): ("masterfontmode", True),  # ESC ! n Master Font Select
+}
+
+# Job terminators searched when auto_end_page is enabled; {emulation: pattern}
+# Line endings that directly follow a terminator belong to the ended job.
+JOB_TERMINATORS = {
+    # Form feed followed by a reset (ESC @)
+    "epson": re.compile(b"\x0c\x1b@"),
+    # Reset (ESC E) followed by the Universal Exit Language command
+    "hp": re.compile(b"\x1bE\x1b%-12345X"),
+    # postscript: see PostscriptState
+    # Page eject or pen put away
+    "hpgl": re.compile(b"(?:PG|SP0?)[ \t]*;(?:\r?\n)?"),
+}
+# Number of bytes of a job kept to detect a terminator split between 2 chunks
+JOB_TERMINATOR_TAIL_SIZE = 16
+# PostScript: comments delimiting the embedded documents (EPS files),
+# End Of File comment and Ctrl-D
+POSTSCRIPT_TOKENS = re.compile(b"%%BeginDocument|%%EndDocument|%%EOF(?:\r?\n)?|\x04")
+# Ctrl-D and whitespaces sent before a PostScript job
+POSTSCRIPT_PREFIX = re.compile(rb"[\x04\s]*")
+
+# Adaptive end_page_timeout (end_page_timeout=auto)
+# Only pauses longer than this delay (s) are learned (not the reading of a burst)
+AUTO_TIMEOUT_MIN_GAP = 0.05
+# Number of pauses learned before leaving the maximum timeout
+AUTO_TIMEOUT_MIN_SAMPLES = 10
+AUTO_TIMEOUT_MAX_SAMPLES = 500
+AUTO_TIMEOUT_PERCENTILE = 99
+AUTO_TIMEOUT_MARGIN = 1.5
+# A job starting less than this ratio x the timeout after the last byte of the
+# previous job (ended by the timeout) is the continuation of a split job
+AUTO_TIMEOUT_SPLIT_RATIO = 2
+# Number of pauses of split jobs kept as lower bounds of the timeout
+AUTO_TIMEOUT_MAX_SPLITS = 10
+
+# Files of the jobs written directly in the directory watched by the converter
+# of the emulation; {emulation: (directory, extension)}.
+# The file in the raw directory is a hard link of this file.
+EMULATION_FILES = {
+    "hp": ("pcl", "pcl"),
+    "hpgl": ("hpgl", "hpgl"),
+    "postscript": ("ps", "ps"),
+}
+
+# Seiko QT-2100 markers: ESC 0 (new data analysis), ESC 1 (new value)
+SEIKO_ESC_PATTERN = re.compile(b"\x1b[01]*")
+SEIKO_MARKERS_PATTERN = re.compile(b"[01]*")
+
 
 def build_interface_config_settings(config):
     r"""Build configuration strings ready to be sent to the interface
@@ -177,6 +253,22 @@ def apply_msb_control(databyte, msbsetting):
     raise ValueError("msbsetting value not expected: %s" % msbsetting)
 
 
+# Bulk version of apply_msb_control(); {msbsetting: table for bytes.translate()}
+MSB_TRANSLATION_TABLES = {
+    msbsetting: bytes(
+        apply_msb_control(bytes((value,)), msbsetting) for value in range(256)
+    )
+    for msbsetting in (1, 2)
+}
+# Bytes interpreted as ESC once MSB control is applied; {msbsetting: pattern}
+# With the MSB set to 1, no ESC can be received.
+MSB_ESC_PATTERNS = {
+    0: ESC_PATTERN,
+    1: re.compile(b"[\x1b\x9b]"),
+    2: None,
+}
+
+
 def is_bit_set(byte, bit_number):
     """Test if nth bit is set in the given byte
 
@@ -192,35 +284,559 @@ def is_bit_set(byte, bit_number):
     return bool((byte[0] >> bit_number) & 1)
 
 
-def get_buffer(serial_handler, end_page_timeout):
+class EscpState:
+    """Status of the ESC/P commands tracked during the reception of a job
+
+    All this stuff is designed to set status of print_controlcodes
+    and so set msbsetting which ultimately modifies the received databytes...
+    These checks ARE NOT made by espc2 converter for some reason...
+
+    Attributes:
+        :param escmode: An ESC byte was seen, the next byte is a command.
+        :param escimode: ESC I was seen, the next byte is its argument.
+        :param masterfontmode: ESC ! was seen, the next byte is its argument.
+        :param print_controlcodes: Printing of control codes is enabled;
+            ESC bytes are not interpreted anymore.
+        :param italic: Italic font is selected.
+        :param msbsetting: MSB control setting;
+            see :meth:`apply_msb_control`.
+        :type escmode: bool
+        :type escimode: bool
+        :type masterfontmode: bool
+        :type print_controlcodes: bool
+        :type italic: bool
+        :type msbsetting: int
+    """
+
+    def __init__(self):
+        self.escmode = False
+        self.escimode = False
+        self.masterfontmode = False
+        self.print_controlcodes = False
+        self.italic = False
+        self.msbsetting = 0
+
+    def is_waiting_byte(self):
+        """Return True if the next byte is expected by a command
+
+        :rtype: bool
+        """
+        return self.escmode or self.escimode or self.masterfontmode
+
+    def feed(self, databyte):
+        """Update the state with the given byte
+
+        :param databyte: Byte value (MSB control already applied).
+        :type databyte: int
+        """
+        # Check ESC command
+        if databyte == 27 and not self.print_controlcodes:
+            self.escmode = True
+        elif self.escmode:
+            command = ESC_COMMANDS.get(databyte)
+            if command:
+                setattr(self, *command)
+            self.escmode = False
+        elif self.escimode:
+            if not self.italic:
+                self.print_controlcodes = databyte == 1
+            self.escimode = False
+        elif self.masterfontmode:
+            # Test if 6th bit is set
+            # yes: select italic
+            # no: cancel italic
+            self.italic = bool((databyte >> 6) & 1)
+            self.masterfontmode = False
+
+
+def scan_escp_buffer(databytes, state):
+    """Track ESC/P commands in the given buffer and apply MSB control on it
+
+    Only ESC bytes and the bytes expected by their commands are inspected;
+    plain text and bit-image runs between them are skipped in bulk, and MSB
+    control is applied on these runs with a translation table.
+
+    .. note:: Bytes of command arguments (bit-image data, etc.) are not
+        skipped: like the legacy converter, any ESC byte found in them
+        is interpreted as a command.
+
+    :param databytes: Received bytes. MSB control is applied in place.
+    :param state: Current status of ESC/P commands; updated in place.
+    :type databytes: bytearray | memoryview
+    :type state: EscpState
+    """
+    size = len(databytes)
+    pos = 0
+    while pos < size:
+        if not state.is_waiting_byte():
+            if state.print_controlcodes:
+                # ESC bytes are not interpreted anymore: nothing can change
+                end = size
+            else:
+                # Jump to the next ESC byte (after MSB control)
+                pattern = MSB_ESC_PATTERNS[state.msbsetting]
+                match = pattern.search(databytes, pos) if pattern else None
+                end = match.start() if match else size
+
+            if state.msbsetting != 0 and end > pos:
+                # Apply MSB control on the whole run
+                databytes[pos:end] = bytes(databytes[pos:end]).translate(
+                    MSB_TRANSLATION_TABLES[state.msbsetting]
+                )
+            if end == size:
+                return
+            pos = end
+
+        databyte = databytes[pos]
+        if state.msbsetting != 0:
+            databyte = MSB_TRANSLATION_TABLES[state.msbsetting][databyte]
+            databytes[pos] = databyte
+
+        state.feed(databyte)
+        pos += 1
+
+
+class SeikoState:
+    """Status of the Seiko QT-2100 data stream tracked during its reception
+
+    Attributes:
+        :param escmode: An ESC byte was seen, followed only by `0` or `1` bytes.
+        :param job_timestamp: Start time of the current data analysis;
+            None until its first value (`ESC 1`) is received.
+        :param probe_seiko: A data analysis (`ESC 0`) was already seen.
+        :type escmode: bool
+        :type job_timestamp: datetime.datetime | None
+        :type probe_seiko: bool
+    """
+
+    def __init__(self):
+        self.escmode = False
+        self.job_timestamp = None
+        self.probe_seiko = False
+
+    def get_timestamp(self):
+        """Return the time elapsed since the first value of the current analysis
+
+        :return: Packed hours, minutes, seconds.
+        :rtype: bytes
+        """
+        if not self.job_timestamp:
+            # First ESC sequence seen
+            # Initialise a job start timestamp
+            self.job_timestamp = datetime.now()
+            delta = 0
+        else:
+            delta = (datetime.now() - self.job_timestamp).seconds
+        return struct.pack(
+            "BBB", (delta // 3600) & 0xFF, delta % 3600 // 60, delta % 60
+        )
+
+
+def insert_seiko_timestamps(databytes, state):
+    """Add a timestamp before each new value and split successive data analyses
+
+    Each value (`ESC 1`) is prefixed by an `ESC T hh mm ss` message.
+    Each new data analysis (`ESC 0`) after the first one starts a new stream.
+
+    .. note:: Difference with the Retroprinter implementation!
+        We prefix ALL values with a delta, including the first one
+        (with a delta of 0 for this one).
+
+    .. note:: Like the legacy loop, the ESC state is not reset by `0` or `1`
+        bytes: `ESC 1 1` is handled as 2 values.
+
+    :param databytes: Received bytes.
+    :param state: Current status of the stream; updated in place.
+    :type databytes: bytearray | memoryview
+    :type state: SeikoState
+    :return: Edited data; one item per stream. The first item must be
+        appended to the current stream; the next ones are new streams.
+    :rtype: list[bytes | memoryview]
+    """
+    view = memoryview(databytes)
+    size = len(view)
+    streams = []
+    pieces = []
+    start = 0
+
+    # Boundaries of `0`/`1` bytes following an ESC
+    marker_runs = [
+        (match.start() + 1, match.end())
+        for match in SEIKO_ESC_PATTERN.finditer(databytes)
+    ]
+    if state.escmode:
+        # The previous buffer ended in ESC mode
+        marker_runs.insert(0, (0, SEIKO_MARKERS_PATTERN.match(databytes).end()))
+
+    state.escmode = False
+    for run_start, run_end in marker_runs:
+        for index in range(run_start, run_end):
+            if databytes[index] == 0x31:  # "1"
+                # Insert timestamp before the value
+                pieces += [view[start:index], b"T" + state.get_timestamp() + b"\x1b"]
+                start = index
+                continue
+
+            # "0": New data analysis
+            if state.probe_seiko:
+                # Dump the previous stream without its last byte (the ESC);
+                # keep this byte for the start of the next one
+                split = max(index - 1, start)
+                pieces.append(view[start:split])
+                streams.append(pieces)
+                pieces = []
+                start = split
+            state.job_timestamp = None
+            state.probe_seiko = True
+        # ESC state is kept only if the run ends the buffer
+        state.escmode = run_end == size
+
+    pieces.append(view[start:])
+    streams.append(pieces)
+    return [
+        stream_pieces[0] if len(stream_pieces) == 1 else b"".join(stream_pieces)
+        for stream_pieces in streams
+    ]
+
+
+def find_job_terminator(databytes, pattern, tail=b""):
+    """Search the end of the first job terminator in the given buffer
+
+    .. seealso:: :meth:`JOB_TERMINATORS`
+
+    :param databytes: Received bytes.
+    :param pattern: Compiled pattern of the terminators of the emulation.
+    :param tail: Last bytes received for the current job before databytes;
+        used to detect terminators split between 2 chunks.
+    :type databytes: bytearray | memoryview
+    :type pattern: re.Pattern
+    :type tail: bytes
+    :return: Index in databytes following the terminator, -1 if not found.
+    :rtype: int
+    """
+    ends = []
+    if tail:
+        # Terminator split between the previous chunk and this one
+        window = tail + bytes(databytes[:JOB_TERMINATOR_TAIL_SIZE])
+        match = pattern.search(window)
+        if match and match.end() > len(tail):
+            ends.append(match.end() - len(tail))
+
+    match = pattern.search(databytes)
+    if match:
+        ends.append(match.end())
+    return min(ends) if ends else -1
+
+
+class PostscriptState:
+    """Status of the PostScript job tracked during its reception
+
+    The job ends after an `%%EOF` comment or a Ctrl-D; `%%EOF` comments of
+    the documents embedded in the job are ignored.
+
+    Attributes:
+        :param content: The content of the job has begun; Ctrl-D and
+            whitespaces received before are dropped.
+        :param document_depth: Nesting level of the documents embedded
+            between `%%BeginDocument` and `%%EndDocument` comments.
+        :param tail: Last bytes of the job following the last token;
+            used to detect tokens split between 2 chunks.
+        :type content: bool
+        :type document_depth: int
+        :type tail: bytes
+    """
+
+    def __init__(self):
+        self.content = False
+        self.document_depth = 0
+        self.tail = b""
+
+    def feed(self, token):
+        """Update the state with the given token
+
+        :param token: Token matched by :meth:`POSTSCRIPT_TOKENS`.
+        :type token: bytes
+        :return: True if the token ends the job.
+        :rtype: bool
+        """
+        if token == b"%%BeginDocument":
+            self.document_depth += 1
+        elif token == b"%%EndDocument":
+            self.document_depth = max(self.document_depth - 1, 0)
+        elif token == b"\x04" or not self.document_depth:
+            # Ctrl-D or End Of File comment of the job
+            return True
+        return False
+
+
+def strip_postscript_prefix(databytes, state):
+    """Drop the Ctrl-D and whitespaces received before the content of a job
+
+    A Ctrl-D sent before a job (to reset the printer) does not end an empty job.
+
+    :param databytes: Received bytes.
+    :param state: Current status of the job; updated in place.
+    :type databytes: bytearray | memoryview
+    :type state: PostscriptState
+    :return: Received bytes without the prefix, empty if nothing remains.
+    :rtype: bytearray | memoryview
+    """
+    start = POSTSCRIPT_PREFIX.match(databytes).end()
+    if start < len(databytes):
+        state.content = True
+    return databytes[start:]
+
+
+def find_postscript_terminator(databytes, state):
+    """Search the end of the PostScript job in the given buffer
+
+    .. seealso:: :meth:`find_job_terminator`
+
+    :param databytes: Received bytes.
+    :param state: Current status of the job; updated in place.
+    :type databytes: bytearray | memoryview
+    :type state: PostscriptState
+    :return: Index in databytes following the terminator, -1 if not found.
+    :rtype: int
+    """
+    pos = 0
+    tail = state.tail
+    if tail:
+        # Token split between the previous chunk and this one
+        window = tail + bytes(databytes[:JOB_TERMINATOR_TAIL_SIZE])
+        for match in POSTSCRIPT_TOKENS.finditer(window):
+            if match.end() > len(tail):
+                pos = match.end() - len(tail)
+                tail = b""
+                if state.feed(match.group()):
+                    return pos
+                break
+
+    for match in POSTSCRIPT_TOKENS.finditer(databytes, pos):
+        pos = match.end()
+        tail = b""
+        if state.feed(match.group()):
+            return pos
+    state.tail = (tail + bytes(databytes[pos:]))[-JOB_TERMINATOR_TAIL_SIZE:]
+    return -1
+
+
+class EndPageTimeout:
+    """Timeout without data used to detect the end of a page
+
+    With `end_page_timeout=auto`, the timeout is learned from the pauses
+    observed between the chunks of the jobs of the session: a high percentile
+    of them with a margin, bounded by `end_page_timeout_min` and
+    `end_page_timeout_max`. The maximum is used until enough pauses are seen.
+
+    Pauses longer than the timeout end the jobs and are never observed inside
+    them: a job starting shortly after the end of the previous one by the
+    timeout is considered as split by a too short timeout. Its pause is
+    learned as a lower bound of the timeout.
+
+    Attributes:
+        :param adaptive: The timeout is learned.
+        :param value: Current timeout in seconds.
+        :param minimum: Lower bound of the learned timeout.
+        :param maximum: Upper bound of the learned timeout.
+        :param gaps: Last pauses (seconds) observed inside jobs.
+        :param split_gaps: Last pauses (seconds) between split jobs.
+        :param last_byte: Time of the last byte (monotonic clock) of the
+            previous job if it was ended by the timeout.
+        :type adaptive: bool
+        :type value: float
+        :type minimum: float
+        :type maximum: float
+        :type gaps: collections.deque[float]
+        :type split_gaps: collections.deque[float]
+        :type last_byte: float | None
+    """
+
+    def __init__(self, misc_section):
+        """Constructor
+
+        :param misc_section: misc section of the configuration.
+        :type misc_section: configparser.SectionProxy
+        """
+        self.adaptive = misc_section["end_page_timeout"] == "auto"
+        self.minimum = misc_section.getfloat("end_page_timeout_min")
+        self.maximum = misc_section.getfloat("end_page_timeout_max")
+        self.value = (
+            self.maximum if self.adaptive else misc_section.getfloat("end_page_timeout")
+        )
+        self.gaps = deque(maxlen=AUTO_TIMEOUT_MAX_SAMPLES)
+        self.split_gaps = deque(maxlen=AUTO_TIMEOUT_MAX_SPLITS)
+        self.last_byte = None
+
+    def end_job(self, last_byte=None):
+        """Record the end of a job
+
+        :key last_byte: Time of the last byte of the job (monotonic clock) if
+            it was ended by the timeout.
+        :type last_byte: float | None
+        """
+        self.last_byte = last_byte
+
+    def start_job(self):
+        """Record the first byte of a job
+
+        If the previous job was ended by the timeout shortly before, the pause
+        is learned as a lower bound of the timeout, used immediately.
+        """
+        if self.adaptive and self.last_byte is not None:
+            gap = time.monotonic() - self.last_byte
+            if gap <= self.value * AUTO_TIMEOUT_SPLIT_RATIO:
+                LOGGER.info(
+                    "Adaptive end_page_timeout: job probably split (pause: %.2fs)", gap
+                )
+                self.split_gaps.append(gap)
+                self.update()
+        self.last_byte = None
+
+    def add_gap(self, gap):
+        """Record the pause observed before a chunk of the current job
+
+        :param gap: Waiting time in seconds.
+        :type gap: float
+        """
+        if self.adaptive and gap >= AUTO_TIMEOUT_MIN_GAP:
+            self.gaps.append(gap)
+
+    def update(self):
+        """Set the timeout from the recorded pauses; called at the end of jobs
+
+        :return: The current timeout.
+        :rtype: float
+        """
+        if not self.adaptive or len(self.gaps) < AUTO_TIMEOUT_MIN_SAMPLES:
+            return self.value
+
+        percentile = statistics.quantiles(self.gaps, n=100)[AUTO_TIMEOUT_PERCENTILE - 1]
+        # Pauses of the split jobs are lower bounds
+        split_gap = max(self.split_gaps, default=0)
+        value = max(percentile, split_gap) * AUTO_TIMEOUT_MARGIN
+        value = min(max(value, self.minimum), self.maximum)
+        if value != self.value:
+            LOGGER.info(
+                "Adaptive end_page_timeout: %.2fs (p%d of %d pauses: %.2fs; "
+                "longest pause between split jobs: %.2fs)",
+                value,
+                AUTO_TIMEOUT_PERCENTILE,
+                len(self.gaps),
+                percentile,
+                split_gap,
+            )
+            self.value = value
+        return value
+
+
+class ConverterSync:
+    """Rate limit of the sync of the converters in strip-escp2-stream mode
+
+    The first chunk received after `interval` seconds without sync is synced
+    immediately; the following chunks are synced together at most
+    `interval` seconds later (bound of the added latency).
+
+    Attributes:
+        :param interval: Minimum delay between 2 syncs in seconds.
+        :param last_sync: Time of the last sync (monotonic clock).
+        :param pending_bytes: Bytes received since the last sync.
+        :param syncs: Number of syncs made.
+        :param avoided: Number of chunks received without sync.
+        :type interval: float
+        :type last_sync: float
+        :type pending_bytes: int
+        :type syncs: int
+        :type avoided: int
+    """
+
+    def __init__(self, interval):
+        """Constructor
+
+        :param interval: Minimum delay between 2 syncs in seconds.
+        :type interval: float
+        """
+        self.interval = interval
+        self.last_sync = -math.inf
+        self.pending_bytes = 0
+        self.syncs = 0
+        self.avoided = 0
+
+    def add(self, size):
+        """Record a received chunk
+
+        :param size: Size of the chunk.
+        :type size: int
+        :return: True if a sync is due.
+        :rtype: bool
+        """
+        self.pending_bytes += size
+        if time.monotonic() - self.last_sync >= self.interval:
+            return True
+        self.avoided += 1
+        return False
+
+    def delay(self):
+        """Get the delay before the sync of the pending bytes
+
+        :return: None if no byte is pending.
+        :rtype: float | None
+        """
+        if not self.pending_bytes:
+            return
+        return max(self.last_sync + self.interval - time.monotonic(), 0)
+
+    def done(self):
+        """Record a sync"""
+        self.last_sync = time.monotonic()
+        self.pending_bytes = 0
+        self.syncs += 1
+
+    def log_stats(self):
+        """Log the counters of the syncs"""
+        LOGGER.debug("Converter syncs: %d, avoided: %d", self.syncs, self.avoided)
+
+
+def get_buffer(receive_buffer, end_page_timeout):
     """Try to read and return bytes from interface
 
-    Serial read timeout = end_page_timeout defined in config.
+    Wait for data until a deadline defined by end_page_timeout in config.
 
-    :param serial_handler: Serial port handler.
-    :param end_page_timeout: Timeout in seconds used to define the number of
-        retries in case of empty buffer.
-        Serial read is in blocking mode (1sec per try).
-    :type serial_handler: serial.Serial
-    :type end_page_timeout: int
-    :return: None in case of no response or timeout, a bytearray otherwise.
+    :param receive_buffer: Preallocated buffers filled by the serial port.
+    :param end_page_timeout: Timeout in seconds (fractional values are
+        accepted) without data before considering that the page is ended.
+    :type receive_buffer: libreprinter.handlers.ReceiveBuffer
+    :type end_page_timeout: float
+    :return: None in case of no response or timeout, a memoryview otherwise.
+        The memoryview is valid until the slot of the receive buffer is reused.
     """
-    error_count = 0
+    deadline = time.monotonic() + end_page_timeout
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            # Signal the conversion program that it can control leds
+            # send_status_message(200, 1)
+            return
 
-    while error_count < end_page_timeout:
-        # Arbitrary length
-        response = bytearray(serial_handler.read(size=8000))
+        response = receive_buffer.read(timeout=remaining)
         if response:
             # Signal the conversion program that capture program is controlling leds
             # send_status_message(200, 2)
             return response
 
-        error_count += 1
-    # Signal the conversion program that it can control leds
-    # send_status_message(200, 1)
 
-
-def parse_buffer(serial_handler, job_number, config):
+def parse_buffer(
+    receive_buffer,
+    writer,
+    job_number,
+    config,
+    pending_databytes=None,
+    end_page_timeout=None,
+    usb_sink=None,
+    job_counter=None,
+    on_job_open=None,
+):
     """
     TODO: penser à coroutine:
         générateur emettant des databytes
@@ -235,78 +851,174 @@ def parse_buffer(serial_handler, job_number, config):
     JOBS_STRIP_ESCP2: handled by converter
 
     - usbpassthrough:
-        - enabled: store a raw file and then put it in the given peripheral
+        - enabled: store a raw file and forward the data to the given
+          peripheral through `usb_sink`
         - disabled: store a raw file and alert converters of the job status
 
-    :param serial_handler: Serial port handler.
-    :param job_number:
+    - auto_end_page:
+        - enabled: the job is also ended as soon as a terminator of the
+          emulation is received (see :meth:`JOB_TERMINATORS`); the bytes
+          received after it are returned for the next job.
+        - disabled: only end_page_timeout is used.
+
+    Files are written by the writer thread (see
+    :class:`libreprinter.job_writer.JobWriter`): the operations of each chunk
+    are submitted at once, and all of them are executed when the function
+    returns. The ring of `receive_buffer` must have at least 2 slots more
+    than the queue of the writer.
+
+    :param receive_buffer: Preallocated buffers filled by the serial port.
+    :param writer: Writer thread shared by the jobs of the session.
+    :param job_number: Number of the job; if None, a number is allocated by
+        `job_counter` when the first byte of the job is received.
     :param config:
-    :type serial_handler: serial.Serial
+    :param pending_databytes: Bytes received after the terminator of the
+        previous job; processed before any read.
+    :param end_page_timeout: Timeout shared by the jobs of the session.
+        Built from the config if not set.
+    :param usb_sink: Sink of the USB printer if usb_passthrough is enabled.
+    :param job_counter: Allocator of the numbers of the jobs, also used for
+        the jobs split during the reception (seiko-qt2100); the next number is
+        used if not set.
+    :param on_job_open: Called with the record of each job when its file is
+        opened (see `job_journal` setting).
+    :type receive_buffer: libreprinter.handlers.ReceiveBuffer
+    :type writer: libreprinter.job_writer.JobWriter
+    :type pending_databytes: bytearray | None
+    :type end_page_timeout: EndPageTimeout | None
+    :type usb_sink: libreprinter.handlers.UsbPassthroughSink | None
+    :type job_counter: libreprinter.file_handler.JobCounter
+        | libreprinter.file_handler.TimeJobCounter | None
+    :type on_job_open: Callable | None
+    :return: Bytes received after the terminator of the job if any,
+        and the records of the received jobs (seiko-qt2100 emulation
+        may split the received data in several jobs).
+    :rtype: tuple[bytearray | None, list[libreprinter.job_journal.JobRecord]]
     """
-    # Handle USB passthrough
-    usb_printer_dev_f_d = None
-    if config["misc"]["usb_passthrough"] != "no":
-        # Epson + HP
-        # => write directly in /dev/ interface
-        usb_printer_dev_f_d = open(config["misc"]["usb_passthrough"], "wb")
+    # Operations for the writer thread
+    operations = []
 
     epson_emulation = config["misc"]["emulation"] == "epson"
 
     # Handle data stream and stream plain text
-    stream = plain_stream_f_d = line_ending = None
+    stream = plain_stream = line_ending_converter = None
     if epson_emulation and "stream" in config["misc"]["endlesstext"]:
         # Epson: plain-stream/strip-escp2-stream
         # Put the data in the same file (infinite loop)
         # PS: do not forget to sync converter if no plain (see below)
         stream = True
+        if job_number is None:
+            job_number = job_counter.allocate()
         if "plain" in config["misc"]["endlesstext"]:
             # Process line endings and put the result in txt_stream/ dir
-            line_ending = config["misc"]["line_ending"].encode()
+            line_ending_converter = LineEndingConverter(
+                config["misc"]["line_ending"].encode()
+            )
 
-            plain_stream_f_d = open(
-                "{}txt_stream/{}.txt".format(config["misc"]["output_path"], job_number),
-                "wb",
+            plain_stream = True
+            operations.append(
+                (
+                    writer.open,
+                    "plain_stream",
+                    "{}txt_stream/{}.txt".format(
+                        config["misc"]["output_path"], job_number
+                    ),
+                )
             )
 
-    raw_f_d = open(
-        "{}raw/{}.raw".format(config["misc"]["output_path"], job_number), "wb"
-    )
+    # Jobs are assembled in memory and written at once at the end of the page;
+    # streams are written as they are received
+    buffer_size = 0 if stream else config["misc"].getint("job_buffer_size") * 1024
+    # Metadata of the received jobs
+    job_records = []
+    if job_number is not None:
+        open_job(
+            writer,
+            config,
+            job_number,
+            buffer_size,
+            operations,
+            job_records,
+            on_job_open,
+        )
+    writer.submit(operations)
 
     # Epson control
-    escimode = False
-    escmode = False
-    print_controlcodes = False
-    italic = False
-    masterfontmode = False
-    msbsetting = 0
+    escp_state = EscpState()
 
     # Seiko qt2100 control
-    job_timestamp = None
-    probe_seiko = None
+    seiko_state = SeikoState()
+
+    # Content based end of job (not available for streams)
+    terminator_pattern = postscript_state = None
+    if config["misc"]["auto_end_page"] == "yes" and not stream:
+        terminator_pattern = JOB_TERMINATORS.get(config["misc"]["emulation"])
+        if config["misc"]["emulation"] == "postscript":
+            postscript_state = PostscriptState()
+    terminator_tail = b""
+
+    # Sync of the converters in strip-escp2-stream mode
+    converter_sync = None
+    if epson_emulation and stream and not plain_stream:
+        converter_sync = ConverterSync(config["misc"].getfloat("stream_sync_interval"))
 
     # Misc
     received_bytes = False
-    end_page_timeout = config["misc"].getint("end_page_timeout")
+    if end_page_timeout is None:
+        end_page_timeout = EndPageTimeout(config["misc"])
 
     # Read interface and process bytes if necessary
     while True:
-        databytes = get_buffer(serial_handler, end_page_timeout)
+        operations = []
+        sync_delay = None
+        if pending_databytes:
+            databytes, pending_databytes = pending_databytes, None
+        else:
+            timeout = end_page_timeout.value
+            sync_delay = converter_sync.delay() if converter_sync else None
+            if sync_delay is not None:
+                # Wake up for the sync of the pending bytes
+                timeout = min(timeout, sync_delay)
+            wait_start = time.monotonic()
+            databytes = get_buffer(receive_buffer, timeout)
+            if databytes and received_bytes:
+                # Pause inside the current job
+                end_page_timeout.add_gap(time.monotonic() - wait_start)
+            elif databytes:
+                # First byte of a job
+                end_page_timeout.start_job()
+        if not databytes and sync_delay is not None:
+            # Sync the bytes received since the last sync
+            writer.submit([(writer.flush, "raw"), (sync_converters, 0, job_number)])
+            converter_sync.done()
+            if timeout < end_page_timeout.value:
+                # Not an end of page
+                continue
         if not databytes:
             # No data during configured timeout
+            end_page_timeout.update()
             if received_bytes and not stream:
                 LOGGER.info("End of page timeout")
+                # The last byte was received at the start of the waiting
+                end_page_timeout.end_job(wait_start)
+                receive_buffer.log_stats()
                 # Job is terminated: close file descriptors
-                raw_f_d.close()
-
-                if usb_printer_dev_f_d:
-                    usb_printer_dev_f_d.close()
+                end_job(writer, usb_sink)
+                job_records[-1].end_reason = "timeout"
                 # Exit loop
-                return
+                return None, job_records
 
             if stream:
-                raw_f_d.flush()
-            if plain_stream_f_d:
-                plain_stream_f_d.flush()
+                operations.append((writer.flush, "raw"))
+            if plain_stream:
+                # Data held back by the converter (\r of a possible \r\n pair)
+                operations.append(
+                    (writer.write, "plain_stream", line_ending_converter.flush())
+                )
+                operations.append((writer.flush, "plain_stream"))
+            writer.submit(operations)
+            if converter_sync and received_bytes:
+                converter_sync.log_stats()
 
             received_bytes = False
             LOGGER.debug("Waiting data...")
@@ -318,136 +1030,174 @@ def parse_buffer(serial_handler, job_number, config):
         # TODO: autodetect epson_emulation based on init seq
         # TODO: starts_with ?
         if not received_bytes:
-            if b"\x1b\x40\x1b" in databytes:
+            # Search in memoryviews is done with regexes
+            if re.search(b"\x1b\x40\x1b", databytes):
                 # Epson init command /end printing command (\x1B@\x1B)
                 LOGGER.debug("PROBE EPSON data")
-            if b"\x1b\x45\x1b\x26\x6c" in databytes:
+            if re.search(b"\x1b\x45\x1b\x26\x6c", databytes):
                 # HP reset/init command (\x1BE\x1B&l) (0x1B E)
                 LOGGER.debug("PROBE HP data")
-            if b"\x1b\x30" in databytes:
+            if re.search(b"\x1b\x30", databytes):
                 LOGGER.debug("PROBE SEIKO data ")
 
+        if postscript_state and not postscript_state.content:
+            databytes = strip_postscript_prefix(databytes, postscript_state)
+            if not databytes:
+                LOGGER.debug("Ctrl-D received before the job: dropped")
+                continue
+
+        if job_number is None:
+            # The identifier of a job is allocated at its first byte
+            job_number = job_counter.allocate()
+            open_job(
+                writer,
+                config,
+                job_number,
+                buffer_size,
+                operations,
+                job_records,
+                on_job_open,
+            )
+            LOGGER.debug("Current job number: %s", job_number)
+
         received_bytes = True
 
+        end_of_job = -1
+        if postscript_state:
+            end_of_job = find_postscript_terminator(databytes, postscript_state)
+            if end_of_job != -1:
+                # Keep the beginning of the next job
+                pending_databytes = bytearray(databytes[end_of_job:])
+                databytes = databytes[:end_of_job]
+        elif terminator_pattern:
+            end_of_job = find_job_terminator(
+                databytes, terminator_pattern, terminator_tail
+            )
+            if end_of_job != -1:
+                # Keep the beginning of the next job
+                pending_databytes = bytearray(databytes[end_of_job:])
+                databytes = databytes[:end_of_job]
+            else:
+                terminator_tail = (
+                    terminator_tail + bytes(databytes[-JOB_TERMINATOR_TAIL_SIZE:])
+                )[-JOB_TERMINATOR_TAIL_SIZE:]
+
         if epson_emulation:
-            for index, databyte in enumerate(databytes):
-                if msbsetting != 0:
-                    databyte = apply_msb_control(databyte, msbsetting)
-                    databytes[index] = databyte
-
-                # All this stuff is designed to set status of print_controlcodes
-                # and so set msbsetting which ultimately modifies the current
-                # databyte...
-                # These checks ARE NOT made by espc2 converter for some reason...
-                # Check ESC command
-                if (databyte == 27) and not print_controlcodes:
-                    escmode = True
-                elif escmode:
-                    if databyte == ord("#"):
-                        # Cancel MSB Control; escp2 line 3437
-                        msbsetting = 0
-                    if databyte == ord("="):
-                        # Set MSB (bit 7) of all incoming data to 0
-                        msbsetting = 1
-                    if databyte == ord(">"):
-                        # Set MSB (bit 7) of all incoming data to 1
-                        msbsetting = 2
-                    if databyte == ord("I"):
-                        # ESC I n - enable printing of control codes - shaded codes in table in manual (A-23); escp2 line 3528
-                        escimode = True
-                    if databyte == ord("4"):
-                        # ESC 4 SELECT ITALIC FONT; escp2 line 2860
-                        italic = True
-                    if databyte == ord("5"):
-                        # ESC 5 CANCEL ITALIC FONT
-                        italic = False
-                    if databyte == ord("!"):
-                        # ESC ! n Master Font Select
-                        masterfontmode = True
-                    escmode = False
-                elif escimode:
-                    if not italic:
-                        print_controlcodes = databyte == 1
-                    escimode = False
-
-                elif masterfontmode:
-                    # Test if 6th bit is set
-                    # yes: select italic
-                    # no: cancel italic
-                    italic = is_bit_set(databyte, 6)
-                    masterfontmode = False
-
-            if plain_stream_f_d:
+            scan_escp_buffer(databytes, escp_state)
+
+            if plain_stream:
                 # plain-stream
-                plain_stream_f_d.write(convert_data_line_ending(databytes, line_ending))
+                operations.append(
+                    (
+                        writer.write,
+                        "plain_stream",
+                        line_ending_converter.convert(databytes),
+                    )
+                )
 
         if config["misc"]["emulation"] == "seiko-qt2100":
             # Add timestamp before each new values in an ESC T message
             # AND cut a stream with multiple successive data analysis
-            edited_databytes = bytearray()
-            for index, databyte in enumerate(databytes):
-                if databyte == 27:
-                    escmode = True
-                elif escmode and databyte == ord("0"):
-                    if probe_seiko:
-                        # At least a second data stream is received
-                        # Dump the end of the previous one
-                        raw_f_d.write(edited_databytes[:-1])
-                        # Keep the start of the next one
-                        edited_databytes = edited_databytes[-1:]
-                        raw_f_d.close()
-
-                        # Hijack the normal execution flow by creating a new file
-                        # without having to return to the read_interface function
-                        job_number += 1
-                        raw_filepath = f"{config['misc']['output_path']}raw/{job_number}.raw"
-                        raw_f_d = open(raw_filepath, "wb")
-
-                    job_timestamp = None
-                    probe_seiko = True
-                elif escmode and databyte == ord("1"):
-                    if not job_timestamp:
-                        # First ESC sequence seen
-                        # Initialise a job start timestamp
-                        job_timestamp = datetime.now()
-                        delta = 0
-                    else:
-                        delta = (datetime.now() - job_timestamp).seconds
-                    # Note: Difference with the Retroprinter implementation!
-                    # We prefix ALL values with a delta, including the first one
-                    # (with a delta of 0 for this one)
-                    hours, minutes, seconds = (
-                        (delta // 3600) & 0xFF,
-                        delta % 3600 // 60,
-                        delta % 60,
-                    )
-                    timestamp = struct.pack("BBB", hours, minutes, seconds)
-                    # Insert timestamp
-                    edited_databytes += b"T" + timestamp + b"\x1b"
-                else:
-                    escmode = False
-
-                edited_databytes += databyte.to_bytes(1)
+            *previous_streams, databytes = insert_seiko_timestamps(
+                databytes, seiko_state
+            )
+            for stream_data in previous_streams:
+                # At least a second data stream is received
+                # Dump the end of the previous one
+                operations.append((writer.write, "raw", stream_data))
+                operations.append((writer.close, "raw"))
+                job_records[-1].add(len(stream_data))
+                job_records[-1].end_reason = "split"
+
+                # Hijack the normal execution flow by creating a new file
+                # without having to return to the read_interface function
+                job_number = job_counter.allocate() if job_counter else job_number + 1
+                open_job(
+                    writer,
+                    config,
+                    job_number,
+                    buffer_size,
+                    operations,
+                    job_records,
+                    on_job_open,
+                )
 
-            # Save edited data
-            databytes = edited_databytes
             # Flush previous data & trigger file parsing
-            raw_f_d.flush()
+            operations.append((writer.flush, "raw"))
 
         # Save received data
         # print("out:", databytes)
-        raw_f_d.write(databytes)
+        operations.append((writer.write, "raw", databytes))
+        job_records[-1].add(len(databytes))
 
-        if epson_emulation and stream and not plain_stream_f_d:
+        if converter_sync and converter_sync.add(len(databytes)):
             # Not plain-stream, but strip-escp2-stream
             # => need to sync escp2 converter
-            raw_f_d.flush()
+            operations.append((writer.flush, "raw"))
             # Experimental sync
-            sync_converters(0, job_number)
+            operations.append((sync_converters, 0, job_number))
+            converter_sync.done()
+
+        writer.submit(operations)
 
-        if usb_printer_dev_f_d:
+        if usb_sink:
             # usb_passthrough enabled: forward bytes
-            usb_printer_dev_f_d.write(databytes)
+            # Epson + HP => write directly in /dev/ interface
+            usb_sink.write(databytes)
+
+        if end_of_job != -1:
+            LOGGER.info("End of job detected")
+            end_page_timeout.end_job()
+            end_page_timeout.update()
+            receive_buffer.log_stats()
+            # Job is terminated: close file descriptors
+            end_job(writer, usb_sink)
+            job_records[-1].end_reason = "terminator"
+            return pending_databytes or None, job_records
+
+
+def open_job(
+    writer, config, job_number, buffer_size, operations, job_records, on_job_open=None
+):
+    """Add the operation opening the file of a new job and its record
+
+    :param writer: Writer thread that owns the files.
+    :param config: ConfigParser object
+    :param job_number: Number or identifier of the job.
+    :param buffer_size: Size of the job assembled in memory.
+    :param operations: Operations for the writer thread.
+    :param job_records: Records of the jobs received by :meth:`parse_buffer`.
+    :param on_job_open: Called with the record of the job.
+    :type writer: libreprinter.job_writer.JobWriter
+    :type config: configparser.ConfigParser
+    :type job_number: int | str
+    :type buffer_size: int
+    :type operations: list[tuple]
+    :type job_records: list[libreprinter.job_journal.JobRecord]
+    :type on_job_open: Callable | None
+    """
+    filepath = get_job_filepath(config, job_number)
+    operations.append((writer.open, "raw", filepath, buffer_size))
+    job_records.append(JobRecord(job_number, config["misc"]["emulation"], filepath))
+    if on_job_open:
+        on_job_open(job_records[-1])
+
+
+def end_job(writer, usb_sink):
+    """Close the files of the job and wait until they are written
+
+    The data for the USB printer is not waited for.
+
+    :param writer: Writer thread that owns the files.
+    :param usb_sink: Sink of the USB printer if usb_passthrough is enabled.
+    :type writer: libreprinter.job_writer.JobWriter
+    :type usb_sink: libreprinter.handlers.UsbPassthroughSink | None
+    """
+    writer.submit([(writer.close, "raw")])
+    writer.log_stats()
+    writer.drain()
+    if usb_sink:
+        usb_sink.log_stats()
 
 
 def read_interface(config):
@@ -467,6 +1217,22 @@ def read_interface(config):
     # Setup interface
     configure_interface(serial_handler, config)
 
+    # Writer thread of the files of the jobs
+    writer = JobWriter()
+    writer.start()
+    # Preallocated buffers for the reception of the data
+    # Chunks stay valid while they are waiting in the queue of the writer
+    receive_buffer = ReceiveBuffer(serial_handler, slots=writer.queue.maxsize + 2)
+
+    # Forward data to a USB printer
+    usb_sink = None
+    if misc_section["usb_passthrough"] != "no":
+        usb_sink = UsbPassthroughSink(
+            misc_section["usb_passthrough"],
+            policy=misc_section["usb_passthrough_overflow"],
+            spill_dir=misc_section["output_path"],
+        )
+
     # Setup communication with espc2 converter
     shared_mem_f_d = initialize_interprocess_com()
 
@@ -478,85 +1244,178 @@ def read_interface(config):
     # job_number: job number used in page naming by converters
     # TODO: set job_count according to free slots in shared memory
     jobs_count = 0
+    # Bytes received after the end of the previous job
+    pending_databytes = None
+    # Timeout (fixed or learned) shared by the jobs of the session
+    end_page_timeout = EndPageTimeout(misc_section)
+    # Post-job steps are made in background
+    finalizer = JobFinalizer()
+    finalizer.start()
+    # Persistent job numbers or time-ordered identifiers: the output
+    # directories are not scanned
+    if misc_section["job_id"] == "time":
+        job_counter = TimeJobCounter(
+            misc_section["output_path"], misc_section["serial_port"]
+        )
+    else:
+        job_counter = JobCounter(misc_section["output_path"])
+    # Record of the jobs
+    journal = None
+    if misc_section.getboolean("job_journal"):
+        journal = JobJournal(misc_section["output_path"])
+
+        def on_job_open(job_record):
+            """Record the job at its first byte, in background: an interrupted
+            reception is converted at the next start"""
+            finalizer.submit(job_record.job_id, [(journal.open_job, job_record)])
+
+    else:
+        on_job_open = None
+
     while True:
-        job_number = get_job_number(misc_section["output_path"])
         # TODO: Set job_number according to pending jobs in shared memory and
         #   real pending files in /raw dir
-        LOGGER.debug("Current job number: %s", job_number)
 
         # TODO: epson: jobs | no plain text: verif slot: get_status_message(cnt) == 0 => boucle while d'attente ?
 
         # TODO: redéfinier emulation à l'origine ?
         # ou passer toutes les fonctions qyi suivent à la fin de parse_buffer...
         try:
-            parse_buffer(serial_handler, job_number, config)
+            pending_databytes, job_records = parse_buffer(
+                receive_buffer,
+                writer,
+                None,
+                config,
+                pending_databytes,
+                end_page_timeout,
+                usb_sink,
+                job_counter,
+                on_job_open,
+            )
         except SerialException as e:
             # Properly ends the infinite loop after an error on the serial pipe
             LOGGER.exception(e)
             break
+        except OSError as e:
+            # Error of the writer thread (disk full, I/O error): the current job
+            # is ended as is, the next ones are received
+            LOGGER.error("Error while writing the job, job dropped: %s", e)
+            writer.reset()
+            pending_databytes = None
+            continue
 
-        epson_emulation = misc_section["emulation"] == "epson"
-
-        LOGGER.debug(
-            "epson ? %s, usb_passthrough ? %s",
-            epson_emulation, misc_section["usb_passthrough"]
-        )
-
-        if epson_emulation and misc_section["usb_passthrough"] == "no":
-            # No conversion if usb_passthrough is enabled
-            # Since raw and pcl converters are implemented here,
-            # sync of converter should be made only for epson (espc2):
-            # no plain text | strip-escp2-jobs.
-            # strip-escp2-stream is made during the loop.
-            sync_converters(jobs_count, job_number)
-
-        copy_args = (misc_section["output_path"], job_number)
-
-        if misc_section["emulation"] == "hp":
-            # Copy current file to pcl folder
-            shutil.copy(
-                "{}/raw/{}.raw".format(*copy_args),
-                "{}/pcl/{}.pcl".format(*copy_args),
-            )
-
-        if misc_section["emulation"] == "hpgl":
-            # Copy current file to hpgl folder
-            shutil.copy(
-                "{}/raw/{}.raw".format(*copy_args),
-                "{}/hpgl/{}.hpgl".format(*copy_args),
-            )
-
-        if misc_section["emulation"] == "postscript":
-            # Copy current file to ps folder
-            shutil.copy(
-                "{}/raw/{}.raw".format(*copy_args),
-                "{}/ps/{}.ps".format(*copy_args),
-            )
-
-        if (
-            config["misc"]["emulation"] == "text"
-            or (epson_emulation and (misc_section["endlesstext"] == "plain-jobs"))
-        ):
-            # Process end of lines in raw file and copy it to /txt_jobs dir
-            convert_file_line_ending(
-                "{}/raw/{}.raw".format(*copy_args),
-                "{}/txt_jobs/{}.txt".format(*copy_args),
-                config["misc"]["line_ending"],
-            )
+        # Files of the job are written: the next job can be received during
+        # the finalization
+        for job_record in job_records:
+            steps = get_finalization_steps(config, jobs_count, job_record.job_id)
+            if journal:
+                steps.append((journal.end_job, job_record))
+            finalizer.submit(job_record.job_id, steps)
 
         if jobs_count >= 199:
             # Arbitrary limit
             jobs_count = 0
 
         jobs_count += 1
-        job_number += 1
 
     # Should never be reached unless the link to the interface has been broken
+    # Write the received data
+    writer.stop()
+    finalizer.stop()
+    if usb_sink:
+        usb_sink.close(timeout=10)
     serial_handler.close()
     # Close opened shared mem in initialize_interprocess_com()
     shared_mem_f_d.close()
 
 
+def get_job_filepath(config, job_number):
+    """Get the path of the file in which a job is received
+
+    The jobs of the emulations in `EMULATION_FILES` are directly written in
+    the directory watched by their converter: the data is written once, and
+    the converter is triggered by the closing of the file. Others are written
+    in the raw directory.
+
+    :param config: ConfigParser object
+    :param job_number: Number or identifier of the job.
+    :type config: configparser.ConfigParser
+    :type job_number: int | str
+    :rtype: str
+    """
+    misc_section = config["misc"]
+    directory, extension = EMULATION_FILES.get(
+        misc_section["emulation"], ("raw", "raw")
+    )
+    return f"{misc_section['output_path']}{directory}/{job_number}.{extension}"
+
+
+def get_finalization_steps(config, jobs_count, job_number):
+    """Get the steps made after the end of a job
+
+    - sync of the escp2 converters (epson emulation without usb_passthrough),
+    - hard link in the raw directory of the file of the job (hp, hpgl,
+      postscript; see :meth:`get_job_filepath`),
+    - line endings conversion of the raw file (text emulation or plain-jobs).
+
+    .. seealso:: :class:`libreprinter.job_finalizer.JobFinalizer`
+
+    :param config: ConfigParser object
+    :param jobs_count: Slot of the job in the shared memory.
+    :param job_number: Number or identifier of the job.
+    :type config: configparser.ConfigParser
+    :type jobs_count: int
+    :type job_number: int | str
+    :return: Tuples `(function, *args)`.
+    :rtype: list[tuple]
+    """
+    misc_section = config["misc"]
+    steps = []
+    output_path = misc_section["output_path"]
+    raw_filepath = f"{output_path}raw/{job_number}.raw"
+
+    epson_emulation = misc_section["emulation"] == "epson"
+
+    LOGGER.debug(
+        "epson ? %s, usb_passthrough ? %s",
+        epson_emulation,
+        misc_section["usb_passthrough"],
+    )
+
+    if (
+        epson_emulation
+        and misc_section["usb_passthrough"] == "no"
+        and misc_section["job_id"] == "number"
+    ):
+        # No conversion if usb_passthrough is enabled
+        # Since raw and pcl converters are implemented here,
+        # sync of converter should be made only for epson (espc2):
+        # no plain text | strip-escp2-jobs.
+        # strip-escp2-stream is made during the loop.
+        # The legacy converter is not used with time job identifiers.
+        steps.append((sync_converters, jobs_count, job_number))
+
+    job_filepath = get_job_filepath(config, job_number)
+    if job_filepath != raw_filepath:
+        # The job is already in the pcl, hpgl or ps folder: add it to the raw
+        # folder without writing the data again
+        steps.append((link_file, job_filepath, raw_filepath))
+
+    if misc_section["emulation"] == "text" or (
+        epson_emulation and (misc_section["endlesstext"] == "plain-jobs")
+    ):
+        # Process end of lines in raw file and copy it to /txt_jobs dir
+        steps.append(
+            (
+                convert_file_line_ending,
+                raw_filepath,
+                f"{output_path}txt_jobs/{job_number}.txt",
+                misc_section["line_ending"],
+            )
+        )
+    return steps
+
+
 def sync_converters(jobs_count, job_number):
     """Synchronize status of the current job with converters
     Basically we send job and page numbers in order that the converter processes
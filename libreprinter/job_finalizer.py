@@ -0,0 +1,109 @@
+# Libreprinter is a software allowing to use the Centronics and serial printing
+# functions of vintage computers on modern equipement through a tiny hardware
+# interface.
+# Copyright (C) 2020-2024  Ysard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Thread that finalizes the received jobs
+
+After the end of a job, the files expected by the converters are produced
+(copies, line ending conversions) and the converters are synchronized.
+These steps are made by a dedicated thread: the reception of the next job
+(see :meth:`libreprinter.interface.read_interface`) starts immediately.
+"""
+
+# Standard imports
+import queue
+import threading
+
+# Custom imports
+from libreprinter.commons import logger
+
+LOGGER = logger()
+
+
+class JobFinalizer(threading.Thread):
+    """Thread executing the finalization steps of the jobs in order
+
+    Steps are tuples `(function, *args)`. The steps of a job are executed
+    after those of the previous jobs (ordered completion). If a step raises
+    an exception, the error is logged and the following steps of the same
+    job are skipped; the next jobs are processed.
+
+    The queue is not bounded: finalizations do not slow down the reception.
+
+    Attributes:
+        :param queue: Jobs waiting to be finalized: `(job_number, steps)`.
+        :param last_job: Number of the last finalized job.
+        :param failed_jobs: Number of jobs with a failed step.
+        :type queue: queue.Queue
+        :type last_job: int | None
+        :type failed_jobs: int
+    """
+
+    def __init__(self):
+        """Constructor"""
+        super().__init__(name="JobFinalizer", daemon=True)
+        self.queue = queue.Queue()
+        self.last_job = None
+        self.failed_jobs = 0
+
+    @property
+    def depth(self):
+        """Number of jobs waiting to be finalized
+
+        :rtype: int
+        """
+        return self.queue.qsize()
+
+    def submit(self, job_number, steps):
+        """Queue the finalization steps of a job
+
+        :param job_number: Number of the job.
+        :param steps: Tuples `(function, *args)`.
+        :type job_number: int
+        :type steps: list[tuple]
+        """
+        self.queue.put((job_number, steps))
+        if self.depth > 1:
+            LOGGER.debug("Finalizer: %d jobs waiting", self.depth)
+
+    def drain(self):
+        """Wait for the finalization of all the submitted jobs"""
+        self.queue.join()
+
+    def stop(self):
+        """Finalize the pending jobs and end the thread"""
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        """Finalize the submitted jobs until :meth:`stop` is called"""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+
+            job_number, steps = item
+            for function, *args in steps:
+                try:
+                    function(*args)
+                except Exception as e:
+                    LOGGER.error("Finalization of job %s failed", job_number)
+                    LOGGER.exception(e)
+                    self.failed_jobs += 1
+                    break
+            self.last_job = job_number
+            self.queue.task_done()
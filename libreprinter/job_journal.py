@@ -0,0 +1,467 @@
+# Libreprinter is a software allowing to use the Centronics and serial printing
+# functions of vintage computers on modern equipement through a tiny hardware
+# interface.
+# Copyright (C) 2020-2024  Ysard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Journal of the received jobs and of their conversions
+
+The journal is a SQLite database in WAL mode (`JOURNAL_FILE` in `output_path`):
+the capture program and the plugins append records while it is read by the
+command line interface::
+
+    $ libreprinter-journal jobs --since 2024-01-01
+    $ libreprinter-journal failed
+    $ libreprinter-journal stats
+
+A job is recorded when its first byte is received, and updated at its end;
+the job of a reception interrupted by a stop of the service keeps the
+`interrupted` end reason. Conversions are only inserted; nothing is deleted.
+"""
+
+# Standard imports
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+from datetime import datetime
+from contextlib import closing, contextmanager
+
+# Custom imports
+from libreprinter.config_parser import load_config
+from libreprinter.commons import logger, CONFIG_FILE
+
+LOGGER = logger()
+
+# Database of the journal, in output_path
+JOURNAL_FILE = ".journal.sqlite"
+# Maximum waiting time (s) for a database locked by another writer
+JOURNAL_TIMEOUT = 10
+JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    emulation TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    first_byte REAL,
+    last_byte REAL,
+    end_reason TEXT NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_job_id ON jobs (job_id);
+CREATE INDEX IF NOT EXISTS jobs_first_byte ON jobs (first_byte);
+CREATE TABLE IF NOT EXISTS conversions (
+    id INTEGER PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    converter TEXT NOT NULL,
+    status TEXT NOT NULL,
+    input_path TEXT NOT NULL,
+    output_path TEXT,
+    error TEXT,
+    duration REAL,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversions_job_id ON conversions (job_id);
+CREATE INDEX IF NOT EXISTS conversions_status ON conversions (status);
+"""
+
+
+class JobRecord:
+    """Metadata of a received job
+
+    Attributes:
+        :param job_id: Number or identifier of the job.
+        :param emulation: Emulation used during the reception.
+        :param path: Path of the file of the job.
+        :param size: Size of the file of the job (seiko-qt2100 timestamps
+            included).
+        :param first_byte: Reception time of the first byte (timestamp).
+        :param last_byte: Reception time of the last byte (timestamp).
+        :param end_reason: Detection of the end of the job: timeout, terminator
+            (auto_end_page) or split (seiko-qt2100 data analysis).
+        :param row_id: Row of the job in the journal, once recorded at its
+            first byte (see :meth:`JobJournal.open_job`).
+        :type job_id: int | str
+        :type emulation: str
+        :type path: str
+        :type size: int
+        :type first_byte: float | None
+        :type last_byte: float | None
+        :type end_reason: str | None
+        :type row_id: int | None
+    """
+
+    def __init__(self, job_id, emulation, path):
+        """Constructor
+
+        :param job_id: Number or identifier of the job.
+        :param emulation: Emulation used during the reception.
+        :param path: Path of the file of the job.
+        :type job_id: int | str
+        :type emulation: str
+        :type path: str
+        """
+        self.job_id = job_id
+        self.emulation = emulation
+        self.path = path
+        self.size = 0
+        self.first_byte = None
+        self.last_byte = None
+        self.end_reason = None
+        self.row_id = None
+
+    def add(self, size):
+        """Count bytes received and written in the file of the job
+
+        :type size: int
+        """
+        now = time.time()
+        if self.first_byte is None:
+            self.first_byte = now
+        self.last_byte = now
+        self.size += size
+
+
+class JobJournal:
+    """Journal of the jobs and of their conversions
+
+    A connection is opened for each record: the journal can be shared by
+    threads and processes (SQLite locks, WAL mode).
+
+    Attributes:
+        :param filepath: Path of the database.
+        :type filepath: str
+    """
+
+    def __init__(self, output_path, create=True):
+        """Constructor
+
+        :param output_path: Path of the output directories.
+        :param create: Create the database and its tables if needed.
+        :type output_path: str
+        :type create: bool
+        """
+        self.filepath = output_path + JOURNAL_FILE
+        if create:
+            with self.connect() as connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(JOURNAL_SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        """Open a connection to the database; the transaction is committed
+        at the end of the block
+
+        :rtype: sqlite3.Connection
+        """
+        with closing(sqlite3.connect(self.filepath, timeout=JOURNAL_TIMEOUT)) as connection:
+            connection.row_factory = sqlite3.Row
+            with connection:
+                yield connection
+
+    def open_job(self, record):
+        """Record a job whose first byte is received
+
+        The job is recorded as interrupted until :meth:`end_job` is called.
+
+        :type record: JobRecord
+        """
+        now = time.time()
+        with self.connect() as connection:
+            cursor = connection.execute(
+                "INSERT INTO jobs "
+                "(job_id, emulation, size, first_byte, last_byte, end_reason, path) "
+                "VALUES (?, ?, 0, ?, ?, 'interrupted', ?)",
+                (str(record.job_id), record.emulation, now, now, record.path),
+            )
+        record.row_id = cursor.lastrowid
+
+    def end_job(self, record):
+        """Update the record of an ended job
+
+        The job is inserted if it was not recorded at its first byte.
+
+        :type record: JobRecord
+        """
+        if record.row_id is None:
+            self.add_job(record)
+            return
+        with self.connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET size = ?, first_byte = ?, last_byte = ?, "
+                "end_reason = ? WHERE id = ?",
+                (
+                    record.size,
+                    record.first_byte,
+                    record.last_byte,
+                    record.end_reason,
+                    record.row_id,
+                ),
+            )
+
+    def add_job(self, record):
+        """Record a received job
+
+        :type record: JobRecord
+        """
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs "
+                "(job_id, emulation, size, first_byte, last_byte, end_reason, path) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(record.job_id),
+                    record.emulation,
+                    record.size,
+                    record.first_byte,
+                    record.last_byte,
+                    record.end_reason,
+                    record.path,
+                ),
+            )
+
+    def add_conversion(
+        self, job_id, converter, status, input_path, output_path=None, error=None,
+        duration=None,
+    ):
+        """Record the outcome of a conversion
+
+        :param job_id: Number or identifier of the job.
+        :param converter: Name of the converter.
+        :param status: ok or failed.
+        :param input_path: Converted file.
+        :param output_path: Produced file.
+        :param error: Error message if the conversion failed.
+        :param duration: Duration of the conversion in seconds.
+        :type job_id: int | str
+        :type converter: str
+        :type status: str
+        :type input_path: str
+        :type output_path: str | None
+        :type error: str | None
+        :type duration: float | None
+        """
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT INTO conversions "
+                "(job_id, converter, status, input_path, output_path, error, "
+                "duration, time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(job_id),
+                    converter,
+                    status,
+                    str(input_path),
+                    output_path and str(output_path),
+                    error,
+                    duration,
+                    time.time(),
+                ),
+            )
+
+    def jobs(self, since=None, limit=None):
+        """Get the received jobs, most recent first
+
+        :param since: Minimum reception time of the first byte.
+        :param limit: Maximum number of jobs.
+        :type since: datetime | None
+        :type limit: int | None
+        :rtype: list[sqlite3.Row]
+        """
+        query = "SELECT * FROM jobs WHERE first_byte >= ? ORDER BY first_byte DESC"
+        params = [since.timestamp() if since else 0]
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self.connect() as connection:
+            return connection.execute(query, params).fetchall()
+
+    def failed_conversions(self):
+        """Get the failed conversions, most recent first
+
+        :rtype: list[sqlite3.Row]
+        """
+        with self.connect() as connection:
+            return connection.execute(
+                "SELECT * FROM conversions WHERE status = 'failed' ORDER BY time DESC"
+            ).fetchall()
+
+    def unconverted_jobs(self, max_attempts, before=None):
+        """Get the jobs without successful conversion, oldest first
+
+        Conversions made before the end of a job are ignored (numbers are
+        reused after a cleanup), as well as the printing of the pdf files.
+        Interrupted jobs are returned.
+
+        :param max_attempts: Jobs with this number of failed conversions
+            are not returned.
+        :param before: Maximum reception time of the first byte; jobs being
+            received are excluded.
+        :type max_attempts: int
+        :type before: float | None
+        :rtype: list[sqlite3.Row]
+        """
+        with self.connect() as connection:
+            return connection.execute(
+                "SELECT jobs.* FROM jobs LEFT JOIN conversions "
+                "ON conversions.job_id = jobs.job_id "
+                "AND conversions.time >= jobs.last_byte "
+                "AND conversions.converter != 'lpr' "
+                "WHERE ? IS NULL OR jobs.first_byte < ? "
+                "GROUP BY jobs.id "
+                "HAVING COALESCE(SUM(conversions.status = 'ok'), 0) = 0 "
+                "AND COUNT(conversions.id) < ? "
+                "ORDER BY jobs.first_byte",
+                (before, before, max_attempts),
+            ).fetchall()
+
+    def daily_stats(self):
+        """Get the number of jobs and of received bytes per day
+
+        :return: Rows with day, jobs and bytes columns, most recent first.
+        :rtype: list[sqlite3.Row]
+        """
+        with self.connect() as connection:
+            return connection.execute(
+                "SELECT date(first_byte, 'unixepoch', 'localtime') AS day, "
+                "COUNT(*) AS jobs, SUM(size) AS bytes "
+                "FROM jobs GROUP BY day ORDER BY day DESC"
+            ).fetchall()
+
+
+def record_conversion(
+    input_path, converter, status, output_path=None, error=None, duration=None
+):
+    """Record the outcome of a conversion made by a plugin
+
+    The journal is found from the converted file
+    (`<output_path>/<directory>/<job_id>.<extension>`); nothing is done if it
+    doesn't exist (see `job_journal` setting). Errors are only logged: the
+    journal must not break a conversion.
+
+    .. seealso:: :meth:`JobJournal.add_conversion`
+    """
+    input_path = Path(input_path)
+    output_dir = str(input_path.resolve().parent.parent) + "/"
+    if not Path(output_dir + JOURNAL_FILE).exists():
+        return
+    try:
+        JobJournal(output_dir, create=False).add_conversion(
+            input_path.stem, converter, status, input_path, output_path, error,
+            duration,
+        )
+    except sqlite3.Error as e:
+        LOGGER.error("Job journal not updated: %s", e)
+
+
+@contextmanager
+def recorded_conversion(input_path, converter, output_path=None, unrecorded=()):
+    """Time and record the conversion made in the block
+
+    The conversion is recorded as failed if an exception is raised in the
+    block (the exception is propagated), as done otherwise.
+
+    .. seealso:: :meth:`record_conversion`
+
+    :param input_path: Converted file.
+    :param converter: Name of the converter.
+    :key output_path: Produced file, if any.
+    :key unrecorded: Exceptions after which the file is converted otherwise:
+        nothing is recorded.
+    :type input_path: str | Path
+    :type converter: str
+    :type output_path: str | Path | None
+    :type unrecorded: tuple[type[Exception]]
+    """
+    start = time.monotonic()
+    try:
+        yield
+    except unrecorded:
+        raise
+    except Exception as e:
+        record_conversion(input_path, converter, "failed", error=str(e))
+        raise
+    record_conversion(
+        input_path, converter, "ok", output_path, duration=time.monotonic() - start
+    )
+
+
+def format_time(timestamp):
+    """Format a timestamp of the journal
+
+    :type timestamp: float | None
+    :rtype: str
+    """
+    if timestamp is None:
+        return "-"
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def main():
+    """Entry point and argument parser of the journal inspector"""
+    parser = argparse.ArgumentParser(
+        description="Inspect the journal of the received jobs",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-C",
+        "--config_file",
+        help="Configuration file giving the output_path of the journal.",
+        default=CONFIG_FILE,
+        type=Path,
+    )
+    parser.add_argument(
+        "-o", "--output_path", help="Override output_path of the configuration file."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    jobs_parser = subparsers.add_parser("jobs", help="List the received jobs.")
+    jobs_parser.add_argument(
+        "--since", type=datetime.fromisoformat, help="Date like 2024-01-31."
+    )
+    jobs_parser.add_argument(
+        "--limit", type=int, default=50, help="Maximum number of jobs."
+    )
+    subparsers.add_parser("failed", help="List the failed conversions.")
+    subparsers.add_parser("stats", help="Number of jobs and bytes per day.")
+    args = parser.parse_args()
+
+    output_path = args.output_path or load_config(args.config_file)["misc"]["output_path"]
+    output_path = output_path if output_path.endswith("/") else output_path + "/"
+    if not Path(output_path + JOURNAL_FILE).exists():
+        parser.exit(1, f"No job journal in <{output_path}>\n")
+    journal = JobJournal(output_path, create=False)
+
+    if args.command == "jobs":
+        print("job_id\temulation\tsize\tfirst_byte\tlast_byte\tend_reason\tpath")
+        for row in journal.jobs(args.since, args.limit):
+            print(
+                row["job_id"], row["emulation"], row["size"],
+                format_time(row["first_byte"]), format_time(row["last_byte"]),
+                row["end_reason"], row["path"], sep="\t",
+            )
+    elif args.command == "failed":
+        print("job_id\tconverter\ttime\tinput_path\terror")
+        for row in journal.failed_conversions():
+            print(
+                row["job_id"], row["converter"], format_time(row["time"]),
+                row["input_path"], row["error"], sep="\t",
+            )
+    else:
+        print("day\tjobs\tbytes")
+        for row in journal.daily_stats():
+            print(row["day"], row["jobs"], row["bytes"], sep="\t")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
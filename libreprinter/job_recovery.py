@@ -0,0 +1,203 @@
+# Libreprinter is a software allowing to use the Centronics and serial printing
+# functions of vintage computers on modern equipement through a tiny hardware
+# interface.
+# Copyright (C) 2020-2024  Ysard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Conversion of the jobs left unconverted by a previous run
+
+Plugins only react to the `closed` events of the files; jobs written while
+the service was stopped, or whose conversion was interrupted, are never
+converted. At startup, the journal of the jobs (see
+:mod:`libreprinter.job_journal`) gives the jobs without successful
+conversion, including the jobs whose reception was interrupted (recorded at
+their first byte); a `closed` event is dispatched for their non-empty files
+to the handlers of the plugins, as if they had just been written.
+
+Nothing is recovered without journal (`job_journal=no`).
+
+Events are dispatched by the recovery threads, and their conversions are
+submitted in background to the pool of the plugins (see
+:meth:`libreprinter.conversion_pool.ConversionPool.background`): jobs
+received during the recovery are converted first. Only a few conversions are
+submitted at once for each watched directory.
+"""
+
+# Standard imports
+import os
+import time
+import queue
+import threading
+from concurrent.futures import wait
+from pathlib import Path
+from watchdog.events import FileClosedEvent
+from watchdog.observers.api import BaseObserver
+
+# Custom imports
+from libreprinter.job_journal import JobJournal, JOURNAL_FILE
+from libreprinter.conversion_pool import get_pool
+from libreprinter.commons import logger
+
+LOGGER = logger()
+
+# Number of conversions submitted at once for each watched directory
+RECOVERY_BATCH_SIZE = 4
+# Jobs whose conversion failed this number of times are not recovered anymore
+RECOVERY_MAX_ATTEMPTS = 3
+
+
+def get_recovery_inputs(output_path, journal, before=None):
+    """Get the files of the jobs without successful conversion
+
+    Files are the files of the jobs, and their text version in `txt_jobs`
+    (text emulation, plain-jobs).
+
+    :param output_path: Path of the output directories.
+    :param journal: Journal of the jobs.
+    :param before: Maximum reception time of the first byte of the jobs
+        (start of the recovery); jobs being received are excluded.
+    :type output_path: str
+    :type journal: libreprinter.job_journal.JobJournal
+    :type before: float | None
+    :return: Existing non-empty files, oldest jobs first.
+    :rtype: list[pathlib.Path]
+    """
+    inputs = dict()
+    for row in journal.unconverted_jobs(RECOVERY_MAX_ATTEMPTS, before):
+        for filepath in (
+            Path(row["path"]),
+            Path(f"{output_path}txt_jobs/{row['job_id']}.txt"),
+        ):
+            # Interrupted jobs assembled in memory have empty files
+            if filepath.is_file() and filepath.stat().st_size:
+                # Job numbers may be reused: files are queued once
+                inputs[filepath] = None
+    return list(inputs)
+
+
+def get_watches(observers):
+    """Get the observer and the watch of each watched directory
+
+    :param observers: Objects returned by the plugins.
+    :type observers: list
+    :rtype: dict[str, tuple[watchdog.observers.api.BaseObserver,
+        watchdog.observers.api.ObservedWatch]]
+    """
+    watches = dict()
+    for observer in observers:
+        if not isinstance(observer, BaseObserver):
+            # Converter process
+            continue
+        for emitter in observer.emitters:
+            watches[os.path.realpath(emitter.watch.path)] = observer, emitter.watch
+    return watches
+
+
+def recover_observer(observer, watch, filepaths):
+    """Dispatch the closed events of the files of a watched directory by batches
+
+    The events are dispatched to the handlers of the observer in the current
+    thread; the conversions of a batch are waited for before the next one.
+
+    :type observer: watchdog.observers.api.BaseObserver
+    :type watch: watchdog.observers.api.ObservedWatch
+    :type filepaths: list[pathlib.Path]
+    """
+    event_queue = queue.Queue()
+    pool = get_pool()
+    for index in range(0, len(filepaths), RECOVERY_BATCH_SIZE):
+        if not observer.is_alive():
+            # Handlers are removed from a stopped observer
+            LOGGER.error("Recovery of <%s> interrupted!", watch.path)
+            return
+        with pool.background() as futures:
+            for filepath in filepaths[index:index + RECOVERY_BATCH_SIZE]:
+                LOGGER.debug("Recover job file <%s>", filepath)
+                event_queue.put((FileClosedEvent(str(filepath)), watch))
+                try:
+                    observer.dispatch_events(event_queue)
+                except Exception as e:
+                    LOGGER.exception(e)
+        wait(futures)
+
+
+def recover_jobs(output_path, observers):
+    """Convert the jobs left unconverted by a previous run
+
+    Each watched directory is processed by a thread; the recovery time is
+    logged.
+
+    :param output_path: Path of the output directories.
+    :param observers: Objects returned by the plugins.
+    :type output_path: str
+    :type observers: list
+    """
+    start = time.monotonic()
+    journal = JobJournal(output_path, create=False)
+    filepaths = get_recovery_inputs(output_path, journal, time.time())
+    watches = get_watches(observers)
+
+    # Files by watched directory
+    jobs = dict()
+    for filepath in filepaths:
+        directory = os.path.realpath(filepath.parent)
+        if directory in watches:
+            jobs.setdefault(directory, []).append(filepath)
+    LOGGER.info(
+        "Recovery: %d job files to convert, found in %.3f s",
+        sum(map(len, jobs.values())),
+        time.monotonic() - start,
+    )
+    if not jobs:
+        return
+
+    threads = [
+        threading.Thread(
+            target=recover_observer,
+            args=(*watches[directory], directory_files),
+            name="JobRecovery",
+        )
+        for directory, directory_files in jobs.items()
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    LOGGER.info("Recovery done in %.3f s", time.monotonic() - start)
+    get_pool().log_stats()
+
+
+def start_recovery(misc_section, observers):
+    """Launch the recovery of the jobs in a background thread
+
+    Nothing is done if the journal is disabled (see `job_journal` setting),
+    even if the journal of a previous run exists, or if there is no journal.
+
+    :param misc_section: Section `misc` of the configuration.
+    :param observers: Objects returned by the plugins.
+    :type misc_section: configparser.SectionProxy
+    :type observers: list
+    :rtype: threading.Thread | None
+    """
+    output_path = misc_section["output_path"]
+    if not misc_section.getboolean("job_journal"):
+        return
+    if not Path(output_path + JOURNAL_FILE).exists():
+        return
+    thread = threading.Thread(
+        target=recover_jobs, args=(output_path, observers), name="JobRecovery",
+        daemon=True,
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,287 @@
+# Libreprinter is a software allowing to use the Centronics and serial printing
+# functions of vintage computers on modern equipement through a tiny hardware
+# interface.
+# Copyright (C) 2020-2024  Ysard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Writer thread that owns the file descriptors of the jobs
+
+The reception of the serial port (see :meth:`libreprinter.interface.parse_buffer`)
+only reads and processes the data; writes to the disk and to the USB printer
+are made by a thread fed by a bounded queue. A stall of the storage (SD card)
+does not stop the reading of the port until the queue is full.
+
+Files of the jobs can be assembled in memory and written at once when they
+are closed (see :class:`SpooledJobFile`).
+"""
+
+# Standard imports
+import queue
+import threading
+
+# Custom imports
+from libreprinter.commons import logger
+
+LOGGER = logger()
+
+# Number of chunks waiting to be written
+WRITER_QUEUE_SIZE = 64
+
+
+class JobWriter(threading.Thread):
+    """Thread executing the writing operations submitted by the reception
+
+    Operations are tuples `(function, *args)`, executed in order.
+    The methods :meth:`open`, :meth:`write`, :meth:`flush` and :meth:`close`
+    operate on the files owned by the thread; they must only be submitted,
+    not called directly.
+
+    All the operations of a received chunk are submitted at once: a queue of
+    `maxsize` items references at most `maxsize` chunks, plus the one being
+    written. The ring of :class:`libreprinter.handlers.ReceiveBuffer` must
+    therefore have at least `maxsize + 2` slots.
+
+    An exception raised by an operation is raised again in the reception
+    thread by the next call to :meth:`submit` or :meth:`drain`; the following
+    operations are dropped. The reception thread then calls :meth:`reset` to
+    drop the job.
+
+    Attributes:
+        :param queue: Operations waiting to be executed.
+        :param files: Opened files, by name.
+        :param error: Exception raised by an operation.
+        :param high_water_mark: Maximum number of items seen in the queue.
+        :param full_waits: Number of submissions blocked by a full queue.
+        :type queue: queue.Queue
+        :type files: dict[str, io.BufferedWriter]
+        :type error: Exception | None
+        :type high_water_mark: int
+        :type full_waits: int
+    """
+
+    def __init__(self, maxsize=WRITER_QUEUE_SIZE):
+        """Constructor
+
+        :param maxsize: Maximum number of items in the queue.
+        :type maxsize: int
+        """
+        super().__init__(name="JobWriter", daemon=True)
+        self.queue = queue.Queue(maxsize)
+        self.files = dict()
+        self.error = None
+        self.high_water_mark = 0
+        self.full_waits = 0
+
+    @property
+    def depth(self):
+        """Number of items waiting in the queue
+
+        :rtype: int
+        """
+        return self.queue.qsize()
+
+    def submit(self, operations):
+        """Queue a list of operations; wait if the queue is full
+
+        :param operations: Tuples `(function, *args)`.
+        :type operations: list[tuple]
+        :raises Exception: The error raised by a previous operation.
+        """
+        self.raise_error()
+        if self.queue.full():
+            self.full_waits += 1
+        self.queue.put(operations)
+        self.high_water_mark = max(self.high_water_mark, self.queue.qsize())
+
+    def drain(self):
+        """Wait for the execution of all the submitted operations
+
+        :raises Exception: The error raised by an operation.
+        """
+        self.queue.join()
+        self.raise_error()
+
+    def raise_error(self):
+        """Raise the error of an operation only once"""
+        if self.error:
+            error, self.error = self.error, None
+            raise error
+
+    def reset(self):
+        """Close the opened files and forget the error of the operations
+
+        Called by the reception thread after an error: the end of the
+        submitted operations is waited for, then the files are closed as is.
+        """
+        self.queue.join()
+        # Operations are executed again
+        self.error = None
+        self.queue.put([(self.discard,)])
+        self.queue.join()
+
+    def stop(self):
+        """Execute the pending operations, close the files and end the thread"""
+        self.queue.put(None)
+        self.join()
+
+    def log_stats(self):
+        """Log the usage of the queue"""
+        LOGGER.debug(
+            "Writer queue: depth %d, high-water mark %d/%d, full waits: %d",
+            self.depth,
+            self.high_water_mark,
+            self.queue.maxsize,
+            self.full_waits,
+        )
+
+    def run(self):
+        """Execute the submitted operations until :meth:`stop` is called"""
+        while True:
+            operations = self.queue.get()
+            if operations is None:
+                for file in self.files.values():
+                    file.close()
+                self.files.clear()
+                self.queue.task_done()
+                return
+
+            for function, *args in operations:
+                if self.error:
+                    # Drop the operations until the error is seen
+                    break
+                try:
+                    function(*args)
+                except Exception as e:
+                    LOGGER.exception(e)
+                    self.error = e
+            self.queue.task_done()
+
+    def open(self, name, filepath, buffer_size=0):
+        """Open a file for writing
+
+        :param name: Name used by the other operations.
+        :param filepath: Path of the file.
+        :param buffer_size: If not 0, the data is kept in memory until this
+            size is reached (see :class:`SpooledJobFile`).
+        :type name: str
+        :type filepath: str
+        :type buffer_size: int
+        """
+        if buffer_size:
+            self.files[name] = SpooledJobFile(filepath, buffer_size)
+        else:
+            self.files[name] = open(filepath, "wb")
+
+    def write(self, name, data):
+        """Write data in an opened file
+
+        :type name: str
+        :type data: bytes | bytearray | memoryview
+        """
+        self.files[name].write(data)
+
+    def flush(self, name):
+        """Flush an opened file
+
+        :type name: str
+        """
+        self.files[name].flush()
+
+    def close(self, name):
+        """Close an opened file
+
+        :type name: str
+        """
+        self.files.pop(name).close()
+
+    def discard(self):
+        """Close all the opened files; their errors are logged"""
+        for name, file in self.files.items():
+            try:
+                file.close()
+            except OSError as e:
+                LOGGER.error("Error while closing the file %s: %s", name, e)
+        self.files.clear()
+
+
+class SpooledJobFile:
+    """File of a job assembled in memory
+
+    The file is created and written at once when it is closed; a job is then
+    seen by the converters (inotify events) as a single write. Data is
+    written to the file as it arrives once the size of the job exceeds
+    `threshold`, or after a call to :meth:`flush` (the data must be readable
+    by the converters).
+
+    Attributes:
+        :param filepath: Path of the file.
+        :param threshold: Maximum number of bytes kept in memory.
+        :param buffer: Data not yet written.
+        :param file: Opened file once the data is spilled to the disk.
+        :type filepath: str
+        :type threshold: int
+        :type buffer: bytearray
+        :type file: io.BufferedWriter | None
+    """
+
+    def __init__(self, filepath, threshold):
+        """Constructor
+
+        :param filepath: Path of the file.
+        :param threshold: Maximum number of bytes kept in memory.
+        :type filepath: str
+        :type threshold: int
+        """
+        self.filepath = filepath
+        self.threshold = threshold
+        self.buffer = bytearray()
+        self.file = None
+
+    @property
+    def spilled(self):
+        """Tell if the data is written to the disk as it arrives
+
+        :rtype: bool
+        """
+        return self.file is not None
+
+    def write(self, data):
+        """Keep data in memory or write it if the threshold is exceeded
+
+        :type data: bytes | bytearray | memoryview
+        """
+        if self.file is None:
+            if len(self.buffer) + len(data) <= self.threshold:
+                self.buffer += data
+                return
+            self.spill()
+        self.file.write(data)
+
+    def spill(self):
+        """Create the file and write the data kept in memory"""
+        self.file = open(self.filepath, "wb")
+        self.file.write(self.buffer)
+        self.buffer = bytearray()
+
+    def flush(self):
+        """Write the data to the disk"""
+        if self.file is None:
+            self.spill()
+        self.file.flush()
+
+    def close(self):
+        """Write the data to the disk and close the file"""
+        if self.file is None:
+            self.spill()
+        self.file.close()
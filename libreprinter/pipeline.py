@@ -0,0 +1,305 @@
+# Libreprinter is a software allowing to use the Centronics and serial printing
+# functions of vintage computers on modern equipement through a tiny hardware
+# interface.
+# Copyright (C) 2020-2024  Ysard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Pipelines of external converters running at once
+
+The output of each process is directly connected to the input of the next
+one: all the processes of a pipeline run at once and a document of any size
+is converted in bounded memory, the pipe buffers being the only intermediate
+storage.
+
+Example::
+
+    pipeline = Pipeline()
+    pipeline.add(["hp2xx", "-m", "eps", "-f-", "in.hpgl"])
+    header = pipeline.read_header(b"%%EndComments", timeout=10)
+    pipeline.add(["gs", ..., "-"], header=header)
+    pipeline.wait(timeout=10)
+
+Errors messages of the processes are written in temporary files: a process
+writing a lot of messages can't block the pipeline.
+"""
+
+# Standard imports
+import re
+import shutil
+import signal
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+
+# Custom imports
+from libreprinter.commons import logger
+
+LOGGER = logger()
+
+# Size (bytes) of the chunks copied between 2 processes
+PIPELINE_CHUNK_SIZE = 65536
+# Maximum size (bytes) of a header read by read_header()
+PIPELINE_HEADER_SIZE = 4096
+# Maximum size (bytes) of the outputs kept for the logs
+PIPELINE_LOG_SIZE = 4096
+
+BOUNDING_BOX_PATTERN = re.compile(
+    rb"%%BoundingBox:\s*(-?\d+)\s+(-?\d+)\s+(-?\d+)\s+(-?\d+)"
+)
+
+
+def copy_stream(header, source, destination):
+    """Write a header, then copy a stream until its end
+
+    Used in a thread between 2 processes when the beginning of the stream
+    was read by :meth:`Pipeline.read_header`.
+
+    :param header: Beginning of the stream, already read.
+    :param source: Readable stream.
+    :param destination: Writable stream, closed at the end of the copy.
+    :type header: bytes
+    """
+    try:
+        destination.write(header)
+        shutil.copyfileobj(source, destination, PIPELINE_CHUNK_SIZE)
+    except BrokenPipeError:
+        # The next process exited; its status is checked in wait()
+        pass
+    finally:
+        source.close()
+        try:
+            destination.close()
+        except BrokenPipeError:
+            pass
+
+
+def get_bounding_box(header):
+    """Get the BoundingBox of an (Encapsulated) PostScript header
+
+    :param header: Beginning of the document.
+    :type header: bytes
+    :return: Lower left x, lower left y, upper right x, upper right y in 1/72
+        inch values; None if the header doesn't contain a BoundingBox.
+    :rtype: tuple[int] | None
+    """
+    match = BOUNDING_BOX_PATTERN.search(header)
+    if not match:
+        return None
+    return tuple(map(int, match.groups()))
+
+
+class Pipeline:
+    """Processes connected by pipes, running at once
+
+    Attributes:
+        :param processes: Started processes, in the order of the pipeline.
+        :param error_files: Temporary files receiving the standard error of
+            each process.
+        :param threads: Threads copying the data between 2 processes when a
+            header was read by the pipeline.
+        :type processes: list[subprocess.Popen]
+        :type error_files: list
+        :type threads: list[threading.Thread]
+    """
+
+    def __init__(self):
+        """Constructor"""
+        self.processes = []
+        self.error_files = []
+        self.threads = []
+
+    def add(self, args, header=b""):
+        """Start a process reading the output of the previous one
+
+        :param args: Arguments of the process.
+        :key header: Data read from the output of the previous process by
+            :meth:`read_header`; it is sent to the new process before the rest
+            of the output, copied by a thread.
+        :type args: list[str]
+        :type header: bytes
+        :return: The started process.
+        :rtype: subprocess.Popen
+        """
+        previous = self.processes[-1] if self.processes else None
+        error_file = tempfile.TemporaryFile()
+        if previous and header:
+            stdin = subprocess.PIPE
+        elif previous:
+            # Direct connection: no copy by this process
+            stdin = previous.stdout
+        else:
+            stdin = subprocess.DEVNULL
+
+        try:
+            process = subprocess.Popen(
+                args, stdin=stdin, stdout=subprocess.PIPE, stderr=error_file
+            )
+        except (OSError, ValueError):
+            error_file.close()
+            self.abort()
+            raise
+
+        if previous and header:
+            thread = threading.Thread(
+                target=copy_stream,
+                args=(header, previous.stdout, process.stdin),
+                daemon=True,
+            )
+            thread.start()
+            self.threads.append(thread)
+        elif previous:
+            # The previous process must receive SIGPIPE if the new one exits
+            previous.stdout.close()
+
+        self.processes.append(process)
+        self.error_files.append(error_file)
+        return process
+
+    def read_header(self, end_marker, max_size=PIPELINE_HEADER_SIZE, timeout=None):
+        """Read the beginning of the output of the last process
+
+        The output is read until the given marker, without waiting for the
+        end of the process. The header must be given to the next process
+        (see :meth:`add`).
+
+        :param end_marker: Data ending the header.
+        :key max_size: Maximum size of the header.
+        :key timeout: Maximum duration (s) of the reading.
+        :type end_marker: bytes
+        :type max_size: int
+        :type timeout: float | None
+        :return: The header, including the marker if it was found before
+            `max_size` bytes or the end of the output.
+        :rtype: bytes
+        :raise subprocess.TimeoutExpired: If the header is not read after
+            `timeout`; the pipeline is aborted (see :meth:`abort`).
+        """
+        stdout = self.processes[-1].stdout
+        header = b""
+        with self.deadline(timeout) as expired:
+            while end_marker not in header and len(header) < max_size:
+                # read1: Returns as soon as data is available
+                data = stdout.read1(max_size - len(header))
+                if not data:
+                    break
+                header += data
+
+        if expired.is_set():
+            self.abort()
+            raise subprocess.TimeoutExpired(
+                self.processes[-1].args, timeout, output=header
+            )
+        return header
+
+    def wait(self, timeout=None):
+        """Wait for the end of all the processes
+
+        The output of the last process is read until its end.
+
+        :key timeout: Maximum duration (s) of the pipeline.
+        :type timeout: float | None
+        :return: The end of the output of the last process.
+        :rtype: bytes
+        :raise subprocess.CalledProcessError: If a process exits with a
+            non-zero exit status. The error of the process that failed first
+            is raised (the previous processes are then killed by SIGPIPE).
+        :raise subprocess.TimeoutExpired: If the pipeline is not finished
+            after `timeout`; all the processes are killed.
+        """
+        last = self.processes[-1]
+        output = b""
+        with self.deadline(timeout) as expired:
+            for data in iter(lambda: last.stdout.read(PIPELINE_CHUNK_SIZE), b""):
+                output = (output + data)[-PIPELINE_LOG_SIZE:]
+            last.stdout.close()
+            for process in self.processes:
+                process.wait()
+            for thread in self.threads:
+                thread.join()
+
+        # Errors messages
+        stderr = []
+        for error_file in self.error_files:
+            size = error_file.seek(0, 2)
+            error_file.seek(max(0, size - PIPELINE_LOG_SIZE))
+            stderr.append(error_file.read())
+            error_file.close()
+
+        if expired.is_set():
+            LOGGER.error("Pipeline stderr: %s", stderr)
+            raise subprocess.TimeoutExpired(
+                [process.args for process in self.processes], timeout, output=output
+            )
+
+        failed = [
+            (process, error)
+            for process, error in zip(self.processes, stderr)
+            if process.returncode
+        ]
+        if not failed:
+            return output
+        # Processes killed by the exit of the next one are reported last
+        failed.sort(key=lambda item: item[0].returncode == -signal.SIGPIPE)
+        process, error = failed[0]
+        LOGGER.error("Pipeline stderr: %s", error)
+        raise subprocess.CalledProcessError(
+            process.returncode, process.args, output=output, stderr=error
+        )
+
+    @contextmanager
+    def deadline(self, timeout):
+        """Kill all the processes if the block is not finished after `timeout`
+
+        :type timeout: float | None
+        :return: Event set if the processes were killed.
+        :rtype: threading.Event
+        """
+        expired = threading.Event()
+
+        def expire():
+            expired.set()
+            self.kill()
+
+        timer = None
+        if timeout is not None:
+            timer = threading.Timer(timeout, expire)
+            timer.start()
+        try:
+            yield expired
+        finally:
+            if timer:
+                timer.cancel()
+
+    def kill(self):
+        """Kill all the processes of the pipeline"""
+        for process in self.processes:
+            if process.poll() is None:
+                process.kill()
+
+    def abort(self):
+        """Kill all the processes of the pipeline and release their resources
+
+        The killed processes are waited for (no zombies); their pipes and
+        error files are closed.
+        """
+        self.kill()
+        for process in self.processes:
+            process.wait()
+        for thread in self.threads:
+            thread.join()
+        for process in self.processes:
+            process.stdout.close()
+        for error_file in self.error_files:
+            error_file.close()
@@ -31,12 +31,13 @@ Expected config:
 import configparser
 from pathlib import Path
 import subprocess
-from watchdog.observers.inotify import InotifyObserver
 from watchdog.events import RegexMatchingEventHandler
 
 # Custom imports
 from libreprinter import plugins_handler
 from libreprinter.file_handler import init_directories
+from libreprinter.job_journal import recorded_conversion
+from libreprinter.conversion_pool import get_pool
 from libreprinter.commons import logger, ESCAPY_BINARY
 
 LOGGER = logger()
@@ -124,7 +125,11 @@ class EscapyEventHandler(RegexMatchingEventHandler):
         return cmd
 
     def on_closed(self, event):
-        """File closing is detected, convert it to PDF
+        """File closing is detected, queue its conversion in the shared pool"""
+        get_pool().submit(__name__, self.convert, event)
+
+    def convert(self, event):
+        """Convert a closed file to PDF
 
         Minimal command::
 
@@ -135,14 +140,17 @@ class EscapyEventHandler(RegexMatchingEventHandler):
         """
         LOGGER.info("Event detected: %s", event)
 
-        cmd = self.build_command(Path(event.src_path))
+        src_path = Path(event.src_path)
+        pdf_path = src_path.parent.parent / "pdf" / (src_path.stem + ".pdf")
+        cmd = self.build_command(src_path)
 
         try:
-            # We are in a child thread, we can have blocking calls like run()
-            # Capture all outputs from the command in case of error with PIPE
-            subprocess.run(
-                cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE, check=True
-            )
+            with recorded_conversion(src_path, "escapy", pdf_path):
+                # We are in a child thread, we can have blocking calls like run()
+                # Capture all outputs from the command in case of error with PIPE
+                subprocess.run(
+                    cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE, check=True
+                )
         except subprocess.CalledProcessError as e:
             # process exits with a non-zero exit code
             LOGGER.error("stdout: %s; stderr: %s", e.stdout, e.stderr)
@@ -168,12 +176,7 @@ def setup_escapy_watchdog(config: configparser.ConfigParser | dict):
 
     event_handler = EscapyEventHandler(config[SECTION_NAME], ignore_directories=True)
     # Attach event handler to the configured output_path
-    observer = InotifyObserver()
-    observer.schedule(
-        event_handler, config["misc"]["output_path"] + "raw/", recursive=False
-    )
-    observer.start()
-    return observer
+    return plugins_handler.watch(event_handler, config["misc"]["output_path"] + "raw/")
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -17,7 +17,9 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """Watchdog for /hpgl directory that is able to convert new files into pdfs
 
-Conversions are made thanks to Hp2xx & Ghostscript.
+Conversions are made by the native renderer of
+:mod:`libreprinter.hpgl_renderer`, or thanks to Hp2xx & Ghostscript for the
+plots it doesn't support.
 
 As soon as a hpgl file is created, a pdf is created.
 
@@ -30,12 +32,16 @@ Expected config (emulation + endlesstext):
 import shlex
 from pathlib import Path
 import subprocess
-from watchdog.observers.inotify import InotifyObserver
+import time
 from watchdog.events import RegexMatchingEventHandler
 
 # Custom imports
 from libreprinter import plugins_handler
 from libreprinter.file_handler import init_directories
+from libreprinter.job_journal import recorded_conversion
+from libreprinter.conversion_pool import get_pool
+from libreprinter.pipeline import Pipeline, get_bounding_box
+from libreprinter.hpgl_renderer import render_hpgl, UnsupportedHpgl
 from libreprinter.commons import logger
 
 LOGGER = logger()
@@ -47,6 +53,8 @@ CONFIG = {
     }
 }
 REQUIRED_DIRS = ["hpgl"]
+# Maximum duration (s) of the conversion of a plot by Hp2xx & Ghostscript
+HP2XX_TIMEOUT = 120
 
 
 class HpglEventHandler(RegexMatchingEventHandler):
@@ -61,8 +69,12 @@ class HpglEventHandler(RegexMatchingEventHandler):
     Attributes:
         :param hp2xx_path: Path to the Hp2xx binary.
         :param hp2xx_settings: Command line settings for Hp2xx binary.
+        :param renderer: "native": plots are converted by
+            :mod:`libreprinter.hpgl_renderer` if possible; "hp2xx": plots are
+            always converted by Hp2xx & Ghostscript.
         :type hp2xx_path: str
         :type hp2xx_settings: str
+        :type renderer: str
 
     Class attribute:
         :param FILES_REGEX: Patterns to detect txt files.
@@ -71,26 +83,70 @@ class HpglEventHandler(RegexMatchingEventHandler):
 
     FILES_REGEX = [r".*\.hpgl$"]
 
-    def __init__(self, hp2xx_path, *args, hp2xx_settings="", **kwargs):
+    def __init__(self, hp2xx_path, *args, hp2xx_settings="", renderer="native", **kwargs):
         """Constructor override
         Just add Hp2xx settings attr and define watchdog regexes.
         """
         super().__init__(*args, regexes=self.FILES_REGEX, **kwargs)
         self.hp2xx_path = hp2xx_path
         self.hp2xx_settings = hp2xx_settings
+        self.renderer = renderer
 
     def on_closed(self, event):
-        """File closing is detected, convert it to PDF
+        """File closing is detected, queue its conversion in the shared pool"""
+        get_pool().submit(__name__, self.convert, event)
 
-        Minimal command::
+    def convert(self, event):
+        """Convert a closed file to PDF
 
-            hp2xx -m eps -q -t -f out.ps in.hpgl
+        The native renderer is used first (see :attr:`renderer`); plots that
+        it doesn't support are converted by Hp2xx & Ghostscript.
         """
         LOGGER.info("Event detected: %s", event)
 
-        # Directly build arg list; enquote paths to avoid errors
         src_path = Path(event.src_path)
         pdf_path = src_path.parent.parent / "pdf" / (src_path.stem + ".pdf")
+        if self.renderer == "native":
+            try:
+                with recorded_conversion(
+                    src_path, "hpgl", pdf_path, unrecorded=(UnsupportedHpgl,)
+                ):
+                    render_hpgl(src_path, pdf_path)
+                return
+            except UnsupportedHpgl as e:
+                LOGGER.info("Plot not supported by the native renderer (%s): use hp2xx", e)
+            except OSError as e:
+                LOGGER.exception(e)
+                return
+
+        try:
+            with recorded_conversion(src_path, "hp2xx", pdf_path):
+                self.convert_with_hp2xx(src_path, pdf_path)
+        except subprocess.CalledProcessError as e:
+            # A process exits with a non-zero exit code
+            LOGGER.error("stdout: %s; stderr: %s", e.stdout, e.stderr)
+        except subprocess.TimeoutExpired as e:
+            # The processes are killed
+            LOGGER.error(e)
+        except (OSError, ValueError) as e:
+            # Called if Popen args are invalid
+            LOGGER.exception(e)
+
+    def convert_with_hp2xx(self, src_path, pdf_path):
+        """Convert a file to PDF with Hp2xx & Ghostscript
+
+        Minimal command::
+
+            hp2xx -m eps -q -t -f out.ps in.hpgl
+
+        :type src_path: pathlib.Path
+        :type pdf_path: pathlib.Path
+        :raise subprocess.CalledProcessError: If a process exits with a
+            non-zero exit code.
+        :raise subprocess.TimeoutExpired: If the conversion lasts more than
+            `HP2XX_TIMEOUT`.
+        """
+        # Directly build arg list; enquote paths to avoid errors
         args = [
             self.hp2xx_path,
             "-m", "eps",  # PostScript output
@@ -99,7 +155,7 @@ class HpglEventHandler(RegexMatchingEventHandler):
             "-f-"
         ]
         args += self.hp2xx_settings.split() if self.hp2xx_settings else []
-        args.append(shlex.quote(event.src_path))
+        args.append(shlex.quote(str(src_path)))
 
         ghostscript_cmd = [
             "/usr/bin/gs",
@@ -114,39 +170,30 @@ class HpglEventHandler(RegexMatchingEventHandler):
         ]
         LOGGER.debug("hp2xx command: %s", args)
 
-        try:
-            # We are in a child thread, we can have blocking calls like run()
-            # Capture all outputs from the command in case of error with PIPE
-            ps = subprocess.Popen(args, stdout=subprocess.PIPE)
-            ps.wait()
-
-            # Extract Bounding Box in 1/72 inch values
-            stdout = ps.stdout.read()
-            header_lines = stdout[:400].split(b"\n")
-            width = height = ""
-            if len(header_lines) >= 6 and b"BoundingBox" in header_lines[5]:
-                # Extract the 2 last values
-                width, height = map(int, header_lines[5].decode().split()[-2:])
-            else:
-                LOGGER.warning("HPGL BoudingBox not found!")
-            if width:
-                # Insert the values in the GhostScript command
-                ghostscript_cmd = ghostscript_cmd[:-1] + [
-                    f"-dDEVICEWIDTHPOINTS={width}",
-                    f"-dDEVICEHEIGHTPOINTS={height}",
-                    "-",
-                ]
-
-            LOGGER.debug("ghostscript command: %s", ghostscript_cmd)
-            ps = subprocess.Popen(ghostscript_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
-            stdout_data, stderr_data = ps.communicate(input=stdout)
-
-            if ps.returncode or stderr_data:
-                # GS process exits with a non-zero exit code
-                LOGGER.error("stdout: %s; stderr: %s", stdout_data, stderr_data)
-        except ValueError as e:
-            # Called if Popen args are invalid
-            LOGGER.exception(e)
+        # We are in a child thread, we can have blocking calls
+        # hp2xx and gs run at once: the document is not kept in memory
+        deadline = time.monotonic() + HP2XX_TIMEOUT
+        pipeline = Pipeline()
+        pipeline.add(args)
+
+        # Extract Bounding Box in 1/72 inch values from the EPS header
+        header = pipeline.read_header(b"%%EndComments", timeout=HP2XX_TIMEOUT)
+        bounding_box = get_bounding_box(header)
+        if bounding_box:
+            # Extract the 2 last values
+            width, height = bounding_box[2:]
+            # Insert the values in the GhostScript command
+            ghostscript_cmd = ghostscript_cmd[:-1] + [
+                f"-dDEVICEWIDTHPOINTS={width}",
+                f"-dDEVICEHEIGHTPOINTS={height}",
+                "-",
+            ]
+        else:
+            LOGGER.warning("HPGL BoudingBox not found!")
+
+        LOGGER.debug("ghostscript command: %s", ghostscript_cmd)
+        pipeline.add(ghostscript_cmd, header=header)
+        pipeline.wait(timeout=max(deadline - time.monotonic(), 0))
 
 
 @plugins_handler.register
@@ -154,7 +201,8 @@ def setup_hpgl_watchdog(config):
     """Initialise a watchdog on `/hpgl` directory in configured `output_path`.
 
     Any hpgl file created in this directories will be converted in `/pdf` by
-    the Hp2xx & Ghostscript binaries installed on the system.
+    the native renderer (setting `hpgl_renderer`) or by the Hp2xx & Ghostscript
+    binaries installed on the system.
     """
     LOGGER.info("Launch hpgl watchdog...")
 
@@ -167,14 +215,13 @@ def setup_hpgl_watchdog(config):
     init_directories(config["misc"]["output_path"], REQUIRED_DIRS)
 
     # hp2xx_settings = config["misc"]["hp2xx_settings"]
-    event_handler = HpglEventHandler(hp2xx_path, ignore_directories=True)
-    # Attach event handler to the configured output_path
-    observer = InotifyObserver()
-    observer.schedule(
-        event_handler, config["misc"]["output_path"] + "hpgl/", recursive=False
+    event_handler = HpglEventHandler(
+        hp2xx_path,
+        renderer=config["misc"].get("hpgl_renderer", "native"),
+        ignore_directories=True,
     )
-    observer.start()
-    return observer
+    # Attach event handler to the configured output_path
+    return plugins_handler.watch(event_handler, config["misc"]["output_path"] + "hpgl/")
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -34,11 +34,12 @@ TODO: only "no" for endless config because strip wrongly builds empty pdf files
 # Standard imports
 import shlex
 import subprocess
-from watchdog.observers.inotify import InotifyObserver
 from watchdog.events import RegexMatchingEventHandler
 
 # Custom imports
 from libreprinter import plugins_handler
+from libreprinter.job_journal import recorded_conversion
+from libreprinter.conversion_pool import get_pool
 from libreprinter.commons import logger
 
 LOGGER = logger()
@@ -79,7 +80,11 @@ class PdfEventHandler(RegexMatchingEventHandler):
         self.printer_name = printer_name
 
     def on_closed(self, event):
-        """PDF creation is detected, send it to the configured printer"""
+        """File closing is detected, queue its conversion in the shared pool"""
+        get_pool().submit(__name__, self.convert, event)
+
+    def convert(self, event):
+        """Send a closed PDF file to the configured printer"""
         LOGGER.info("Event detected: %s", event)
 
         # Directly build arg list; enquote src_path to avoid lpr error:
@@ -87,11 +92,13 @@ class PdfEventHandler(RegexMatchingEventHandler):
         args = ["/usr/bin/lpr", "-P", self.printer_name, shlex.quote(event.src_path)]
         LOGGER.debug("lpr command: %s", args)
         try:
-            # We are in a child thread, we can have blocking calls like run()
-            # Capture all outputs from lpr in case of error with PIPE
-            subprocess.run(
-                args, stderr=subprocess.PIPE, stdout=subprocess.PIPE, check=True
-            )
+            # Printing doesn't produce a file
+            with recorded_conversion(event.src_path, "lpr"):
+                # We are in a child thread, we can have blocking calls like run()
+                # Capture all outputs from lpr in case of error with PIPE
+                subprocess.run(
+                    args, stderr=subprocess.PIPE, stdout=subprocess.PIPE, check=True
+                )
         except subprocess.CalledProcessError as e:
             # process exits with a non-zero exit code
             LOGGER.error("stdout: %s; stderr: %s", e.stdout, e.stderr)
@@ -114,11 +121,10 @@ def setup_pdf_watchdog(config):
     event_handler = PdfEventHandler(
         printer_name=config["misc"]["output_printer"], ignore_directories=True
     )
+    # Keep the order of the jobs
+    get_pool().set_limit(__name__, 1)
     # Attach event handler to the configured output_path
-    observer = InotifyObserver()
-    observer.schedule(event_handler, config["misc"]["output_path"], recursive=True)
-    observer.start()
-    return observer
+    return plugins_handler.watch(event_handler, config["misc"]["output_path"] + "pdf/")
 
 
 if __name__ == "__main__":  # pragma: no cover
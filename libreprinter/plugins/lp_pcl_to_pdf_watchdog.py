@@ -25,11 +25,12 @@ the GhostPCL binary.
 import shlex
 from pathlib import Path
 import subprocess
-from watchdog.observers.inotify import InotifyObserver
 from watchdog.events import RegexMatchingEventHandler
 
 # Custom imports
 from libreprinter import plugins_handler
+from libreprinter.job_journal import recorded_conversion
+from libreprinter.conversion_pool import get_pool
 from libreprinter.commons import logger
 
 LOGGER = logger()
@@ -70,7 +71,11 @@ class PclEventHandler(RegexMatchingEventHandler):
         self.converter_path = converter_path
 
     def on_closed(self, event):
-        """PCL file creation is detected, convert it to PDF"""
+        """File closing is detected, queue its conversion in the shared pool"""
+        get_pool().submit(__name__, self.convert, event)
+
+    def convert(self, event):
+        """Convert a closed PCL file to PDF"""
         LOGGER.info("Event detected: %s", event)
 
         # Directly build arg list; enquote paths to avoid errors
@@ -89,11 +94,12 @@ class PclEventHandler(RegexMatchingEventHandler):
         ]
         LOGGER.debug("GhostPCL command: %s", args)
         try:
-            # We are in a child thread, we can have blocking calls like run()
-            # Capture all outputs from the command in case of error with PIPE
-            subprocess.run(
-                args, stderr=subprocess.PIPE, stdout=subprocess.PIPE, check=True
-            )
+            with recorded_conversion(src_path, "gpcl6", pdf_path):
+                # We are in a child thread, we can have blocking calls like run()
+                # Capture all outputs from the command in case of error with PIPE
+                subprocess.run(
+                    args, stderr=subprocess.PIPE, stdout=subprocess.PIPE, check=True
+                )
         except subprocess.CalledProcessError as e:
             # process exits with a non-zero exit code
             LOGGER.error("stdout: %s; stderr: %s", e.stdout, e.stderr)
@@ -121,10 +127,7 @@ def setup_pcl_watchdog(config):
 
     event_handler = PclEventHandler(converter_path, ignore_directories=True)
     # Attach event handler to the configured output_path
-    observer = InotifyObserver()
-    observer.schedule(event_handler, config["misc"]["output_path"] + "pcl/", recursive=False)
-    observer.start()
-    return observer
+    return plugins_handler.watch(event_handler, config["misc"]["output_path"] + "pcl/")
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -27,15 +27,23 @@ Expected config (emulation + endlesstext):
 """
 
 # Standard imports
+import atexit
 import shlex
+import threading
 from pathlib import Path
 import subprocess
-from watchdog.observers.inotify import InotifyObserver
 from watchdog.events import RegexMatchingEventHandler
 
 # Custom imports
 from libreprinter import plugins_handler
 from libreprinter.file_handler import init_directories
+from libreprinter.job_journal import recorded_conversion
+from libreprinter.conversion_pool import get_pool
+from libreprinter.ghostscript_server import (
+    GhostscriptServer,
+    GhostscriptError,
+    GS_JOB_TIMEOUT,
+)
 from libreprinter.commons import logger
 
 LOGGER = logger()
@@ -60,7 +68,10 @@ class PostscriptEventHandler(RegexMatchingEventHandler):
 
     Attribute:
         :param gs_settings: Command line settings for Ghostscript binary.
+        :param server: Long-lived Ghostscript processes; a process is started
+            for each job if None.
         :type gs_settings: list[str] or None
+        :type server: libreprinter.ghostscript_server.GhostscriptServer | None
 
     Class attribute:
         :param FILES_REGEX: Patterns to detect PostScript files.
@@ -69,15 +80,20 @@ class PostscriptEventHandler(RegexMatchingEventHandler):
 
     FILES_REGEX = [r".*\.ps$"]
 
-    def __init__(self, *args, gs_settings=None, **kwargs):
+    def __init__(self, *args, gs_settings=None, server=None, **kwargs):
         """Constructor override
         Just add Ghostscript settings attr and define watchdog regexes.
         """
         super().__init__(*args, regexes=self.FILES_REGEX, **kwargs)
         self.gs_settings = gs_settings or []
+        self.server = server
 
     def on_closed(self, event):
-        """File closing is detected, convert it to PDF
+        """File closing is detected, queue its conversion in the shared pool"""
+        get_pool().submit(__name__, self.convert, event)
+
+    def convert(self, event):
+        """Convert a closed file to PDF
 
         Minimal command::
 
@@ -102,16 +118,49 @@ class PostscriptEventHandler(RegexMatchingEventHandler):
         ghostscript_cmd += [shlex.quote(event.src_path), "-c", "quit"]
         LOGGER.debug("ghostscript command: %s", ghostscript_cmd)
         try:
-            # We are in a child thread, we can have blocking calls like run()
-            # Capture all outputs from the command in case of error with PIPE
-            subprocess.run(
-                ghostscript_cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE, check=True
-            )
+            with recorded_conversion(src_path, "ghostscript", pdf_path):
+                if not self.convert_with_server(src_path, pdf_path):
+                    # We are in a child thread, we can have blocking calls like run()
+                    # Capture all outputs from the command in case of error with PIPE
+                    subprocess.run(
+                        ghostscript_cmd,
+                        stderr=subprocess.PIPE,
+                        stdout=subprocess.PIPE,
+                        check=True,
+                    )
+        except (GhostscriptError, TimeoutError) as e:
+            LOGGER.error(e)
         except subprocess.CalledProcessError as e:
             # process exits with a non-zero exit code
             LOGGER.error("stdout: %s; stderr: %s", e.stdout, e.stderr)
             LOGGER.exception(e)
 
+    def convert_with_server(self, src_path, pdf_path):
+        """Convert a file with a long-lived Ghostscript process
+
+        :type src_path: pathlib.Path
+        :type pdf_path: pathlib.Path
+        :return: False if the file must be converted by a new process
+            (no server, or the process of the server stopped).
+        :rtype: bool
+        :raises GhostscriptError: PostScript error in the job.
+        :raises TimeoutError: The job is not converted in time; a new
+            process would take as long.
+        """
+        if not self.server:
+            return False
+        try:
+            self.server.convert(str(src_path), str(pdf_path))
+        except TimeoutError:
+            # The worker is killed; it will be restarted by the next job
+            raise
+        except OSError as e:
+            # ChildProcessError or missing binary:
+            # the worker will be restarted by the next job
+            LOGGER.error("Ghostscript worker error: %s", e)
+            return False
+        return True
+
 
 @plugins_handler.register
 def setup_postscript_watchdog(config):
@@ -124,15 +173,27 @@ def setup_postscript_watchdog(config):
 
     init_directories(config["misc"]["output_path"], REQUIRED_DIRS)
 
+    # Long-lived Ghostscript processes, 1 per conversion made at once
+    server = None
+    output_path = config["misc"]["output_path"]
+    if config["misc"].get("ghostscript_server") == "yes":
+        # 0: no limit
+        timeout = int(config["misc"].get("ghostscript_timeout", GS_JOB_TIMEOUT))
+        server = GhostscriptServer(
+            int(config["misc"].get("plugin_workers", 1)),
+            read_dirs=[output_path + "ps/"],
+            write_dirs=[output_path + "pdf/"],
+            timeout=timeout or None,
+        )
+        threading.Thread(target=server.warm_up, daemon=True).start()
+        atexit.register(server.stop)
+
     # gs_settings = config["misc"]["gs_settings"]
-    event_handler = PostscriptEventHandler(gs_settings=None, ignore_directories=True)
-    # Attach event handler to the configured output_path
-    observer = InotifyObserver()
-    observer.schedule(
-        event_handler, config["misc"]["output_path"] + "ps/", recursive=False
+    event_handler = PostscriptEventHandler(
+        gs_settings=None, server=server, ignore_directories=True
     )
-    observer.start()
-    return observer
+    # Attach event handler to the configured output_path
+    return plugins_handler.watch(event_handler, config["misc"]["output_path"] + "ps/")
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -29,12 +29,13 @@ configured on the QT-2100 device.
 from importlib.util import find_spec
 from pathlib import Path
 from datetime import datetime
-from watchdog.observers.inotify import InotifyObserver
 from watchdog.events import RegexMatchingEventHandler, FileSystemEvent
 
 # Custom imports
 from libreprinter import plugins_handler
 from libreprinter.file_handler import init_directories
+from libreprinter.job_journal import recorded_conversion
+from libreprinter.conversion_pool import get_pool
 from libreprinter.commons import logger
 
 LOGGER = logger()
@@ -124,11 +125,16 @@ class SeikoEventHandler(RegexMatchingEventHandler):
         timestamp = datetime.now().timestamp()
         if timestamp - self.last_timestamp > 4:
             self.last_timestamp = timestamp
-            self.build_data(event)
+            get_pool().submit(__name__, self.build_data, event)
 
     def on_closed(self, event):
-        """File creation is detected, generate full files"""
-        self.build_data(event)
+        """File creation is detected, queue the generation of full files"""
+        get_pool().submit(__name__, self.convert, event)
+
+    def convert(self, event):
+        """Generate full files"""
+        with recorded_conversion(event.src_path, "seiko-qt2100"):
+            self.build_data(event)
 
     def build_data(self, event):
         """Generate csv and/or pdf files according to the config file specs"""
@@ -167,13 +173,10 @@ def setup_seiko_watchdog(config):
     event_handler = SeikoEventHandler(
         seiko_settings=config[SECTION_NAME], ignore_directories=True
     )
+    # Partial and full files are written in the same files
+    get_pool().set_limit(__name__, 1)
     # Attach event handler to the configured output_path
-    observer = InotifyObserver()
-    observer.schedule(
-        event_handler, config["misc"]["output_path"] + "raw/", recursive=False
-    )
-    observer.start()
-    return observer
+    return plugins_handler.watch(event_handler, config["misc"]["output_path"] + "raw/")
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -40,12 +40,14 @@ import configparser
 import shlex
 from pathlib import Path
 import subprocess
-from watchdog.observers.inotify import InotifyObserver
 from watchdog.events import RegexMatchingEventHandler
 
 # Custom imports
 from libreprinter import plugins_handler
 from libreprinter.file_handler import init_directories
+from libreprinter.job_journal import recorded_conversion
+from libreprinter.conversion_pool import get_pool
+from libreprinter.pipeline import Pipeline
 from libreprinter.commons import logger, ENSCRIPT_BINARY
 
 LOGGER = logger()
@@ -107,7 +109,11 @@ class TxtEventHandler(RegexMatchingEventHandler):
         self.settings = settings
 
     def on_closed(self, event):
-        """File closing is detected, convert it to PDF
+        """File closing is detected, queue its conversion in the shared pool"""
+        get_pool().submit(__name__, self.convert, event)
+
+    def convert(self, event):
+        """Convert a closed file to PDF
 
         Minimal command::
 
@@ -140,11 +146,13 @@ class TxtEventHandler(RegexMatchingEventHandler):
         LOGGER.debug("enscript command: %s", enscript_cmd)
         LOGGER.debug("ghostscript command: %s", ghostscript_cmd)
         try:
-            # We are in a child thread, we can have blocking calls like run()
-            # Capture all outputs from the command in case of error with PIPE
-            ps = subprocess.Popen(enscript_cmd, stdout=subprocess.PIPE)
-            ps.wait()
-            subprocess.check_output(ghostscript_cmd, stdin=ps.stdout)
+            with recorded_conversion(src_path, "enscript", pdf_path):
+                # We are in a child thread, we can have blocking calls
+                # enscript and gs run at once: the document is not kept in memory
+                pipeline = Pipeline()
+                pipeline.add(enscript_cmd)
+                pipeline.add(ghostscript_cmd)
+                pipeline.wait()
         except subprocess.CalledProcessError as e:
             # process exits with a non-zero exit code
             LOGGER.error("stdout: %s; stderr: %s", e.stdout, e.stderr)
@@ -170,12 +178,7 @@ def setup_text_watchdog(config):
 
     event_handler = TxtEventHandler(config[SECTION_NAME], ignore_directories=True)
     # Attach event handler to the configured output_path
-    observer = InotifyObserver()
-    observer.schedule(
-        event_handler, config["misc"]["output_path"] + "txt_jobs/", recursive=False
-    )
-    observer.start()
-    return observer
+    return plugins_handler.watch(event_handler, config["misc"]["output_path"] + "txt_jobs/")
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -15,13 +15,20 @@
 #
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
-"""Handle the dynamic loading of plugins"""
+"""Handle the dynamic loading of plugins
+
+Plugins watching directories share a single observer (see :meth:`watch`).
+"""
 
 # Standard imports
+import os
+import time
 import functools
 import importlib
+import threading
 from collections import namedtuple
 from watchdog.observers.inotify import InotifyObserver
+from watchdog.events import FileSystemEventHandler
 
 # Starting from Python 3.7, we need 3.9 for files() method
 from importlib import resources
@@ -45,6 +52,98 @@ _CONFIGURERS = {}
 # can unload plugins (i.e. delete items in _PLUGINS).
 REGISTERED_FUNCS = set()
 
+# Observer shared by the plugins and its event router
+_OBSERVER = None
+_ROUTER = None
+_OBSERVER_LOCK = threading.Lock()
+
+
+class EventRouter(FileSystemEventHandler):
+    """Dispatch the events of the shared observer to the handlers of the plugins
+
+    Events are routed according to their directory; handlers then filter
+    them with their own regexes (see `RegexMatchingEventHandler`).
+
+    The latency of the closed events (delay between the last modification
+    of the file and the dispatch of the event) is logged and measured.
+
+    Attributes:
+        :param routes: Handlers by watched directory.
+        :param closed_events: Number of dispatched closed events.
+        :param total_latency: Cumulated latency of the closed events (s).
+        :param max_latency: Maximum latency of the closed events (s).
+        :type routes: dict[str, list[watchdog.events.FileSystemEventHandler]]
+        :type closed_events: int
+        :type total_latency: float
+        :type max_latency: float
+    """
+
+    def __init__(self):
+        """Constructor"""
+        super().__init__()
+        self.routes = dict()
+        self.closed_events = 0
+        self.total_latency = 0
+        self.max_latency = 0
+
+    def add_route(self, directory, handler):
+        """Send the events of a directory to a handler
+
+        :type directory: str
+        :type handler: watchdog.events.FileSystemEventHandler
+        """
+        self.routes.setdefault(os.path.abspath(directory), []).append(handler)
+
+    def dispatch(self, event):
+        """Dispatch an event to the handlers of its directory
+
+        :type event: watchdog.events.FileSystemEvent
+        """
+        handlers = self.routes.get(os.path.dirname(os.path.abspath(event.src_path)))
+        if not handlers:
+            return
+
+        if event.event_type == "closed":
+            try:
+                latency = time.time() - os.stat(event.src_path).st_mtime
+            except OSError:
+                latency = 0
+            self.closed_events += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            LOGGER.debug("Event latency: %.3f s (%s)", latency, event.src_path)
+
+        for handler in handlers:
+            handler.dispatch(event)
+
+
+def watch(handler, directory):
+    """Send the events of a directory to the handler of a plugin
+
+    All the plugins share an observer: a directory is watched once, and
+    events are dispatched by a single thread (see :class:`EventRouter`).
+    The observer is started by the first call, or by the first call after
+    it was stopped.
+
+    :param handler: Event handler of the plugin.
+    :param directory: Watched directory (not recursive).
+    :type handler: watchdog.events.FileSystemEventHandler
+    :type directory: str
+    :return: The shared observer.
+    :rtype: InotifyObserver
+    """
+    global _OBSERVER, _ROUTER
+    with _OBSERVER_LOCK:
+        if _OBSERVER is None or not _OBSERVER.should_keep_running():
+            _OBSERVER = InotifyObserver()
+            _ROUTER = EventRouter()
+            _OBSERVER.start()
+
+        if os.path.abspath(directory) not in _ROUTER.routes:
+            _OBSERVER.schedule(_ROUTER, directory, recursive=False)
+        _ROUTER.add_route(directory, handler)
+        return _OBSERVER
+
 
 def register(func):
     """Decorator for registering a new plugin"""
@@ -18,14 +18,26 @@ def default_config():
         "pcl_converter_path": PCL_CONVERTER,
         "hp2xx_path": HP2XX_BINARY,
         "endlesstext": "no",
+        "stream_sync_interval": "0.5",
         "line_ending": "\n",
         "usb_passthrough": "no",
+        "usb_passthrough_overflow": "spill",
         "output_printer": "no",
         "serial_port": "/dev/ttyACM0",
         "output_path": DEFAULT_OUTPUT_PATH + "/",
         "retain_data": "yes",
         "auto_end_page": "no",
         "end_page_timeout": "2",
+        "end_page_timeout_min": "0.5",
+        "end_page_timeout_max": "10",
+        "job_buffer_size": "1024",
+        "job_id": "number",
+        "conversion_workers": "auto",
+        "plugin_workers": "2",
+        "ghostscript_server": "yes",
+        "ghostscript_timeout": "120",
+        "hpgl_renderer": "native",
+        "job_journal": "yes",
         "emulation": "epson",
     }
 
@@ -71,6 +83,14 @@ TEST_DATA = [
         output_path=
         auto_end_page=
         end_page_timeout=
+        job_buffer_size=
+        job_id=
+        conversion_workers=
+        plugin_workers=
+        ghostscript_server=
+        ghostscript_timeout=
+        hpgl_renderer=
+        job_journal=
         retain_data=
         
         [parallel_printer]
@@ -203,6 +223,61 @@ def test_default_settings(sample_config, expected):
                 "end_page_timeout": "2",  # <= 0 is not allowed
             },
         ),
+        (
+            # sub_second_timeout
+            """
+            [misc]
+            end_page_timeout=0.3
+            [parallel_printer]
+            [serial_printer]
+            """,
+            {
+                "end_page_timeout": "0.3",  # fractional values are allowed
+            },
+        ),
+        (
+            # bad_timeout
+            """
+            [misc]
+            end_page_timeout=fast
+            [parallel_printer]
+            [serial_printer]
+            """,
+            {
+                "end_page_timeout": "2",  # not numeric
+            },
+        ),
+        (
+            # auto_timeout
+            """
+            [misc]
+            end_page_timeout=auto
+            end_page_timeout_min=0.2
+            [parallel_printer]
+            [serial_printer]
+            """,
+            {
+                "end_page_timeout": "auto",
+                "end_page_timeout_min": "0.2",
+                "end_page_timeout_max": "10",
+            },
+        ),
+        (
+            # bad_auto_timeout_bounds
+            """
+            [misc]
+            end_page_timeout=auto
+            end_page_timeout_min=20
+            end_page_timeout_max=0.01
+            [parallel_printer]
+            [serial_printer]
+            """,
+            {
+                # max is too small, then lower than min: both are reset
+                "end_page_timeout_min": "0.5",
+                "end_page_timeout_max": "10",
+            },
+        ),
         (
             # output_printer1
             """
@@ -248,8 +323,35 @@ def test_default_settings(sample_config, expected):
                 "endlesstext": "strip-escp2-jobs",
             },
         ),
+        (
+            # time_job_id
+            """
+            [misc]
+            job_id=time
+            emulation=hp
+            [parallel_printer]
+            [serial_printer]
+            """,
+            {
+                "job_id": "time",
+            },
+        ),
+        (
+            # time_job_id_legacy_converter
+            """
+            [misc]
+            job_id=time
+            endlesstext=strip-escp2-jobs
+            [parallel_printer]
+            [serial_printer]
+            """,
+            {
+                # Numbers are expected by the legacy escp2 converter
+                "job_id": "number",
+            },
+        ),
     ],
-    ids=["sample1", "sample2", "output_printer1", "output_printer2", "output_printer3"],
+    ids=["sample1", "sample2", "sub_second_timeout", "bad_timeout", "auto_timeout", "bad_auto_timeout_bounds", "output_printer1", "output_printer2", "output_printer3", "time_job_id", "time_job_id_legacy_converter"],
     indirect=["sample_config"],  # Send sample_config val to the fixture
 )
 def test_specific_settings(sample_config, expected_settings):
@@ -0,0 +1,105 @@
+"""Test conversion pool module"""
+# Standard imports
+import threading
+import time
+
+# Custom imports
+from libreprinter.conversion_pool import ConversionPool, ConversionQueueFull
+
+
+def test_conversion_pool_limits():
+    """Test the limits of the pool and of the plugins"""
+    pool = ConversionPool(max_workers=3, plugin_workers=2)
+    pool.set_limit("printer", 1)
+    lock = threading.Lock()
+    running = {"pcl": 0, "ps": 0, "printer": 0, "all": 0}
+    maximums = dict.fromkeys(running, 0)
+    printed = []
+
+    def convert(plugin, job):
+        with lock:
+            running[plugin] += 1
+            running["all"] += 1
+            for key in (plugin, "all"):
+                maximums[key] = max(maximums[key], running[key])
+        time.sleep(0.02)
+        if plugin == "printer":
+            printed.append(job)
+        with lock:
+            running[plugin] -= 1
+            running["all"] -= 1
+
+    for job in range(6):
+        for plugin in ("pcl", "ps", "printer"):
+            pool.submit(plugin, convert, plugin, job)
+    pool.drain()
+
+    assert maximums["pcl"] <= 2 and maximums["ps"] <= 2
+    assert maximums["printer"] == 1
+    # Several jobs are converted at once
+    assert 1 < maximums["all"] <= 3
+    # Order of the jobs of a plugin limited to 1 conversion
+    assert printed == list(range(6))
+    assert pool.conversions == 18
+    assert pool.run_time > 0
+
+
+def test_conversion_pool_queue(caplog):
+    """Test the bounded queue and the errors of the conversions"""
+    pool = ConversionPool(max_workers=1, queue_size=1)
+    started = threading.Event()
+    release = threading.Event()
+    done = []
+
+    def fail():
+        raise OSError("converter not found")
+
+    def block():
+        started.set()
+        release.wait()
+
+    failed = pool.submit("pcl", fail)
+    failed.exception(timeout=1)
+    pool.submit("pcl", block)
+    assert started.wait(timeout=1)
+    # The worker is blocked: submissions don't wait
+    future = pool.submit("pcl", done.append, 1)
+    assert not future.done()
+    # The queue is full: the next conversions are rejected, a warning is logged
+    rejected = [pool.submit("pcl", done.append, job) for job in (2, 3)]
+    assert all(
+        isinstance(future.exception(), ConversionQueueFull) for future in rejected
+    )
+    assert caplog.text.count("Conversion queue full") == 1
+    # Background conversions are bounded by their submitter
+    with pool.background() as futures:
+        pool.submit("pcl", done.append, 4)
+    assert not futures[0].done()
+
+    release.set()
+    futures[0].result(timeout=1)
+    # The worker survives the error
+    assert done == [1, 4]
+    assert isinstance(failed.exception(), OSError)
+    assert pool.rejected == 2
+    # The queue accepts conversions again
+    pool.submit("pcl", done.append, 5).result(timeout=1)
+
+
+def test_conversion_pool_background():
+    """Test that background conversions are started after the others"""
+    pool = ConversionPool(max_workers=1)
+    release = threading.Event()
+    done = []
+
+    pool.submit("pcl", release.wait)
+    with pool.background() as futures:
+        for job in range(3):
+            pool.submit("pcl", done.append, f"recovered {job}")
+    pool.submit("pcl", done.append, "live")
+    assert len(futures) == 3
+
+    release.set()
+    pool.drain()
+    assert done == ["live", "recovered 0", "recovered 1", "recovered 2"]
+    assert all(future.done() for future in futures)
@@ -1,9 +1,12 @@
 """Test file handler module"""
 # Standard imports
 import os
+import re
+import random
 import shutil
 import pathlib
 import tempfile
+from datetime import datetime
 import pytest
 from unittest.mock import patch
 
@@ -12,8 +15,12 @@ from libreprinter.file_handler import (
     init_directories,
     cleanup_directories,
     get_job_number,
+    JobCounter,
+    TimeJobCounter,
+    link_file,
     convert_data_line_ending,
     convert_file_line_ending,
+    LineEndingConverter,
 )
 from libreprinter.commons import OUTPUT_DIRS
 
@@ -129,6 +136,108 @@ def test_get_job_number(temp_dir):
     assert found_val == 4
 
 
+def test_job_counter(temp_dir):
+    """Test the allocation of persistent job numbers"""
+    init_directories(temp_dir)
+    with open(temp_dir + "raw/3.raw", "w") as f_d:
+        f_d.write("hello world")
+
+    # No state file: the directories are scanned
+    job_counter = JobCounter(temp_dir)
+    assert job_counter.allocate() == 4
+    assert job_counter.allocate() == 5
+
+    # State restored at startup
+    assert JobCounter(temp_dir).next_number == 6
+
+    # Jobs received after the last saved state are skipped
+    with open(temp_dir + "pcl/6.pcl", "w") as f_d:
+        f_d.write("hello world")
+    with open(temp_dir + "raw/7.raw", "w") as f_d:
+        f_d.write("hello world")
+    assert JobCounter(temp_dir).allocate() == 8
+
+    # Corrupted state file
+    with open(temp_dir + ".job_counter", "w") as f_d:
+        f_d.write("")
+    assert JobCounter(temp_dir).next_number == 8
+
+    # Reset with the directories
+    cleanup_directories(temp_dir)
+    assert JobCounter(temp_dir).next_number == 1
+
+
+def test_time_job_counter(temp_dir):
+    """Test time-ordered job identifiers"""
+    init_directories(temp_dir)
+    job_counter = TimeJobCounter(temp_dir, "/dev/ttyACM0", hostname="rasp-pi")
+    job_ids = [job_counter.allocate() for _ in range(3)]
+
+    assert re.match(r"\d{8}-\d{6}-000001-rasppi_devttyACM0$", job_ids[0])
+    assert sorted(job_ids) == job_ids
+    assert len(set(job_ids)) == 3
+
+    # Clock set back: the order is kept
+    job_counter.last_time = datetime(2100, 1, 1)
+    job_id = job_counter.allocate()
+    assert job_id.startswith("21000101-000000-000004")
+    assert job_id > job_ids[-1]
+
+    # Restart: the state is restored from the disk
+    job_counter = TimeJobCounter(temp_dir, "/dev/ttyACM0", hostname="rasp-pi")
+    assert job_counter.allocate().startswith("21000101-000000-000005")
+
+    # Other host sharing the directory
+    other_id = TimeJobCounter(temp_dir, "/dev/ttyACM0", hostname="other").allocate()
+    assert other_id.endswith("-000001-other_devttyACM0")
+
+    # Lost state file: identifiers of existing files are skipped
+    os.remove(job_counter.filepath)
+    job_counter = TimeJobCounter(temp_dir, "/dev/ttyACM0", hostname="rasp-pi")
+    job_counter.last_time = datetime(2100, 1, 1)
+    with open(temp_dir + f"raw/{job_id}.raw", "w") as f_d:
+        f_d.write("hello world")
+    assert job_counter.allocate().startswith("21000101-000000-000001")
+    assert job_counter.allocate().startswith("21000101-000000-000002")
+    job_counter.sequence = 3
+    assert job_counter.allocate().startswith("21000101-000000-000005")
+
+    # Files are not used by the numeric job counter
+    assert get_job_number(temp_dir) == 1
+
+    # States are deleted with the directories
+    cleanup_directories(temp_dir)
+    assert not os.path.exists(job_counter.filepath)
+
+
+def test_link_file(temp_dir):
+    """Test the creation of a file without copy of the data"""
+    init_directories(temp_dir)
+    pcl_file = temp_dir + "pcl/1.pcl"
+    raw_file = temp_dir + "raw/1.raw"
+    with open(pcl_file, "wb") as f_d:
+        f_d.write(b"hello world")
+
+    link_file(pcl_file, raw_file)
+    assert os.path.samefile(pcl_file, raw_file)
+
+    # An existing file is replaced
+    os.unlink(pcl_file)
+    with open(pcl_file, "wb") as f_d:
+        f_d.write(b"new job")
+    link_file(pcl_file, raw_file)
+    with open(raw_file, "rb") as f_d:
+        assert f_d.read() == b"new job"
+
+    # File systems without hard links
+    with patch("os.link", side_effect=PermissionError):
+        os.unlink(raw_file)
+        link_file(pcl_file, raw_file)
+    assert not os.path.samefile(pcl_file, raw_file)
+    with open(raw_file, "rb") as f_d:
+        assert f_d.read() == b"new job"
+
+
 def test_convert_data_line_ending():
     """Test conversion of line endings"""
     unix_text = b"hello world\n"
@@ -151,6 +260,35 @@ def test_convert_data_line_ending():
         _ = convert_data_line_ending(windows_text.decode(), b"\n")
 
 
+@pytest.mark.parametrize("line_ending", [b"\n", b"\r\n"], ids=["unix", "windows"])
+def test_line_ending_converter(line_ending):
+    """Test the conversion of line endings in a stream of chunks
+
+    The result must be the conversion of the whole data, whatever the
+    boundaries of the chunks (\r\n pairs split, lone \r at the end of a chunk).
+    """
+    rng = random.Random(0)
+    data = bytes(rng.choice(b"ab\r\n") for _ in range(2000))
+    expected = convert_data_line_ending(data, line_ending)
+
+    for _ in range(20):
+        converter = LineEndingConverter(line_ending)
+        found = bytearray()
+        pos = 0
+        while pos < len(data):
+            size = rng.randint(1, 10)
+            # Chunks are memoryviews on the received data
+            found += converter.convert(memoryview(bytearray(data[pos:pos + size])))
+            pos += size
+        found += converter.flush()
+        assert found == expected
+
+    # Chunks without line ending to be replaced are not copied
+    converter = LineEndingConverter(line_ending)
+    chunk = memoryview(b"hello")
+    assert converter.convert(chunk) is chunk
+
+
 def test_convert_file_line_ending(temp_dir):
     """Test conversion of line endings in files"""
 
@@ -163,3 +301,11 @@ def test_convert_file_line_ending(temp_dir):
     expected = b"hello\nworld"
     # Use binary mode to avoid line ending change by encoding setting...
     assert output_file.read_bytes() == expected
+
+    # Small blocks: \r\n pairs split between blocks, \r at the end of the file
+    data = b"hello\r\nworld\r\r\n\n\r" * 10
+    input_file.write_bytes(data)
+    for line_ending in ("\n", "\r\n"):
+        convert_file_line_ending(input_file, output_file, line_ending, block_size=3)
+        expected = convert_data_line_ending(data, line_ending.encode())
+        assert output_file.read_bytes() == expected
@@ -0,0 +1,97 @@
+"""Test Ghostscript server module"""
+# Standard imports
+import os
+import sys
+from unittest.mock import patch
+from watchdog.events import FileClosedEvent
+import pytest
+
+# Custom imports
+from libreprinter.file_handler import init_directories
+from libreprinter.job_journal import JobJournal
+from libreprinter.plugins.lp_ps_converter import PostscriptEventHandler
+from libreprinter.ghostscript_server import (
+    GhostscriptServer,
+    GhostscriptError,
+    ps_string,
+)
+
+# Import create dir fixture
+from .test_file_handler import temp_dir
+
+
+def test_ps_string():
+    """Test the escape of the paths in PostScript strings"""
+    assert ps_string("/tmp/a b/1.ps") == b"(/tmp/a b/1.ps)"
+    assert ps_string("/tmp/a(1)\\.ps") == b"(/tmp/a\\(1\\)\\\\.ps)"
+
+
+def test_ghostscript_server(temp_dir):
+    """Test the conversions of a long-lived Ghostscript process"""
+    init_directories(temp_dir, ["ps", "pdf"])
+    server = GhostscriptServer(1, [temp_dir + "ps/"], [temp_dir + "pdf/"])
+    for number in (1, 2):
+        with open(f"{temp_dir}ps/{number}.ps", "w") as f_d:
+            f_d.write("%!PS\n72 72 moveto 144 144 lineto stroke showpage\n")
+
+    server.convert(temp_dir + "ps/1.ps", temp_dir + "pdf/1.pdf")
+    worker = server.workers.queue[0]
+    pid = worker.process.pid
+
+    # PostScript error
+    with open(temp_dir + "ps/3.ps", "w") as f_d:
+        f_d.write("%!PS\nunknown_operator\n")
+    with pytest.raises(GhostscriptError, match="undefined"):
+        server.convert(temp_dir + "ps/3.ps", temp_dir + "pdf/3.pdf")
+
+    # The process is reused
+    server.convert(temp_dir + "ps/2.ps", temp_dir + "pdf/2.pdf")
+    assert worker.process.pid == pid
+    for number in (1, 2):
+        with open(f"{temp_dir}pdf/{number}.pdf", "rb") as f_d:
+            assert f_d.read().rstrip().endswith(b"%%EOF")
+
+    # A stopped process is restarted
+    worker.process.kill()
+    worker.process.wait()
+    server.convert(temp_dir + "ps/1.ps", temp_dir + "pdf/1.pdf")
+    assert worker.process.pid != pid
+    server.stop()
+
+
+# Answers to the markers of the commands, except for the jobs ("run")
+FAKE_GHOSTSCRIPT = """#!{python}
+import re, sys, time
+for line in sys.stdin:
+    if " run " in line:
+        time.sleep(60)
+    marker = re.match(r"\\(LPDONE (\\d+)\\)", line)
+    if marker:
+        print("LPDONE", marker.group(1), flush=True)
+"""
+
+
+def test_ghostscript_timeout(temp_dir):
+    """Test that a job exceeding the timeout is not converted again"""
+    init_directories(temp_dir, ["ps", "pdf"])
+    gs_path = temp_dir + "gs"
+    with open(gs_path, "w") as f_d:
+        f_d.write(FAKE_GHOSTSCRIPT.format(python=sys.executable))
+    os.chmod(gs_path, 0o755)
+    with open(temp_dir + "ps/1.ps", "w") as f_d:
+        f_d.write("%!PS\nshowpage\n")
+    journal = JobJournal(temp_dir)
+
+    server = GhostscriptServer(
+        1, [temp_dir + "ps/"], [temp_dir + "pdf/"], gs_path=gs_path, timeout=0.5
+    )
+    handler = PostscriptEventHandler(server=server)
+    with patch("subprocess.run") as run:
+        handler.convert(FileClosedEvent(temp_dir + "ps/1.ps"))
+    run.assert_not_called()
+
+    # The process is stopped; the conversion failed
+    assert server.workers.queue[0].process is None
+    failed = journal.failed_conversions()
+    assert [row["converter"] for row in failed] == ["ghostscript"]
+    assert "doesn't answer" in failed[0]["error"]
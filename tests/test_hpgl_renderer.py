@@ -0,0 +1,137 @@
+"""Test native HP-GL renderer module"""
+# Standard imports
+import os
+import re
+import zlib
+import pytest
+import numpy as np
+
+# Custom imports
+from libreprinter.hpgl_renderer import (
+    HpglRenderer,
+    UnsupportedHpgl,
+    render_hpgl,
+    POINTS_PER_UNIT,
+    PEN_WIDTH,
+)
+
+# Import create dir fixture
+from .test_file_handler import temp_dir
+
+DIR_DATA = os.path.dirname(os.path.abspath(__file__)) + "/../test_data/"
+
+
+def get_page(pdf):
+    """Get the MediaBox and the uncompressed content stream of a PDF file"""
+    media_box = re.search(rb"/MediaBox\s*\[([^\]]*)\]", pdf).group(1).split()
+    stream = re.search(rb"stream\n(.*?)endstream", pdf, re.S).group(1)
+    return [int(value) for value in media_box], zlib.decompress(stream)
+
+
+def test_hpgl_renderer_reference(temp_dir):
+    """Compare the lines of test_data/hpgl.hpgl with the hp2xx conversion"""
+    with open(DIR_DATA + "hpgl.hpgl", "rb") as f_d:
+        data = f_d.read()
+    with open(DIR_DATA + "hpgl.pdf", "rb") as f_d:
+        expected_box, expected_content = get_page(f_d.read())
+
+    # Arcs are not supported
+    with pytest.raises(UnsupportedHpgl, match="AA"):
+        HpglRenderer().feed(data)
+
+    # Lines before the first circle (not drawn with the same chords by hp2xx)
+    with open(temp_dir + "1.hpgl", "wb") as f_d:
+        f_d.write(data[: data.index(b"CI")])
+    render_hpgl(temp_dir + "1.hpgl", temp_dir + "1.pdf")
+    with open(temp_dir + "1.pdf", "rb") as f_d:
+        pdf = f_d.read()
+    assert pdf.startswith(b"%PDF-1.7") and pdf.endswith(b"%%EOF\n")
+    # Cross-reference table
+    offsets = re.findall(rb"(\d{10}) 00000 n", pdf)
+    for number, offset in enumerate(offsets, 1):
+        assert pdf[int(offset):].startswith(b"%d 0 obj" % number)
+    media_box, content = get_page(pdf)
+    assert media_box == expected_box
+
+    # Points of the reference in 1/720 inch
+    expected = np.array(
+        re.findall(rb"([-\d.]+) ([-\d.]+) [ml]\n", expected_content), dtype=float
+    )
+    points = np.array(re.findall(rb"(\d+) (\d+) [ml]\n", content), dtype=float)
+    assert len(points) == 181
+    points = (points - points.min(axis=0) + PEN_WIDTH / 2) * POINTS_PER_UNIT * 10
+    for point in points:
+        # Same point with a tolerance of 1/720 inch
+        assert np.abs(expected - point).max(axis=1).min() <= 1
+
+
+def test_hpgl_renderer():
+    """Test the supported instructions"""
+    renderer = HpglRenderer()
+    renderer.feed(
+        b"\x1b.Y\x1b.@;3:IN;IP;SP1;PU0,0;PD1000,0,1000,1000;"
+        # Relative coordinates
+        b"PR;PU100,100;PD100,0 0,100;"
+        # Dot
+        b"PU;PA2000,2000;PD;PU;"
+        # New path: new pen & line type
+        b"SP2;LT2,5;PA0,0;PD0,500;"
+        # Circle around the current position; pen is still at the center
+        b"CI100;PA0,1000;PU;"
+        b"SP0;PD3000,3000;PU;SP1;"
+        b"PA0,2000;LBA(B)\r\nC\x03PG;"
+    )
+    assert len(renderer.paths) == 2
+    pen, line_type, xs, ys, starts = renderer.paths[0]
+    assert pen == 1 and line_type is None
+    assert list(zip(xs, ys, starts)) == [
+        (0, 0, True), (1000, 0, False), (1000, 1000, False),
+        (1100, 1100, True), (1200, 1100, False), (1200, 1200, False),
+        (2000, 2000, True), (2000, 2000, False),
+    ]
+    pen, line_type, xs, ys, starts = renderer.paths[1]
+    assert pen == 2 and line_type == (2, 5)
+    assert xs[:2] == [0, 0] and ys[:2] == [0, 500]
+    # 72 chords of the circle
+    assert starts.count(True) == 3
+    assert xs[-2:] == [0, 0] and ys[-2:] == [500, 1000]
+
+    assert renderer.labels == [
+        (1, 0, 2000, 76, 108, b"A(B)"),
+        (1, 0, 2000 - 2 * 108, 76, 108, b"C"),
+    ]
+    assert renderer.position == (1.5 * 76, 2000 - 2 * 108)
+
+    media_box, content = get_page(renderer.to_pdf())
+    # Pen 0 doesn't draw
+    assert media_box == [0, 0, 149, 150]
+    assert b"1 0 0 RG\n[74.4 74.4] 0 d\n0 0 m\n0 500 l\n" in content
+    assert b"(A\\(B\\)) Tj" in content
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        (b"SP1;PD0,0,100,100;AA0,0,90;", "AA"),
+        (b"SP1;PD0,0,100,100;IW0,0,50,50;", "IW"),
+        (b"SP1;PD0,0,100,100;PG;PU;PD0,0,100,100;", "PG"),
+        (b"IN;SP1;PU;PG;", "empty plot"),
+        (b"IN;SP1;PD100,100;X;PD200,200;PU;", "unparsed data at byte 17"),
+        (b"IN;SP1;PD100,100;\x1b", "unparsed data"),
+        (b"SP1;PD0,0,1" + b"0" * 20 + b",0;", "out of range"),
+        (b"SP1;PD0,0,1" + b"0" * 400 + b",0;", "out of range"),
+        (b"SP1;PR;PD1073741824,0,1073741824,0;", "out of range"),
+        (b"SP1;PA0,0;CI" + b"9" * 400 + b";", "out of range"),
+        (b"IW0,0,1" + b"0" * 20 + b",50;SP1;PD0,0,100,100;", "out of range"),
+    ],
+    ids=[
+        "arc", "clipping", "pages", "empty", "unparsed", "escape",
+        "int64", "inf", "relative", "circle", "window",
+    ],
+)
+def test_hpgl_renderer_unsupported(data, message):
+    """Test the plots that must be converted by hp2xx"""
+    with pytest.raises(UnsupportedHpgl, match=message):
+        renderer = HpglRenderer()
+        renderer.feed(data)
+        renderer.to_pdf()
@@ -2,7 +2,9 @@
 # Standard imports
 import os
 import time
+import random
 import configparser
+from datetime import datetime
 import shlex
 import subprocess
 from pathlib import Path
@@ -19,7 +21,21 @@ from libreprinter.interface import (
     build_interface_config_settings,
     apply_msb_control,
     is_bit_set,
+    EscpState,
+    scan_escp_buffer,
+    SeikoState,
+    insert_seiko_timestamps,
+    get_buffer,
+    EndPageTimeout,
+    ConverterSync,
+    get_finalization_steps,
+    find_job_terminator,
+    JOB_TERMINATORS,
+    PostscriptState,
+    strip_postscript_prefix,
+    find_postscript_terminator,
 )
+from libreprinter.handlers import ReceiveBuffer
 from libreprinter.file_handler import init_directories
 from libreprinter.legacy_interprocess_com import (
     initialize_interprocess_com,
@@ -49,6 +65,8 @@ import libreprinter.commons as cm
 
 # Import create dir fixture
 from .test_file_handler import temp_dir
+# Import pipe based serial handler fixture
+from .test_serial_handler import fake_serial_handler
 
 LOGGER = cm.logger()
 
@@ -597,3 +615,367 @@ def test_is_bit_set():
 
     found = is_bit_set(b"\x01", 1)
     assert not found
+
+
+def escp_reference_loop(databytes, state):
+    """Byte per byte implementation of ESC/P commands tracking
+
+    Reference for :meth:`libreprinter.interface.scan_escp_buffer`.
+    """
+    for index in range(len(databytes)):
+        databyte = databytes[index]
+        if state.msbsetting != 0:
+            databyte = apply_msb_control(databytes[index:index + 1], state.msbsetting)
+            databytes[index] = databyte
+
+        if (databyte == 27) and not state.print_controlcodes:
+            state.escmode = True
+        elif state.escmode:
+            if databyte == ord("#"):
+                state.msbsetting = 0
+            if databyte == ord("="):
+                state.msbsetting = 1
+            if databyte == ord(">"):
+                state.msbsetting = 2
+            if databyte == ord("I"):
+                state.escimode = True
+            if databyte == ord("4"):
+                state.italic = True
+            if databyte == ord("5"):
+                state.italic = False
+            if databyte == ord("!"):
+                state.masterfontmode = True
+            state.escmode = False
+        elif state.escimode:
+            if not state.italic:
+                state.print_controlcodes = databyte == 1
+            state.escimode = False
+        elif state.masterfontmode:
+            state.italic = is_bit_set(databyte.to_bytes(1, "big"), 6)
+            state.masterfontmode = False
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_scan_escp_buffer(seed):
+    """Compare states & data obtained by the scanner vs a byte per byte loop
+
+    Random buffers are mainly made of ESC commands that are tracked, and are
+    split in chunks to test the persistence of the state between them.
+    """
+    rng = random.Random(seed)
+    alphabet = b"\x1b\x1b\x1b\x9b#=>I45!\x01\x40\xc0A\xff"
+    data = bytes(rng.choice(alphabet) for _ in range(2000))
+
+    expected_state, found_state = EscpState(), EscpState()
+    expected_data, found_data = bytearray(data), bytearray(data)
+    pos = 0
+    while pos < len(data):
+        size = rng.randint(1, 64)
+        escp_reference_loop(memoryview(expected_data)[pos:pos + size], expected_state)
+        scan_escp_buffer(memoryview(found_data)[pos:pos + size], found_state)
+        assert vars(expected_state) == vars(found_state)
+        pos += size
+
+    assert expected_data == found_data
+
+
+@pytest.mark.parametrize(
+    "databytes, expected",
+    [
+        # Clear MSB then cancel MSB control
+        (b"ab\x1b=\xff\xc1\x1b#\xff", b"ab\x1b=\x7f\x41\x1b#\xff"),
+        # 0x9B is an ESC once its MSB is cleared
+        (b"\x1b=\xff\x9b>\x01\x7f", b"\x1b=\x7f\x1b>\x81\xff"),
+        # Set MSB: following ESC bytes can't be interpreted anymore
+        (b"\x1b>\x1b#\x41", b"\x1b>\x9b\xa3\xc1"),
+    ],
+    ids=["clear_cancel", "cleared_esc", "set"],
+)
+def test_scan_escp_buffer_msb_control(databytes, expected):
+    """Test MSB control applied on runs of bytes in the middle of a buffer"""
+    databytes = bytearray(databytes)
+    scan_escp_buffer(databytes, EscpState())
+    assert expected == databytes
+
+
+def seiko_reference_loop(databytes, state, streams):
+    """Byte per byte implementation of Seiko QT-2100 timestamps insertion
+
+    Reference for :meth:`libreprinter.interface.insert_seiko_timestamps`.
+    Timestamps are expected to be null (frozen time).
+    """
+    edited_databytes = bytearray()
+    for databyte in databytes:
+        if databyte == 27:
+            state.escmode = True
+        elif state.escmode and databyte == ord("0"):
+            if state.probe_seiko:
+                streams[-1] += edited_databytes[:-1]
+                edited_databytes = edited_databytes[-1:]
+                streams.append(bytearray())
+            state.job_timestamp = None
+            state.probe_seiko = True
+        elif state.escmode and databyte == ord("1"):
+            edited_databytes += b"T\x00\x00\x00\x1b"
+        else:
+            state.escmode = False
+        edited_databytes.append(databyte)
+    streams[-1] += edited_databytes
+
+
+@patch("libreprinter.interface.datetime")
+@pytest.mark.parametrize("seed", range(20))
+def test_insert_seiko_timestamps(mock_datetime, seed):
+    """Compare streams obtained with markers search vs a byte per byte loop
+
+    Time is frozen: all inserted timestamps are null.
+    """
+    mock_datetime.now.return_value = datetime(2024, 1, 1)
+    rng = random.Random(seed)
+    data = bytes(rng.choice(b"\x1b\x1b01AB") for _ in range(500))
+
+    expected_state, found_state = SeikoState(), SeikoState()
+    expected_streams, found_streams = [bytearray()], [bytearray()]
+    pos = 0
+    while pos < len(data):
+        size = rng.randint(1, 32)
+        chunk = bytearray(data[pos:pos + size])
+        seiko_reference_loop(chunk, expected_state, expected_streams)
+
+        first, *new_streams = insert_seiko_timestamps(chunk, found_state)
+        found_streams[-1] += first
+        found_streams += [bytearray(stream) for stream in new_streams]
+
+        assert expected_state.escmode == found_state.escmode
+        assert expected_state.probe_seiko == found_state.probe_seiko
+        pos += size
+
+    assert expected_streams == found_streams
+
+
+def test_converter_sync():
+    """Test the rate limit of the sync of the converters"""
+    converter_sync = ConverterSync(0.2)
+    assert converter_sync.delay() is None
+
+    # The first chunk is synced immediately
+    assert converter_sync.add(10)
+    converter_sync.done()
+
+    # Next chunks are synced later, at most 0.2s after the last sync
+    assert not converter_sync.add(10)
+    assert not converter_sync.add(10)
+    assert converter_sync.pending_bytes == 20
+    assert 0 < converter_sync.delay() <= 0.2
+    time.sleep(0.2)
+    assert converter_sync.delay() == 0
+    converter_sync.done()
+    assert converter_sync.delay() is None
+    assert (converter_sync.syncs, converter_sync.avoided) == (2, 2)
+
+    # No rate limit
+    converter_sync = ConverterSync(0)
+    assert converter_sync.add(10)
+    converter_sync.done()
+    assert converter_sync.add(10)
+
+
+@pytest.mark.parametrize(
+    "emulation, endlesstext, expected",
+    [
+        ("epson", "no", ["sync_converters"]),
+        ("epson", "plain-jobs", ["sync_converters", "convert_file_line_ending"]),
+        ("hp", "no", ["link_file"]),
+        ("text", "no", ["convert_file_line_ending"]),
+        ("seiko-qt2100", "no", []),
+    ],
+)
+def test_get_finalization_steps(emulation, endlesstext, expected):
+    """Test the steps made in background after the end of a job"""
+    config = configparser.ConfigParser()
+    config.read_string("[misc]\n[parallel_printer]\n[serial_printer]")
+    config["misc"]["emulation"] = emulation
+    config["misc"]["endlesstext"] = endlesstext
+    config = parse_config(config)
+
+    steps = get_finalization_steps(config, 0, 1)
+    assert [function.__name__ for function, *_ in steps] == expected
+
+
+def test_get_buffer(fake_serial_handler):
+    """Test the sub-second end of page timeout"""
+    receive_buffer = ReceiveBuffer(fake_serial_handler)
+
+    os.write(fake_serial_handler.write_fd, b"hello")
+    assert get_buffer(receive_buffer, 0.3) == b"hello"
+
+    # No data: None is returned at the deadline
+    start = time.monotonic()
+    assert get_buffer(receive_buffer, 0.3) is None
+    elapsed = time.monotonic() - start
+    assert 0.3 <= elapsed < 0.6
+
+
+def test_read_interface_write_error(fake_serial_handler, temp_dir, caplog):
+    """Test the reception of the next jobs after an error of the writer thread"""
+    config = configparser.ConfigParser()
+    config.read_string("[misc]\nemulation=hp\n[parallel_printer]\n[serial_printer]")
+    config["misc"]["output_path"] = temp_dir
+    config["misc"]["end_page_timeout"] = "0.3"
+    config = parse_config(config)
+    init_directories(temp_dir)
+    # Settings of the interface are acknowledged
+    fake_serial_handler.write = lambda data: None
+    fake_serial_handler.readline = lambda: b"end_config\n"
+
+    def write(writer, name, data):
+        """Simulate a full disk for the first job"""
+        if bytes(data).startswith(b"first"):
+            raise OSError(28, "No space left on device")
+        writer.files[name].write(data)
+
+    with patch(
+        "libreprinter.interface.get_serial_handler", return_value=fake_serial_handler
+    ), patch("libreprinter.job_writer.JobWriter.write", write):
+        interface_thread = Thread(target=read_interface, args=(config,))
+        interface_thread.start()
+        os.write(fake_serial_handler.write_fd, b"first job")
+        time.sleep(1)
+        os.write(fake_serial_handler.write_fd, b"second job")
+        time.sleep(1)
+        # Serial port disconnected: end of the reception
+        os.close(fake_serial_handler.write_fd)
+        interface_thread.join(timeout=5)
+
+    assert not interface_thread.is_alive()
+    assert "job dropped: [Errno 28] No space left on device" in caplog.text
+    with open(temp_dir + "pcl/2.pcl", "rb") as f_d:
+        assert f_d.read() == b"second job"
+
+
+def test_end_page_timeout():
+    """Test fixed and learned end of page timeouts"""
+    config = configparser.ConfigParser()
+    config.read_string("[misc]\n[parallel_printer]\n[serial_printer]")
+    misc_section = parse_config(config)["misc"]
+
+    # Fixed timeout: pauses are ignored
+    end_page_timeout = EndPageTimeout(misc_section)
+    end_page_timeout.add_gap(1)
+    assert end_page_timeout.update() == 2
+
+    misc_section["end_page_timeout"] = "auto"
+    end_page_timeout = EndPageTimeout(misc_section)
+    # The maximum is used until enough pauses are observed
+    assert end_page_timeout.value == 10
+    # Chunks of bursts are not learned
+    for _ in range(100):
+        end_page_timeout.add_gap(0.001)
+    assert end_page_timeout.update() == 10
+
+    for _ in range(20):
+        end_page_timeout.add_gap(0.8)
+    assert end_page_timeout.update() == pytest.approx(1.2)
+
+    # Upper bound
+    for _ in range(20):
+        end_page_timeout.add_gap(60)
+    assert end_page_timeout.update() == 10
+
+    # Lower bound
+    end_page_timeout.gaps.clear()
+    for _ in range(20):
+        end_page_timeout.add_gap(0.06)
+    assert end_page_timeout.update() == 0.5
+
+    # Job ended by the timeout (last byte 0.8s ago), continued just after:
+    # the pause becomes a lower bound of the timeout
+    end_page_timeout.end_job(time.monotonic() - 0.8)
+    end_page_timeout.start_job()
+    assert end_page_timeout.value == pytest.approx(1.2, abs=0.05)
+    for _ in range(20):
+        end_page_timeout.add_gap(0.06)
+    assert end_page_timeout.update() == pytest.approx(1.2, abs=0.05)
+
+    # Job starting long after the previous one, or after a terminator
+    end_page_timeout.end_job(time.monotonic() - 5)
+    end_page_timeout.start_job()
+    end_page_timeout.end_job()
+    end_page_timeout.start_job()
+    assert len(end_page_timeout.split_gaps) == 1
+
+
+@pytest.mark.parametrize(
+    "emulation, databytes, tail, expected",
+    [
+        ("epson", b"text\x0c\x1b@\x1b@next", b"", 7),
+        ("epson", b"text\x0c\x1b", b"", -1),
+        # Terminator split between 2 chunks
+        ("epson", b"@next", b"text\x0c\x1b", 1),
+        # Terminator already seen in the tail
+        ("epson", b"next", b"\x0c\x1b@", -1),
+        ("hp", b"\x1bE\x1b%-12345X@PJL", b"", 11),
+        ("hpgl", b"PA0,0;SP0;\r\nIN;", b"", 12),
+        ("hpgl", b"PU;PG;", b"", 6),
+        ("hpgl", b"SP1;PD;", b"", -1),
+    ],
+    ids=[
+        "epson", "epson_incomplete", "epson_split", "epson_tail",
+        "hp", "hpgl_sp0", "hpgl_pg", "hpgl_pen",
+    ],
+)
+def test_find_job_terminator(emulation, databytes, tail, expected):
+    """Test the detection of the end of the jobs for the supported emulations"""
+    found = find_job_terminator(
+        memoryview(databytes), JOB_TERMINATORS[emulation], tail
+    )
+    assert expected == found
+
+
+@pytest.mark.parametrize(
+    "chunks, expected",
+    [
+        ([b"showpage\n%%EOF\r\n%!PS"], [16]),
+        ([b"showpage\x04%!PS"], [9]),
+        ([b"showpage\n%%E", b"OF\n%!PS"], [-1, 3]),
+        # %%EOF of an embedded EPS file
+        (
+            [
+                b"%!PS\n%%BeginDocument: fig.eps\n%!PS-Adobe-3.0 EPSF-3.0\n%%EOF\n",
+                b"%%EndDocument\nshowpage\n%%EOF\n",
+            ],
+            [-1, 29],
+        ),
+        # Comments split between 2 chunks
+        (
+            [b"%%BeginDoc", b"ument\n%%EOF\n%%EndDoc", b"ument\n%%EOF"],
+            [-1, -1, 11],
+        ),
+        # Ctrl-D also ends a job with an embedded document
+        ([b"%%BeginDocument\nshowpage\x04"], [25]),
+    ],
+    ids=["eof", "ctrl_d", "eof_split", "embedded_eps", "comments_split", "ctrl_d_eps"],
+)
+def test_find_postscript_terminator(chunks, expected):
+    """Test the detection of the end of the PostScript jobs"""
+    state = PostscriptState()
+    found = [
+        find_postscript_terminator(memoryview(chunk), state) for chunk in chunks
+    ]
+    assert expected == found
+
+
+def test_strip_postscript_prefix():
+    """Test the drop of Ctrl-D received before the content of a job"""
+    state = PostscriptState()
+    # Leading Ctrl-D alone: no job
+    assert not strip_postscript_prefix(memoryview(b"\x04"), state)
+    assert not state.content
+    assert not strip_postscript_prefix(memoryview(b"\r\n\x04 "), state)
+    assert not state.content
+
+    found = strip_postscript_prefix(memoryview(b"\x04%!PS\x04"), state)
+    assert b"%!PS\x04" == found
+    assert state.content
+    # The Ctrl-D following the content ends the job
+    assert 5 == find_postscript_terminator(found, state)
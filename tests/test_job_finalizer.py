@@ -0,0 +1,49 @@
+"""Test job finalizer module"""
+# Standard imports
+import threading
+import pytest
+
+# Custom imports
+from libreprinter.job_finalizer import JobFinalizer
+
+
+@pytest.fixture()
+def finalizer():
+    """Yield a started finalizer thread"""
+    finalizer = JobFinalizer()
+    finalizer.start()
+    yield finalizer
+    finalizer.stop()
+
+
+def test_job_finalizer(finalizer):
+    """Test the ordered completion of the jobs"""
+    release = threading.Event()
+    done = []
+
+    # A slow job doesn't block the submissions
+    finalizer.submit(1, [(release.wait,), (done.append, 1)])
+    finalizer.submit(2, [(done.append, 2)])
+    assert finalizer.depth >= 1
+    assert not done
+
+    release.set()
+    finalizer.drain()
+    assert done == [1, 2]
+    assert finalizer.last_job == 2
+
+
+def test_job_finalizer_error(finalizer):
+    """Test that a failed step doesn't stop the next jobs"""
+    done = []
+
+    def fail():
+        raise OSError("disk full")
+
+    finalizer.submit(1, [(fail,), (done.append, 1)])
+    finalizer.submit(2, [(done.append, 2)])
+    finalizer.drain()
+
+    # The following steps of the failed job are skipped
+    assert done == [2]
+    assert finalizer.failed_jobs == 1
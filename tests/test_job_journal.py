@@ -0,0 +1,150 @@
+"""Test job journal module"""
+# Standard imports
+import os
+import sys
+from datetime import datetime
+from unittest.mock import patch
+import pytest
+
+# Custom imports
+from libreprinter.job_journal import (
+    JobJournal,
+    JobRecord,
+    record_conversion,
+    recorded_conversion,
+    main,
+    JOURNAL_FILE,
+)
+
+# Import create dir fixture
+from .test_file_handler import temp_dir
+
+
+def test_job_journal(temp_dir):
+    """Test the records of the jobs and of their conversions"""
+    journal = JobJournal(temp_dir)
+    assert os.path.exists(temp_dir + JOURNAL_FILE)
+
+    record = JobRecord(1, "hp", temp_dir + "pcl/1.pcl")
+    record.add(10)
+    record.add(5)
+    record.end_reason = "timeout"
+    journal.add_job(record)
+    assert record.size == 15
+    assert record.first_byte <= record.last_byte
+
+    record = JobRecord("20240131-120000-000000-ttyACM0", "hp", temp_dir + "pcl/2.pcl")
+    record.add(1)
+    record.end_reason = "terminator"
+    journal.add_job(record)
+
+    jobs = journal.jobs()
+    assert [row["job_id"] for row in jobs] == ["20240131-120000-000000-ttyACM0", "1"]
+    assert jobs[1]["size"] == 15
+    assert jobs[1]["end_reason"] == "timeout"
+    assert len(journal.jobs(limit=1)) == 1
+    assert not journal.jobs(since=datetime(2100, 1, 1))
+
+    stats = journal.daily_stats()
+    assert stats[0]["jobs"] == 2
+    assert stats[0]["bytes"] == 16
+
+    # Conversions made by the plugins
+    os.mkdir(temp_dir + "pcl")
+    record_conversion(temp_dir + "pcl/1.pcl", "gpcl6", "ok", temp_dir + "pdf/1.pdf")
+    record_conversion(temp_dir + "pcl/2.pcl", "gpcl6", "failed", error="exit status 1")
+    failed = journal.failed_conversions()
+    assert len(failed) == 1
+    assert failed[0]["job_id"] == "2"
+    assert failed[0]["error"] == "exit status 1"
+
+
+def test_job_journal_open_job(temp_dir):
+    """Test the record of the jobs at their first byte"""
+    journal = JobJournal(temp_dir)
+
+    record = JobRecord(1, "hp", temp_dir + "pcl/1.pcl")
+    journal.open_job(record)
+    assert record.row_id is not None
+    jobs = journal.jobs()
+    assert jobs[0]["end_reason"] == "interrupted"
+    assert jobs[0]["size"] == 0
+    # Jobs being received are excluded from the recovery
+    assert len(journal.unconverted_jobs(3)) == 1
+    assert not journal.unconverted_jobs(3, before=jobs[0]["first_byte"])
+
+    record.add(10)
+    record.end_reason = "timeout"
+    journal.end_job(record)
+    # Not recorded at its first byte
+    record = JobRecord(2, "hp", temp_dir + "pcl/2.pcl")
+    record.add(5)
+    record.end_reason = "terminator"
+    journal.end_job(record)
+
+    jobs = journal.jobs()
+    assert [(row["job_id"], row["size"], row["end_reason"]) for row in jobs] == [
+        ("2", 5, "terminator"),
+        ("1", 10, "timeout"),
+    ]
+
+
+def test_record_conversion_without_journal(temp_dir):
+    """Test that nothing is done if the journal is disabled"""
+    os.mkdir(temp_dir + "pcl")
+    record_conversion(temp_dir + "pcl/1.pcl", "gpcl6", "ok")
+    assert not os.path.exists(temp_dir + JOURNAL_FILE)
+
+
+def test_recorded_conversion(temp_dir):
+    """Test the timing and the record of the conversions made in a block"""
+    journal = JobJournal(temp_dir)
+    os.mkdir(temp_dir + "hpgl")
+
+    with recorded_conversion(temp_dir + "hpgl/1.hpgl", "hpgl", temp_dir + "pdf/1.pdf"):
+        pass
+    # Exceptions are recorded and propagated
+    with pytest.raises(ValueError, match="bad plot"):
+        with recorded_conversion(temp_dir + "hpgl/2.hpgl", "hpgl"):
+            raise ValueError("bad plot")
+    # File converted otherwise: not recorded
+    with pytest.raises(KeyError):
+        with recorded_conversion(
+            temp_dir + "hpgl/3.hpgl", "hpgl", unrecorded=(KeyError,)
+        ):
+            raise KeyError
+
+    with journal.connect() as connection:
+        rows = connection.execute("SELECT * FROM conversions ORDER BY job_id").fetchall()
+    assert [(row["job_id"], row["status"]) for row in rows] == [
+        ("1", "ok"),
+        ("2", "failed"),
+    ]
+    assert rows[0]["output_path"] == temp_dir + "pdf/1.pdf"
+    assert rows[0]["duration"] >= 0
+    assert rows[1]["error"] == "bad plot"
+
+
+def test_journal_cli(temp_dir, capsys):
+    """Test the command line interface"""
+    record = JobRecord(1, "epson", temp_dir + "raw/1.raw")
+    record.add(42)
+    record.end_reason = "timeout"
+    JobJournal(temp_dir).add_job(record)
+
+    with patch.object(sys, "argv", ["libreprinter-journal", "-o", temp_dir, "jobs"]):
+        main()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("job_id\t")
+    assert lines[1].startswith("1\tepson\t42\t")
+
+    with patch.object(sys, "argv", ["libreprinter-journal", "-o", temp_dir, "stats"]):
+        main()
+    assert capsys.readouterr().out.splitlines()[1].endswith("\t1\t42")
+
+    # No journal
+    with patch.object(
+        sys, "argv", ["libreprinter-journal", "-o", temp_dir + "raw", "failed"]
+    ):
+        with pytest.raises(SystemExit):
+            main()
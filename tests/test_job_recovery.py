@@ -0,0 +1,164 @@
+"""Test job recovery module"""
+# Standard imports
+import os
+import time
+import configparser
+import threading
+from pathlib import Path
+from unittest.mock import patch
+from watchdog.observers.inotify import InotifyObserver
+from watchdog.events import RegexMatchingEventHandler
+
+# Custom imports
+from libreprinter.job_journal import JobJournal, JobRecord
+from libreprinter.job_recovery import (
+    recover_jobs,
+    start_recovery,
+    RECOVERY_MAX_ATTEMPTS,
+    RECOVERY_BATCH_SIZE,
+)
+from libreprinter.conversion_pool import ConversionPool
+
+# Import create dir fixture
+from .test_file_handler import temp_dir
+
+
+class RecordingEventHandler(RegexMatchingEventHandler):
+    """Keep the paths of the closed files"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.paths = []
+
+    def on_closed(self, event):
+        self.paths.append(Path(event.src_path).name)
+
+
+class ConvertingEventHandler(RegexMatchingEventHandler):
+    """Submit the conversion of the closed files to a pool"""
+
+    def __init__(self, pool, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = pool
+        self.paths = []
+        self.max_waiting = 0
+
+    def on_closed(self, event):
+        self.pool.submit("pcl", self.convert, Path(event.src_path).name)
+        self.max_waiting = max(self.max_waiting, len(self.pool.queue))
+
+    def convert(self, name):
+        time.sleep(0.01)
+        self.paths.append(name)
+
+
+def add_job(journal, temp_dir, job_id, directory="pcl", extension="pcl"):
+    """Create the file of a job and record it in the journal"""
+    filepath = f"{temp_dir}{directory}/{job_id}.{extension}"
+    Path(filepath).write_bytes(b"data")
+    record = JobRecord(job_id, "hp", filepath)
+    record.add(4)
+    record.end_reason = "timeout"
+    journal.add_job(record)
+    return filepath
+
+
+def test_recover_jobs(temp_dir):
+    """Test the conversion of the jobs without successful conversion"""
+    for directory in ("pcl", "raw"):
+        os.mkdir(temp_dir + directory)
+    journal = JobJournal(temp_dir)
+
+    # Not converted
+    add_job(journal, temp_dir, 1)
+    # Converted
+    filepath = add_job(journal, temp_dir, 2)
+    journal.add_conversion(2, "gpcl6", "ok", filepath)
+    # Failed once
+    filepath = add_job(journal, temp_dir, 3)
+    journal.add_conversion(3, "gpcl6", "failed", filepath)
+    # Failed too many times
+    filepath = add_job(journal, temp_dir, 4)
+    for _ in range(RECOVERY_MAX_ATTEMPTS):
+        journal.add_conversion(4, "gpcl6", "failed", filepath)
+    # Deleted
+    os.remove(add_job(journal, temp_dir, 5))
+    # Directory not watched
+    add_job(journal, temp_dir, 6, "raw", "raw")
+    # Only printed
+    filepath = add_job(journal, temp_dir, 7)
+    journal.add_conversion(7, "lpr", "ok", filepath)
+    # Interrupted reception
+    Path(temp_dir + "pcl/8.pcl").write_bytes(b"da")
+    journal.open_job(JobRecord(8, "hp", temp_dir + "pcl/8.pcl"))
+    # Interrupted reception, assembled in memory
+    Path(temp_dir + "pcl/9.pcl").touch()
+    journal.open_job(JobRecord(9, "hp", temp_dir + "pcl/9.pcl"))
+
+    handler = RecordingEventHandler(ignore_directories=True)
+    observer = InotifyObserver()
+    observer.schedule(handler, temp_dir + "pcl/", recursive=False)
+    observer.start()
+    try:
+        recover_jobs(temp_dir, [observer, None])
+    finally:
+        observer.stop()
+        observer.join()
+
+    assert handler.paths == ["1.pcl", "3.pcl", "7.pcl", "8.pcl"]
+
+
+def test_recover_jobs_live_event(temp_dir):
+    """Test that a job received during the recovery of a long backlog is not
+    delayed by it"""
+    os.mkdir(temp_dir + "pcl")
+    journal = JobJournal(temp_dir)
+    for job_id in range(1, 31):
+        add_job(journal, temp_dir, job_id)
+
+    pool = ConversionPool(max_workers=1, plugin_workers=1)
+    handler = ConvertingEventHandler(pool, ignore_directories=True)
+    observer = InotifyObserver()
+    observer.schedule(handler, temp_dir + "pcl/", recursive=False)
+    observer.start()
+    try:
+        with patch("libreprinter.job_recovery.get_pool", return_value=pool):
+            thread = threading.Thread(target=recover_jobs, args=(temp_dir, [observer]))
+            thread.start()
+            while len(handler.paths) < 5:
+                time.sleep(0.005)
+            # Live job
+            converted = len(handler.paths)
+            Path(temp_dir + "pcl/live.pcl").write_bytes(b"data")
+            thread.join()
+            pool.drain()
+    finally:
+        observer.stop()
+        observer.join()
+
+    assert len(handler.paths) == 31
+    # Not converted after the backlog
+    assert handler.paths.index("live.pcl") <= converted + RECOVERY_BATCH_SIZE
+    # The pool is not flooded by the backlog
+    assert handler.max_waiting <= RECOVERY_BATCH_SIZE
+
+
+def test_start_recovery_disabled_journal(temp_dir):
+    """Test that the journal of a previous run is not used with job_journal=no"""
+    os.mkdir(temp_dir + "pcl")
+    add_job(JobJournal(temp_dir), temp_dir, 1)
+    config = configparser.ConfigParser()
+    config["misc"] = {"output_path": temp_dir, "job_journal": "no"}
+
+    handler = RecordingEventHandler(ignore_directories=True)
+    observer = InotifyObserver()
+    observer.schedule(handler, temp_dir + "pcl/", recursive=False)
+    observer.start()
+    try:
+        assert start_recovery(config["misc"], [observer]) is None
+        config["misc"]["job_journal"] = "yes"
+        start_recovery(config["misc"], [observer]).join()
+    finally:
+        observer.stop()
+        observer.join()
+    assert handler.paths == ["1.pcl"]
@@ -0,0 +1,125 @@
+"""Test job writer module"""
+# Standard imports
+import os
+import threading
+import pytest
+
+# Custom imports
+from libreprinter.job_writer import JobWriter, SpooledJobFile
+
+# Import create dir fixture
+from .test_file_handler import temp_dir
+
+
+@pytest.fixture()
+def writer():
+    """Yield a started writer thread"""
+    writer = JobWriter(maxsize=2)
+    writer.start()
+    yield writer
+    writer.stop()
+
+
+def test_job_writer(writer, temp_dir):
+    """Test the execution of the operations in the submission order"""
+    filepath = temp_dir + "1.raw"
+    writer.submit([(writer.open, "raw", filepath), (writer.write, "raw", b"hello ")])
+    writer.submit([(writer.write, "raw", memoryview(b"world"))])
+    writer.submit([(writer.close, "raw")])
+    writer.drain()
+
+    with open(filepath, "rb") as f_d:
+        assert f_d.read() == b"hello world"
+    assert not writer.files
+
+
+def test_job_writer_queue_metrics(writer):
+    """Test the high-water mark of the queue while the writer is blocked"""
+    blocked = threading.Event()
+    release = threading.Event()
+
+    def stall():
+        """Simulate a stall of the storage"""
+        blocked.set()
+        release.wait()
+
+    writer.submit([(stall,)])
+    blocked.wait()
+    writer.submit([])
+    writer.submit([])
+    assert writer.depth == 2
+    assert writer.high_water_mark == 2
+
+    # The next submission waits for a free slot
+    thread = threading.Thread(target=writer.submit, args=([],))
+    thread.start()
+    release.set()
+    thread.join()
+    writer.drain()
+
+    assert writer.depth == 0
+    assert writer.high_water_mark == 2
+    assert writer.full_waits == 1
+
+
+def test_job_writer_error(writer, temp_dir):
+    """Test the propagation of an error to the reception thread"""
+    writer.submit([(writer.open, "raw", temp_dir + "not_a_dir/1.raw")])
+    with pytest.raises(FileNotFoundError):
+        writer.drain()
+
+    # The error is raised only once
+    writer.submit([])
+    writer.drain()
+
+
+def test_job_writer_reset(writer, temp_dir):
+    """Test the drop of a job after an error"""
+    filepath = temp_dir + "1.raw"
+    writer.submit([(writer.open, "raw", filepath), (writer.write, "raw", b"hello")])
+    writer.submit([(writer.write, "missing", b"lost")])
+    writer.submit([(writer.write, "raw", b" world")])
+    with pytest.raises(KeyError):
+        writer.drain()
+
+    writer.reset()
+    assert not writer.files
+    # Operations following the error are dropped
+    with open(filepath, "rb") as f_d:
+        assert f_d.read() == b"hello"
+    # Operations are executed again
+    writer.submit([(writer.open, "raw", filepath), (writer.close, "raw")])
+    writer.drain()
+
+
+def test_spooled_job_file(temp_dir):
+    """Test the assembly of a job in memory and the spill to the disk"""
+    filepath = temp_dir + "1.raw"
+    job_file = SpooledJobFile(filepath, threshold=10)
+    job_file.write(b"hello ")
+    job_file.write(memoryview(b"you"))
+    # Nothing is written before the end of the job
+    assert not job_file.spilled
+    assert not os.path.exists(filepath)
+    job_file.close()
+    with open(filepath, "rb") as f_d:
+        assert f_d.read() == b"hello you"
+
+    # Threshold exceeded: data is written as it arrives
+    job_file = SpooledJobFile(filepath, threshold=10)
+    job_file.write(b"hello ")
+    job_file.write(b"world")
+    assert job_file.spilled
+    job_file.write(b"!")
+    job_file.flush()
+    with open(filepath, "rb") as f_d:
+        assert f_d.read() == b"hello world!"
+    job_file.close()
+
+    # Flush makes the data readable
+    job_file = SpooledJobFile(filepath, threshold=10)
+    job_file.write(b"hello")
+    job_file.flush()
+    with open(filepath, "rb") as f_d:
+        assert f_d.read() == b"hello"
+    job_file.close()
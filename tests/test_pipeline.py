@@ -0,0 +1,70 @@
+"""Test pipeline module"""
+# Standard imports
+import subprocess
+import pytest
+
+# Custom imports
+from libreprinter.pipeline import Pipeline, get_bounding_box
+
+
+def test_pipeline():
+    """Test a pipeline whose data exceeds the pipe buffers"""
+    pipeline = Pipeline()
+    pipeline.add(["head", "-c", "10000000", "/dev/zero"])
+    pipeline.add(["wc", "-c"])
+    assert pipeline.wait(timeout=10).strip() == b"10000000"
+
+
+def test_pipeline_header():
+    """Test the reading of a header before the start of the next process"""
+    pipeline = Pipeline()
+    header_cmd = "printf '%%!PS\\n%%%%BoundingBox: 0 0 595 842\\n%%%%EndComments\\n'"
+    pipeline.add(["sh", "-c", header_cmd + "; head -c 1000000 /dev/zero"])
+    header = pipeline.read_header(b"%%EndComments")
+    assert header.startswith(b"%!PS\n")
+    assert get_bounding_box(header) == (0, 0, 595, 842)
+
+    pipeline.add(["wc", "-c"], header=header)
+    assert pipeline.wait(timeout=10).strip() == b"1000046"
+
+    assert get_bounding_box(b"%!PS\n%%EndComments") is None
+
+
+def test_pipeline_errors():
+    """Test the report of the failed process and of the timeout"""
+    pipeline = Pipeline()
+    pipeline.add(["yes"])
+    pipeline.add(["sh", "-c", "echo 'bad input' >&2; exit 3"])
+    with pytest.raises(subprocess.CalledProcessError) as excinfo:
+        pipeline.wait(timeout=10)
+    # The first process is killed by SIGPIPE; the second one is reported
+    assert excinfo.value.returncode == 3
+    assert excinfo.value.stderr == b"bad input\n"
+
+    pipeline = Pipeline()
+    pipeline.add(["sleep", "10"])
+    with pytest.raises(subprocess.TimeoutExpired):
+        pipeline.wait(timeout=0.2)
+
+    with pytest.raises(FileNotFoundError):
+        Pipeline().add(["not_a_binary"])
+
+    # A process fails to start: the previous ones are killed and waited for
+    pipeline = Pipeline()
+    process = pipeline.add(["sleep", "10"])
+    with pytest.raises(FileNotFoundError):
+        pipeline.add(["not_a_binary"])
+    assert process.returncode == -9
+    assert all(error_file.closed for error_file in pipeline.error_files)
+
+
+def test_pipeline_header_timeout():
+    """Test the deadline of the reading of a header"""
+    pipeline = Pipeline()
+    process = pipeline.add(["sh", "-c", "printf '%%!PS\\n'; exec sleep 10"])
+    with pytest.raises(subprocess.TimeoutExpired) as excinfo:
+        pipeline.read_header(b"%%EndComments", timeout=0.2)
+    assert excinfo.value.output == b"%!PS\n"
+    # The process is killed and waited for
+    assert process.returncode == -9
+    assert process.stdout.closed
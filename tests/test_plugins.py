@@ -19,8 +19,10 @@
 import configparser
 from inspect import isfunction
 import subprocess
+import time
 import pytest
 from watchdog.observers.inotify import InotifyObserver
+from watchdog.events import RegexMatchingEventHandler
 
 # Custom imports
 from libreprinter import plugins, plugins_handler
@@ -295,3 +297,46 @@ def test_is_plugin_compatible(plugin_config: dict[str, dict[str, str]], expected
 
     found = plugins_handler.is_plugin_compatible(config, plugin_config)
     assert expected == found
+
+
+def test_shared_observer(temp_dir):
+    """Test the routing of the events of the shared observer to the plugins"""
+    init_directories(temp_dir)
+    events = {"pcl": [], "pdf": []}
+
+    class Handler(RegexMatchingEventHandler):
+        """Keep the names of the closed files"""
+
+        def __init__(self, name, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.name = name
+
+        def on_closed(self, event):
+            events[self.name].append(event.src_path.rpartition("/")[2])
+
+    observer = plugins_handler.watch(
+        Handler("pcl", regexes=[r".*\.pcl$"], ignore_directories=True),
+        temp_dir + "pcl/",
+    )
+    # Same observer for all the plugins
+    assert observer is plugins_handler.watch(
+        Handler("pdf", regexes=[r".*\.pdf$"], ignore_directories=True),
+        temp_dir + "pdf/",
+    )
+    try:
+        for filename in ("pcl/1.pcl", "pcl/2.txt", "pdf/1.pdf", "raw/1.pcl"):
+            open(temp_dir + filename, "a").close()
+
+        start = time.monotonic()
+        while (not events["pcl"] or not events["pdf"]) and time.monotonic() - start < 5:
+            time.sleep(0.1)
+        time.sleep(0.2)
+        assert events == {"pcl": ["1.pcl"], "pdf": ["1.pdf"]}
+    finally:
+        observer.stop()
+        observer.join()
+
+    # A new observer is started after a stop
+    observer = plugins_handler.watch(Handler("pcl"), temp_dir + "pcl/")
+    assert observer.is_alive()
+    observer.stop()
@@ -0,0 +1,98 @@
+"""Test serial handler module"""
+# Standard imports
+import os
+import time
+from threading import Thread
+import pytest
+
+# Custom imports
+from libreprinter.handlers.serial_handler import ReceiveBuffer, SerialException
+
+
+class FakeSerialHandler:
+    """Serial handler reading the output of a pipe"""
+
+    def __init__(self):
+        self.read_fd, self.write_fd = os.pipe()
+        os.set_blocking(self.read_fd, False)
+
+    def fileno(self):
+        return self.read_fd
+
+    def close(self):
+        for fd in (self.read_fd, self.write_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+@pytest.fixture()
+def fake_serial_handler():
+    """Yield a serial handler based on a pipe; see :class:`FakeSerialHandler`"""
+    serial_handler = FakeSerialHandler()
+    yield serial_handler
+    serial_handler.close()
+
+
+def test_receive_buffer(fake_serial_handler):
+    """Test the reception of data in the preallocated ring of buffers"""
+    receive_buffer = ReceiveBuffer(fake_serial_handler, size=8, slots=2)
+
+    # No data
+    assert receive_buffer.read(timeout=0.01) is None
+
+    os.write(fake_serial_handler.write_fd, b"hello world")
+    # Chunks are limited to the size of the slots
+    first = receive_buffer.read(timeout=0.01)
+    second = receive_buffer.read(timeout=0.01)
+    assert isinstance(first, memoryview)
+    assert first == b"hello wo"
+    assert second == b"rld"
+    assert receive_buffer.read_calls == 2
+    assert receive_buffer.received_bytes == 11
+
+    # Buffers are reused: the first slot is overwritten by the 3rd read
+    os.write(fake_serial_handler.write_fd, b"!")
+    third = receive_buffer.read(timeout=0.01)
+    assert third.obj is first.obj
+    assert first[:1] == b"!"
+
+    # Disconnected device
+    os.close(fake_serial_handler.write_fd)
+    with pytest.raises(SerialException, match=r"device reports readiness.*"):
+        receive_buffer.read(timeout=0.01)
+
+
+def test_receive_buffer_read_sizing(fake_serial_handler):
+    """Test the size of the reads adapted to the data rate"""
+    receive_buffer = ReceiveBuffer(fake_serial_handler, latency=0.05)
+
+    def slow_writer():
+        """Send 1 byte every 2 ms (~500 bytes/s)"""
+        for _ in range(300):
+            os.write(fake_serial_handler.write_fd, b"x")
+            time.sleep(0.002)
+
+    # The first bytes of a transfer are read without delay
+    os.write(fake_serial_handler.write_fd, b"x")
+    start = time.monotonic()
+    assert receive_buffer.read(timeout=1) == b"x"
+    assert time.monotonic() - start < 0.025
+
+    thread = Thread(target=slow_writer)
+    thread.start()
+    while receive_buffer.read(timeout=0.1) is not None or thread.is_alive():
+        pass
+    thread.join()
+
+    assert receive_buffer.received_bytes == 301
+    # Bytes are grouped instead of being read 1 by 1
+    assert receive_buffer.average_chunk_size > 5
+    # Reads of 1 byte: 2 syscalls per byte (poll + read), 2000000 per MB.
+    # Reads sized for the latency (~25 bytes at 500 bytes/s, 3 syscalls per
+    # read: poll + ioctl + read): 8 times fewer at least
+    assert receive_buffer.syscalls_per_mb <= 2000000 / 8
+    # Latency cap: a read never waits more than the latency, i.e. at least
+    # 1 read per latency during the transfer (0.6s)
+    assert receive_buffer.read_calls >= 300 * 0.002 / 0.05
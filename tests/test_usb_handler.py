@@ -0,0 +1,121 @@
+"""Test USB handler module"""
+# Standard imports
+import os
+import time
+import threading
+from threading import Thread
+import pytest
+from unittest.mock import patch
+
+# Custom imports
+from libreprinter.handlers.usb_handler import UsbPassthroughSink
+
+# Import create dir fixture
+from .test_file_handler import temp_dir
+
+
+@pytest.fixture()
+def fifo(temp_dir):
+    """Path of a named pipe used as an offline printer (no reader)"""
+    path = temp_dir + "lp0"
+    os.mkfifo(path)
+    return path
+
+
+def read_printer(path, size):
+    """Connect the printer (reader of the fifo) and read `size` bytes"""
+    read_fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    data = bytearray()
+    deadline = time.monotonic() + 5
+    while len(data) < size and time.monotonic() < deadline:
+        try:
+            data += os.read(read_fd, size)
+        except BlockingIOError:
+            time.sleep(0.01)
+    os.close(read_fd)
+    return bytes(data)
+
+
+@patch("libreprinter.handlers.usb_handler.USB_RETRY_DELAY", 0.05)
+@pytest.mark.parametrize(
+    "policy, spill_capacity, expected_pending, expected_spilled, expected_dropped",
+    [
+        ("spill", 1000, 100, 84, 0),
+        # Spill file full
+        ("spill", 40, 56, 40, 44),
+        ("drop", 1000, 16, 0, 84),
+    ],
+    ids=["spill", "spill_full", "drop"],
+)
+def test_usb_passthrough_sink(
+    policy, spill_capacity, expected_pending, expected_spilled, expected_dropped,
+    fifo, temp_dir, caplog
+):
+    """Test the buffering of data for an offline printer"""
+    sink = UsbPassthroughSink(
+        fifo, policy=policy, spill_dir=temp_dir, capacity=16, spill_capacity=spill_capacity
+    )
+    payload = bytes(range(100))
+
+    # Printer is offline: the caller is not blocked
+    sink.write(memoryview(payload)[:50])
+    sink.write(memoryview(payload)[50:])
+    assert sink.pending == expected_pending
+    assert sink.spilled_bytes == expected_spilled
+    assert sink.dropped_bytes == expected_dropped
+
+    # Unavailability of the printer logged once
+    time.sleep(0.2)
+    assert not sink.available
+    assert len([record for record in caplog.records if record.levelname == "ERROR"]) == 1
+
+    # Printer is online: the order of the data is kept
+    expected = payload[:expected_pending]
+    assert read_printer(fifo, len(expected)) == expected
+    sink.close(timeout=1)
+    assert sink.pending == 0
+    assert sink.written_bytes == expected_pending
+
+
+@patch("libreprinter.handlers.usb_handler.USB_RETRY_DELAY", 0.05)
+def test_usb_passthrough_sink_block(fifo, temp_dir):
+    """Test the block policy: the caller waits for the printer"""
+    sink = UsbPassthroughSink(fifo, policy="block", capacity=16)
+    payload = bytes(range(100))
+
+    thread = Thread(target=sink.write, args=(payload,))
+    thread.start()
+    thread.join(0.2)
+    # Blocked by the full buffer
+    assert thread.is_alive()
+    assert sink.pending == 16
+
+    assert read_printer(fifo, 100) == payload
+    thread.join()
+    sink.close(timeout=1)
+    assert sink.written_bytes == 100
+
+
+def test_usb_passthrough_sink_spill_thread(fifo, temp_dir):
+    """Test that the spill file is written by the spill thread, not the caller"""
+    sink = UsbPassthroughSink(fifo, policy="spill", spill_dir=temp_dir, capacity=16)
+    pwrite = os.pwrite
+    writers = []
+    release = threading.Event()
+
+    def slow_pwrite(*args):
+        """Simulate a slow disk"""
+        writers.append(threading.current_thread().name)
+        release.wait(5)
+        return pwrite(*args)
+
+    with patch("libreprinter.handlers.usb_handler.os.pwrite", slow_pwrite):
+        # The caller doesn't wait for the disk
+        sink.write(bytes(range(100)))
+        assert sink.pending == 100
+        release.set()
+        assert read_printer(fifo, 100) == bytes(range(100))
+        sink.close(timeout=1)
+
+    assert writers and set(writers) == {"UsbPassthroughSpill"}
+    assert sink.spill_size == 0
@@ -20,6 +20,7 @@
 Test only file detections & startups.
 """
 # Standard imports
+import re
 import time
 
 import libreprinter.plugins.lp_seiko_qt2100_converter
@@ -27,14 +28,29 @@ import pytest
 from unittest.mock import patch
 
 # Custom imports
-from libreprinter.file_handler import init_directories
-from libreprinter.plugins.lp_jobs_to_printer_watchdog import setup_pdf_watchdog
-from libreprinter.plugins.lp_pcl_to_pdf_watchdog import setup_pcl_watchdog
-from libreprinter.plugins.lp_txt_converter import setup_text_watchdog
-from libreprinter.plugins.lp_hpgl_converter import setup_hpgl_watchdog
-from libreprinter.plugins.lp_ps_converter import setup_postscript_watchdog
-from libreprinter.plugins.lp_seiko_qt2100_converter import setup_seiko_watchdog
-from libreprinter.plugins.lp_escapy_converter import setup_escapy_watchdog
+from libreprinter.file_handler import init_directories, TimeJobCounter
+from libreprinter.plugins.lp_jobs_to_printer_watchdog import (
+    setup_pdf_watchdog,
+    PdfEventHandler,
+)
+from libreprinter.plugins.lp_pcl_to_pdf_watchdog import (
+    setup_pcl_watchdog,
+    PclEventHandler,
+)
+from libreprinter.plugins.lp_txt_converter import setup_text_watchdog, TxtEventHandler
+from libreprinter.plugins.lp_hpgl_converter import setup_hpgl_watchdog, HpglEventHandler
+from libreprinter.plugins.lp_ps_converter import (
+    setup_postscript_watchdog,
+    PostscriptEventHandler,
+)
+from libreprinter.plugins.lp_seiko_qt2100_converter import (
+    setup_seiko_watchdog,
+    SeikoEventHandler,
+)
+from libreprinter.plugins.lp_escapy_converter import (
+    setup_escapy_watchdog,
+    EscapyEventHandler,
+)
 from libreprinter.commons import PCL_CONVERTER, ENSCRIPT_BINARY, HP2XX_BINARY
 
 # Import create dir fixture
@@ -292,3 +308,24 @@ def test_missing_external_module(watchdog, config, expected_exception_text, expe
     # We expect an error in the logger
     print(caplog.text)
     assert expected_log_text in caplog.text
+
+
+@pytest.mark.parametrize(
+    "event_handler_class, filepath",
+    [
+        (EscapyEventHandler, "raw/{}.raw"),
+        (HpglEventHandler, "hpgl/{}.hpgl"),
+        (PdfEventHandler, "pdf/{}.pdf"),
+        (PclEventHandler, "pcl/{}.pcl"),
+        (PostscriptEventHandler, "ps/{}.ps"),
+        (SeikoEventHandler, "raw/{}.raw"),
+        (TxtEventHandler, "txt_jobs/{}.txt"),
+    ],
+)
+def test_files_regex_job_ids(event_handler_class, filepath, temp_dir):
+    """Test that the files of numbered and time-ordered jobs are detected"""
+    for job_id in (12, TimeJobCounter(temp_dir, "/dev/ttyACM0").allocate()):
+        path = "/var/lib/libre-printer/" + filepath.format(job_id)
+        assert any(
+            re.match(regex, path) for regex in event_handler_class.FILES_REGEX
+        ), path
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# Libreprinter is a software allowing to use the Centronics and serial printing
+# functions of vintage computers on modern equipement through a tiny hardware
+# interface.
+# Copyright (C) 2020-2024  Ysard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Benchmark of the latency of the conversions of PostScript jobs
+
+Compare the start of a Ghostscript process for each job (current behavior of
+:mod:`libreprinter.plugins.lp_ps_converter` without server) with the
+long-lived processes of :class:`libreprinter.ghostscript_server.GhostscriptServer`.
+Jobs are small one-page text documents, converted one by one.
+
+Usage::
+
+    python -m tools.benchmark_ghostscript [number_of_jobs]
+"""
+# Standard imports
+import sys
+import time
+from pathlib import Path
+import tempfile
+import statistics
+import subprocess
+
+# Custom imports
+from libreprinter.file_handler import init_directories
+from libreprinter.ghostscript_server import GhostscriptServer, GS_BINARY, GS_PDF_SETTINGS
+
+JOB = b"""%%!PS
+/Courier findfont 12 scalefont setfont
+72 720 moveto (Job %d) show
+72 700 moveto (The quick brown fox jumps over the lazy dog) show
+showpage
+"""
+
+
+def spawn(in_file, out_file):
+    """Convert a job with a new Ghostscript process"""
+    subprocess.run(
+        [
+            GS_BINARY, "-q", "-dNOPAUSE", "-sDEVICE=pdfwrite", *GS_PDF_SETTINGS,
+            f"-sOutputFile={out_file}", in_file, "-c", "quit",
+        ],
+        stderr=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+
+
+def measure(name, convert, jobs):
+    """Print the statistics of the latency of the conversions in ms"""
+    latencies = []
+    for in_file, out_file in jobs:
+        start = time.perf_counter()
+        convert(in_file, out_file)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    print(
+        f"{name:>8}: mean {statistics.mean(latencies):8.1f} ms; "
+        f"median {statistics.median(latencies):8.1f} ms; "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1]:8.1f} ms"
+    )
+
+
+def main():
+    """Entry point"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    if not Path(GS_BINARY).exists():
+        print(f"Ghostscript: {GS_BINARY} not found")
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = temp_dir + "/"
+        init_directories(output_path, ["ps", "pdf"])
+        jobs = []
+        for number in range(count):
+            in_file = f"{output_path}ps/{number}.ps"
+            with open(in_file, "wb") as f_d:
+                f_d.write(JOB % number)
+            jobs.append((in_file, f"{output_path}pdf/{number}.pdf"))
+
+        print(f"Conversion of {count} PostScript jobs, one by one")
+        measure("spawn", spawn, jobs)
+
+        server = GhostscriptServer(1, [output_path + "ps/"], [output_path + "pdf/"])
+        start = time.perf_counter()
+        server.warm_up()
+        print(f"  (start of the server: {(time.perf_counter() - start) * 1000:.1f} ms)")
+        measure("server", server.convert, jobs)
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
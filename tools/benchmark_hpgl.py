@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Libreprinter is a software allowing to use the Centronics and serial printing
+# functions of vintage computers on modern equipement through a tiny hardware
+# interface.
+# Copyright (C) 2020-2024  Ysard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Benchmark of the throughput of the conversions of HP-GL plots
+
+Compare the native renderer of :mod:`libreprinter.hpgl_renderer` with
+hp2xx & Ghostscript (:meth:`HpglEventHandler.convert_with_hp2xx
+<libreprinter.plugins.lp_hpgl_converter.HpglEventHandler.convert_with_hp2xx>`),
+if these binaries are installed. Plots are random polylines, circles and
+labels drawn with several pens and line types.
+
+Usage::
+
+    python -m tools.benchmark_hpgl [number_of_polylines]
+"""
+# Standard imports
+import sys
+import time
+import tempfile
+from pathlib import Path
+import numpy as np
+
+# Custom imports
+from libreprinter.hpgl_renderer import render_hpgl
+from libreprinter.plugins.lp_hpgl_converter import HpglEventHandler
+from libreprinter.ghostscript_server import GS_BINARY
+from libreprinter.commons import HP2XX_BINARY
+
+
+def get_plot(polylines):
+    """Get a plot of random polylines of 10 points"""
+    rng = np.random.default_rng(0)
+    parts = [b"IN;SP1;"]
+    for number in range(polylines):
+        points = rng.integers(0, 15000, size=(10, 2))
+        parts.append(b"PU;PA%d,%d;PD;PA" % tuple(points[0]))
+        parts.append(b",".join(b"%d,%d" % tuple(point) for point in points[1:]))
+        parts.append(b";")
+        if number % 100 == 0:
+            parts.append(
+                b"SP%d;LT%d;CI500;PU;LBPolyline %d\x03" % (number % 7 + 1, number % 7, number)
+            )
+    return b"".join(parts)
+
+
+def measure(name, convert, src_path, pdf_path, size):
+    """Print the duration and the throughput of a conversion"""
+    start = time.perf_counter()
+    convert(src_path, pdf_path)
+    duration = time.perf_counter() - start
+    print(
+        f"{name:>8}: {duration * 1000:8.1f} ms; {size / duration / 1e6:6.2f} MB/s; "
+        f"pdf: {pdf_path.stat().st_size / 1e3:.0f} kB"
+    )
+
+
+def main():
+    """Entry point"""
+    polylines = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        src_path = Path(temp_dir) / "plot.hpgl"
+        data = get_plot(polylines)
+        src_path.write_bytes(data)
+
+        print(f"Conversion of a plot of {polylines} polylines ({len(data) / 1e6:.1f} MB)")
+        measure("native", render_hpgl, src_path, Path(temp_dir) / "native.pdf", len(data))
+
+        if not (Path(HP2XX_BINARY).exists() and Path(GS_BINARY).exists()):
+            print(f"   hp2xx: {HP2XX_BINARY} or {GS_BINARY} not found")
+            return
+        handler = HpglEventHandler(HP2XX_BINARY)
+        measure(
+            "hp2xx", handler.convert_with_hp2xx,
+            src_path, Path(temp_dir) / "hp2xx.pdf", len(data)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# Libreprinter is a software allowing to use the Centronics and serial printing
+# functions of vintage computers on modern equipement through a tiny hardware
+# interface.
+# Copyright (C) 2020-2024  Ysard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Benchmark of the allocation of the job numbers
+
+Compare the scan of the output directories
+(:meth:`libreprinter.file_handler.get_job_number`) with the persistent
+counter (:class:`libreprinter.file_handler.JobCounter`) while the number of
+retained files in the output directories grows.
+
+Usage::
+
+    python -m tools.benchmark_job_number [max_number_of_files]
+"""
+# Standard imports
+import sys
+import time
+import tempfile
+
+# Custom imports
+from libreprinter.file_handler import init_directories, get_job_number, JobCounter
+
+# Output directories filled with files
+DIRECTORIES = (("raw", "raw"), ("pdf", "pdf"), ("txt_stream", "txt"), ("pcl", "pcl"))
+# Number of measured allocations
+ALLOCATIONS = 20
+
+
+def add_files(output_path, start, stop):
+    """Create non-empty job files numbered from start to stop (excluded)"""
+    for number in range(start, stop):
+        directory, extension = DIRECTORIES[number % len(DIRECTORIES)]
+        with open(f"{output_path}{directory}/{number}.{extension}", "wb") as f_d:
+            f_d.write(b"x")
+
+
+def measure(func):
+    """Return the average duration of func in ms"""
+    start = time.perf_counter()
+    for _ in range(ALLOCATIONS):
+        func()
+    return (time.perf_counter() - start) * 1000 / ALLOCATIONS
+
+
+def main():
+    """Entry point"""
+    max_files = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = temp_dir + "/"
+        init_directories(output_path)
+        job_counter = JobCounter(output_path)
+
+        print(f"Allocation of a job number (average of {ALLOCATIONS} calls)")
+        files = 0
+        for count in (1000, 10000, max_files):
+            if count > max_files:
+                continue
+            add_files(output_path, files + 1, count + 1)
+            files = count
+            scan = measure(lambda: get_job_number(output_path))
+            # Counter synced to the files of the directories
+            job_counter.next_number = files + 1
+            counter = measure(job_counter.allocate)
+            print(
+                f"{files:>7} files: get_job_number {scan:10.3f} ms; "
+                f"JobCounter.allocate {counter:8.3f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# Libreprinter is a software allowing to use the Centronics and serial printing
+# functions of vintage computers on modern equipement through a tiny hardware
+# interface.
+# Copyright (C) 2020-2024  Ysard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Benchmark of the conversion of line endings of a large file
+
+Compare the legacy conversion (whole file read in memory, then replaced)
+with :meth:`libreprinter.file_handler.convert_file_line_ending` which
+processes the file in blocks of fixed size.
+
+Peaks of memory are measured with tracemalloc.
+
+Usage::
+
+    python -m tools.benchmark_line_ending [size_in_MB]
+"""
+# Standard imports
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+# Custom imports
+from libreprinter.file_handler import convert_file_line_ending, convert_data_line_ending
+
+LINE = b"0123456789 listing line with unix ending\n"
+
+
+def legacy_convert(in_file, out_file, line_ending):
+    """Conversion as made before the processing in blocks"""
+    line_ending = line_ending.encode()
+    with open(in_file, "rb") as in_file_fd, open(out_file, "wb") as out_file_fd:
+        out_file_fd.write(convert_data_line_ending(in_file_fd.read(), line_ending))
+
+
+def run(convert_func, in_file, out_file, trace=False):
+    """Convert the file to windows line endings
+
+    :return: Elapsed time, peak of allocated memory
+    :rtype: tuple[float, int]
+    """
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    convert_func(in_file, out_file, "\r\n")
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if trace:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    """Entry point"""
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 100
+    size = int(size_mb * 1024 * 1024)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        in_file = os.path.join(temp_dir, "in.raw")
+        out_file = os.path.join(temp_dir, "out.txt")
+        with open(in_file, "wb") as f_d:
+            block = LINE * (1024 * 1024 // len(LINE))
+            for _ in range(0, size, len(block)):
+                f_d.write(block)
+
+        print(f"Conversion of {size_mb} MB to windows line endings")
+        for name, convert_func in (
+            ("legacy read() + replace", legacy_convert),
+            ("convert_file_line_ending", convert_file_line_ending),
+        ):
+            elapsed, _ = run(convert_func, in_file, out_file)
+            _, peak = run(convert_func, in_file, out_file, trace=True)
+            print(
+                f"{name:<26} {size_mb / elapsed:8.1f} MB/s; "
+                f"peak memory: {peak / 1024 / 1024:8.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
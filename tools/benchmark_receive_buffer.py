@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# Libreprinter is a software allowing to use the Centronics and serial printing
+# functions of vintage computers on modern equipement through a tiny hardware
+# interface.
+# Copyright (C) 2020-2024  Ysard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Micro-benchmark of the reception of data from the serial port
+
+Compare the legacy reception (`bytearray(serial_handler.read(size=8000))`)
+with the preallocated :class:`libreprinter.handlers.ReceiveBuffer`.
+
+Data is sent through a pseudo-terminal pair; allocations are measured with
+tracemalloc: for each read, the peak of memory allocated during the read
+and the processing of the chunk is summed.
+
+A paced transfer (bytes sent at the speed of a slow serial line) shows the
+effect of the read sizing of :class:`libreprinter.handlers.ReceiveBuffer`
+on the number of syscalls.
+
+Usage::
+
+    python -m tools.benchmark_receive_buffer [size_in_MB]
+"""
+# Standard imports
+import os
+import sys
+import time
+import tty
+import threading
+import tracemalloc
+import serial
+
+# Custom imports
+from libreprinter.handlers import ReceiveBuffer
+
+CHUNK_SIZE = 8000
+
+
+def open_pty():
+    """Return the master fd and a pyserial handler opened on the slave side"""
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    serial_handler = serial.Serial(os.ttyname(slave), timeout=1)
+    return master, serial_handler
+
+
+def sender(master, size):
+    """Write `size` bytes in the master side of the pty"""
+    view = memoryview(bytes(range(256)) * (CHUNK_SIZE // 256 + 1))[:CHUNK_SIZE]
+    sent = 0
+    while sent < size:
+        sent += os.write(master, view[: min(CHUNK_SIZE, size - sent)])
+
+
+def paced_sender(master, size, rate):
+    """Write `size` bytes in the master side of the pty at `rate` bytes/s"""
+    start = time.monotonic()
+    for sent in range(0, size, 16):
+        os.write(master, b"x" * min(16, size - sent))
+        delay = start + (sent + 16) / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def run_paced(size, rate, latency):
+    """Receive `size` bytes sent at `rate` bytes/s
+
+    :return: The receive buffer with its counters
+    :rtype: ReceiveBuffer
+    """
+    master, serial_handler = open_pty()
+    receive_buffer = ReceiveBuffer(serial_handler, size=CHUNK_SIZE, latency=latency)
+    thread = threading.Thread(target=paced_sender, args=(master, size, rate))
+    thread.start()
+    while receive_buffer.received_bytes < size:
+        receive_buffer.read(timeout=1)
+    thread.join()
+    serial_handler.close()
+    os.close(master)
+    return receive_buffer
+
+
+def legacy_read(serial_handler, _):
+    """Reception as made before the preallocated buffers"""
+    return bytearray(serial_handler.read(size=CHUNK_SIZE))
+
+
+def receive_buffer_read(_, receive_buffer):
+    """Reception with preallocated buffers"""
+    return receive_buffer.read(timeout=1)
+
+
+def run(read_func, size, trace=False):
+    """Receive `size` bytes with the given function
+
+    :return: Elapsed time, number of reads, allocated bytes
+    :rtype: tuple[float, int, int]
+    """
+    master, serial_handler = open_pty()
+    receive_buffer = ReceiveBuffer(serial_handler, size=CHUNK_SIZE)
+    thread = threading.Thread(target=sender, args=(master, size))
+
+    received = reads = allocated = 0
+    with open(os.devnull, "wb") as out_f_d:
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        thread.start()
+        while received < size:
+            if trace:
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+            chunk = read_func(serial_handler, receive_buffer)
+            out_f_d.write(chunk)
+            received += len(chunk)
+            reads += 1
+            if trace:
+                _, peak = tracemalloc.get_traced_memory()
+                allocated += peak - current
+            del chunk
+        elapsed = time.perf_counter() - start
+        if trace:
+            tracemalloc.stop()
+
+    thread.join()
+    serial_handler.close()
+    os.close(master)
+    return elapsed, reads, allocated
+
+
+def main():
+    """Entry point"""
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 8
+    size = int(size_mb * 1024 * 1024)
+
+    print(f"Reception of {size_mb} MB through a pty ({CHUNK_SIZE} bytes chunks)")
+    for name, read_func in (
+        ("legacy bytearray(read())", legacy_read),
+        ("ReceiveBuffer.read()", receive_buffer_read),
+    ):
+        elapsed, reads, _ = run(read_func, size)
+        _, _, allocated = run(read_func, size, trace=True)
+        print(
+            f"{name:<26} {size_mb / elapsed:8.1f} MB/s; "
+            f"reads/MB: {reads / size_mb:8.1f}; "
+            f"allocated bytes/MB: {allocated / size_mb:12.0f}"
+        )
+
+    # 115200 bauds, 8N1
+    rate = 11520
+    print(f"\nPaced reception of 2 s at {rate} bytes/s")
+    for name, latency in (("no read sizing", 0), ("read sizing (50 ms)", 0.05)):
+        receive_buffer = run_paced(rate * 2, rate, latency)
+        print(
+            f"{name:<26} syscalls/MB: {receive_buffer.syscalls_per_mb:10.0f}; "
+            f"bytes/read: {receive_buffer.average_chunk_size:8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()